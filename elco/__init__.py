@@ -1 +1,3 @@
 VERSION = '0.1'
+
+default_app_config = 'elco.apps.ElcoConfig'
@@ -0,0 +1,270 @@
+"""
+Allocation of Station and PowerLine codes, so operators entering records
+concurrently no longer pick the hex sequence part of codes by hand and collide
+on the unique constraints.
+
+Codes are allocated within keyspaces named by their category prefix and
+voltage digit, as in `S1` for 11/0.415KV distribution stations, whose codes
+are the prefix followed by a sequence number in hex. The numbers taken within
+a keyspace, by records or earlier reservations, are tracked in a bitmap loaded
+on first use. Free numbers are handed out from a list of released ones, then
+from a cursor which only moves forward, thus in amortized constant time.
+
+Each code handed out is reserved by inserting a `CodeReservation` row, whose
+unique constraint arbitrates between processes: a conflict means another
+process reserved the code since the bitmap was loaded, thus the keyspace is
+reloaded and allocation retried. Codes found taken by records created with
+hand picked codes are skipped. Reservations are kept once records take their
+codes; codes left unused can be returned with `release`.
+"""
+import threading
+
+from django.db import IntegrityError, transaction
+
+from .constants import Voltage
+from .models import CodeReservation, PowerLine, Station
+
+
+DEFAULT_BATCH_SIZE = 500
+
+# attempts made at reserving codes before giving up under contention
+MAX_ATTEMPTS = 10
+
+# keyspace -> (model, code format, largest number)
+KEYSPACES = {
+    'T1': (Station, 'T1%02X', 0xFF),
+    'T3': (Station, 'T3%02X', 0xFF),
+    'I3': (Station, 'I3%02X', 0xFF),
+    'S1': (Station, 'S1%04X', 0xFFFF),
+    'S3': (Station, 'S3%04X', 0xFFFF),
+    'F1': (PowerLine, 'F1%02X', 0xFF),
+    'F3': (PowerLine, 'F3%02X', 0xFF),
+}
+
+
+
+def get_station_keyspace(category, voltage_ratio):
+    """Returns the keyspace of codes for stations of the provided category
+    and voltage ratio.
+    """
+    prefix = 'S' if category == Station.DISTRIBUTION else category
+    key = '%s%s' % (prefix, Voltage.Ratio._text[voltage_ratio][0])
+    if key not in KEYSPACES:
+        raise KeyError(key)
+    return key
+
+
+def get_feeder_keyspace(voltage):
+    """Returns the keyspace of codes for feeders of the provided voltage."""
+    key = '%s%s' % (PowerLine.FEEDER, Voltage._text[voltage][0])
+    if key not in KEYSPACES:
+        raise KeyError(key)
+    return key
+
+
+def parse_code(code):
+    """Returns the (keyspace, number) of a code, or None for codes which are
+    not in any keyspace.
+    """
+    code = (code or '').strip().upper()
+    entry = KEYSPACES.get(code[:2])
+    if entry is None or len(code) != len(format_code(code[:2], entry[2])):
+        return None
+    try:
+        number = int(code[2:], 16)
+    except ValueError:
+        return None
+    if not 0 < number <= entry[2]:
+        return None
+    return code[:2], number
+
+
+def format_code(key, number):
+    """Returns the code for a number within a keyspace."""
+    return KEYSPACES[key][1] % number
+
+
+def _batches(values, batch_size):
+    for start in range(0, len(values), batch_size):
+        yield values[start:start + batch_size]
+
+
+class _Keyspace(object):
+    """Tracks the numbers taken within a keyspace in a bitmap."""
+
+    def __init__(self, size):
+        self.size = size
+        self._bits = bytearray(size // 8 + 1)
+        self._cursor = 1
+        self._free = []
+        self._taken = 0
+
+    def is_taken(self, number):
+        return bool(self._bits[number >> 3] & (1 << (number & 7)))
+
+    def mark(self, number):
+        if not self.is_taken(number):
+            self._bits[number >> 3] |= 1 << (number & 7)
+            self._taken += 1
+
+    def release(self, number):
+        if self.is_taken(number):
+            self._bits[number >> 3] &= ~(1 << (number & 7)) & 0xFF
+            self._taken -= 1
+            if number < self._cursor:
+                self._free.append(number)
+
+    @property
+    def available(self):
+        return self.size - self._taken
+
+    def take(self):
+        """Marks and returns a free number, or None where there is none."""
+        while self._free:
+            number = self._free.pop()
+            if not self.is_taken(number):
+                self.mark(number)
+                return number
+        while self._cursor <= self.size:
+            number = self._cursor
+            self._cursor += 1
+            if not self.is_taken(number):
+                self.mark(number)
+                return number
+        return None
+
+
+class CodeAllocator(object):
+    """Hands out and reserves codes from the keyspaces in `KEYSPACES`."""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._keyspaces = {}
+        self._lock = threading.RLock()
+
+    def _get_keyspace(self, key):
+        keyspace = self._keyspaces.get(key)
+        if keyspace is None:
+            model, _, size = KEYSPACES[key]
+            keyspace = _Keyspace(size)
+            for queryset in (model.all_objects, CodeReservation.objects):
+                codes = queryset.filter(code__istartswith=key)\
+                                .values_list('code', flat=True)
+                for code in codes.iterator():
+                    parsed = parse_code(code)
+                    if parsed is not None and parsed[0] == key:
+                        keyspace.mark(parsed[1])
+            self._keyspaces[key] = keyspace
+        return keyspace
+
+    def _find_in_use(self, model, codes):
+        in_use = set()
+        for batch in _batches(codes, self.batch_size):
+            in_use.update(model.all_objects.filter(code__in=batch)
+                                           .values_list('code', flat=True))
+        return in_use
+
+    def available(self, key):
+        """Returns the number of codes left for allocation in a keyspace."""
+        with self._lock:
+            return self._get_keyspace(key).available
+
+    def reserve(self, key):
+        """Reserves and returns the next free code in a keyspace."""
+        return self.reserve_many(key, 1)[0]
+
+    def reserve_many(self, key, count):
+        """Reserves and returns count free codes in a keyspace, inserting their
+        reservations in bulk. Raises ValueError where the keyspace has fewer
+        codes left, in which case none is reserved.
+        """
+        if count < 1:
+            raise ValueError("At least 1 code must be reserved.")
+        model = KEYSPACES[key][0]
+        reserved = []
+        with self._lock:
+            for _ in range(MAX_ATTEMPTS):
+                keyspace = self._get_keyspace(key)
+                needed = count - len(reserved)
+                if keyspace.available < needed:
+                    self.release(reserved)
+                    raise ValueError("Only %s %s codes left, %s requested." % (
+                        keyspace.available, key, needed))
+
+                codes = [format_code(key, keyspace.take())
+                         for _ in range(needed)]
+                try:
+                    with transaction.atomic():
+                        CodeReservation.objects.bulk_create(
+                            [CodeReservation(code=code) for code in codes],
+                            batch_size=self.batch_size)
+                except IntegrityError:
+                    # reserved by another process since keyspace was loaded
+                    del self._keyspaces[key]
+                    continue
+
+                in_use = self._find_in_use(model, codes)
+                reserved.extend(code for code in codes if code not in in_use)
+                if len(reserved) == count:
+                    return reserved
+
+            self.release(reserved)
+            raise ValueError("Could not reserve %s %s codes in %s attempts." % (
+                count, key, MAX_ATTEMPTS))
+
+    def release(self, codes):
+        """Releases reserved codes not taken by records so they get handed out
+        again. Returns the codes released.
+        """
+        by_key = {}
+        for code in codes:
+            parsed = parse_code(code)
+            if parsed is not None:
+                by_key.setdefault(parsed[0], {})[format_code(*parsed)] = parsed[1]
+
+        released = []
+        with self._lock:
+            for key, numbers in sorted(by_key.items()):
+                in_use = self._find_in_use(KEYSPACES[key][0], list(numbers))
+                codes = sorted(code for code in numbers if code not in in_use)
+                for batch in _batches(codes, self.batch_size):
+                    CodeReservation.objects.filter(code__in=batch).delete()
+                keyspace = self._keyspaces.get(key)
+                if keyspace is not None:
+                    for code in reversed(codes):
+                        keyspace.release(numbers[code])
+                released.extend(codes)
+        return released
+
+    def reset(self):
+        """Discards loaded keyspaces; they get reloaded on next use."""
+        with self._lock:
+            self._keyspaces = {}
+
+
+_allocator = CodeAllocator()
+
+
+def reserve(key):
+    """Reserves and returns the next free code in a keyspace."""
+    return _allocator.reserve(key)
+
+
+def reserve_many(key, count):
+    """Reserves and returns count free codes in a keyspace."""
+    return _allocator.reserve_many(key, count)
+
+
+def release(codes):
+    """Releases reserved codes not taken by records."""
+    return _allocator.release(codes)
+
+
+def available(key):
+    """Returns the number of codes left for allocation in a keyspace."""
+    return _allocator.available(key)
+
+
+def reset_allocator():
+    """Discards the keyspaces loaded by the process-wide allocator."""
+    _allocator.reset()
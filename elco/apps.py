@@ -0,0 +1,21 @@
+from django.apps import AppConfig
+from django.utils.translation import ugettext_lazy as _
+
+
+
+class ElcoConfig(AppConfig):
+    name = 'elco'
+    verbose_name = _("Elco")
+    
+    def ready(self):
+        # connect signal receivers which keep in-process structures in sync
+        # with changes made to the network records.
+        from . import caching, changelog, choices, impact, rollups,\
+                spatial, topology
+        caching.connect_signals()
+        changelog.connect_signals()
+        choices.connect_signals()
+        impact.connect_signals()
+        rollups.connect_signals()
+        spatial.connect_signals()
+        topology.connect_signals()
@@ -0,0 +1,298 @@
+"""
+An audit of the whole network for records which break the rules enforced by
+model validation. Those rules only run as records are saved through forms or
+the importer, thus rows written by migrations or raw SQL are never checked.
+
+The network is split into partitions: one per subtree rooted at a station
+without a source feeder, normally a transmission station, one for nodes no
+root feeds, as with orphans and cycles, and one for transformer ratings.
+Partitions are audited independently, in a pool of forked processes where
+more than one process is used, and each reports findings as
+(model name, code, kind, message) tuples, transformers being identified by
+their station and own code as in `S10001/TX1`, where kind is one of:
+
+  - `invalid`: a field validator or model `clean` rule failed, including the
+    voltage checks between a node and its source;
+  - `orphan`: a foreign key references a record which does not exist;
+  - `cycle`: the node is fed, directly or indirectly, from itself;
+  - `unreachable`: the node is not fed from any root;
+  - `path`: the stored materialized path or depth does not match the links;
+  - `rating`: a transformer rating is for a voltage ratio other than that of
+    the station holding the transformer.
+"""
+import multiprocessing
+from collections import deque
+
+from django.core.exceptions import NON_FIELD_ERRORS
+from django.db import connections
+
+from .models import PATH_SEPARATOR, PowerLine, Station, Transformer,\
+        TransformerRating
+
+
+DEFAULT_BATCH_SIZE = 500
+
+# partition kinds
+SUBTREE = 'subtree'
+UNREACHABLE = 'unreachable'
+RATINGS = 'ratings'
+
+NODE_MODELS = (Station, PowerLine)
+
+
+
+def get_partitions():
+    """Returns the partitions of the network as (kind, root code) pairs."""
+    roots = Station.all_objects.filter(source_feeder__isnull=True)\
+                               .order_by('code')\
+                               .values_list('code', flat=True)
+    return ([(SUBTREE, code) for code in roots] +
+            [(UNREACHABLE, None), (RATINGS, None)])
+
+
+def _get_parent_attname(model):
+    return model._meta.get_field(model.parent_field).attname
+
+
+def _get_label(instance):
+    if isinstance(instance, Transformer):
+        return '%s/%s' % (instance.station_id, instance.code)
+    return instance.code
+
+
+def _batches(values, batch_size):
+    values = list(values)
+    for start in range(0, len(values), batch_size):
+        yield values[start:start + batch_size]
+
+
+def _validate(model, pks, batch_size=DEFAULT_BATCH_SIZE):
+    """Returns findings for records of model with the provided pks, validated
+    in batches with `bulk_full_clean`. Unique checks are left to the unique
+    constraints of the database.
+    """
+    model_name = model._meta.model_name
+    foreign_keys = dict((f.name, f.attname)
+                        for f in model._meta.concrete_fields
+                        if f.is_relation and f.many_to_one)
+    manager = model.all_objects
+    findings = []
+    for batch in _batches(pks, batch_size):
+        instances = list(manager.filter(pk__in=batch).order_by('pk'))
+        errors = manager.bulk_full_clean(instances, validate_unique=False)
+        for index, error in sorted(errors.items()):
+            instance = instances[index]
+            for field, messages in sorted(error.message_dict.items()):
+                kind = 'invalid'
+                if field in foreign_keys and \
+                        getattr(instance, foreign_keys[field]) is not None:
+                    kind = 'orphan'
+                for message in messages:
+                    if field != NON_FIELD_ERRORS:
+                        message = '%s: %s' % (field, message)
+                    findings.append((model_name, _get_label(instance),
+                                     kind, message))
+        if model is Transformer:
+            findings.extend(_check_ratings(instances, errors))
+    return findings
+
+
+def _check_ratings(transformers, errors):
+    findings = []
+    for index, transformer in enumerate(transformers):
+        if index in errors:
+            continue
+        rating, station = transformer.rating, transformer.station
+        if rating.voltage_ratio != station.voltage_ratio:
+            findings.append(('transformer', _get_label(transformer), 'rating',
+                             "rating %s is for %s while station %s is %s" % (
+                                 rating.code,
+                                 rating.get_voltage_ratio_display(),
+                                 station.code,
+                                 station.get_voltage_ratio_display())))
+    return findings
+
+
+def _transformer_pks(station_codes, batch_size=DEFAULT_BATCH_SIZE):
+    pks = []
+    for batch in _batches(station_codes, batch_size):
+        pks.extend(Transformer.all_objects.filter(station__in=batch)
+                                          .values_list('pk', flat=True))
+    return pks
+
+
+def _check_paths(root, nodes):
+    """Returns findings for nodes whose stored path or depth differs from
+    that built from their links, walking down from the root.
+    """
+    children = {}
+    for code, (_, _, parent, _, _) in nodes.items():
+        children.setdefault(parent, []).append(code)
+
+    findings = []
+    queue = deque([(root, root, 0)])
+    while queue:
+        code, path, depth = queue.popleft()
+        model, _, _, stored_path, stored_depth = nodes[code]
+        if (stored_path, stored_depth) != (path, depth):
+            findings.append((
+                model._meta.model_name, code, 'path',
+                "stored path '%s' at depth %s, expected '%s' at depth %s" % (
+                    stored_path, stored_depth, path, depth)))
+        for child in children.get(code, ()):
+            queue.append((child, path + PATH_SEPARATOR + child, depth + 1))
+    return findings
+
+
+def _audit_subtree(root):
+    nodes = {}      # code -> (model, pk, parent code, path, depth)
+    fields = ('pk', 'code', 'path', 'depth')
+    records = [(Station, Station.all_objects.filter(code=root))]
+    records.extend((model, model.all_objects.descendants_of(root))
+                   for model in NODE_MODELS)
+    for model, queryset in records:
+        rows = queryset.values_list(_get_parent_attname(model), *fields)
+        for parent, pk, code, path, depth in rows.iterator():
+            nodes[code] = (model, pk, parent, path, depth)
+
+    findings = _check_paths(root, nodes)
+    for model in NODE_MODELS:
+        findings.extend(_validate(model, [
+            pk for node_model, pk, _, _, _ in nodes.values()
+            if node_model is model]))
+    stations = [code for code, node in nodes.items() if node[0] is Station]
+    pks = _transformer_pks(stations)
+    findings.extend(_validate(Transformer, pks))
+    return len(nodes) + len(pks), findings
+
+
+def _find_unreachable():
+    """Returns a dict mapping the code of each node not fed from any root to
+    (model, pk, kind, message) describing why. Only unreachable nodes are
+    loaded, as found by a recursive query within the database.
+    """
+    nodes = {}      # code -> (model, pk, parent code)
+    for model in NODE_MODELS:
+        rows = model.all_objects.unreachable().values_list(
+            'code', 'pk', _get_parent_attname(model))
+        for code, pk, parent in rows.iterator():
+            nodes[code] = (model, pk, parent)
+
+    unreachable = {}
+    for code in nodes:
+        if code in unreachable:
+            continue
+        # walk up until reaching a node already classified, a node whose
+        # source does not exist or the start of a cycle; the source of an
+        # unreachable node is never reachable.
+        chain, positions = [], {}
+        while (code in nodes and code not in unreachable and
+               code not in positions):
+            positions[code] = len(chain)
+            chain.append(code)
+            code = nodes[code][2]
+
+        if code in positions:
+            cycle = chain[positions[code]:]
+            message = "fed from itself through %s" % ' -> '.join(
+                cycle + [code])
+            for member in cycle:
+                model, pk, _ = nodes[member]
+                unreachable[member] = (model, pk, 'cycle', message)
+            chain = chain[:positions[code]]
+            source = code
+        elif code in unreachable:
+            source = code
+        else:
+            source = chain[-1]
+            model, pk, _ = nodes[source]
+            unreachable[source] = (model, pk, None, None)
+            chain = chain[:-1]
+
+        for member in chain:
+            model, pk, _ = nodes[member]
+            unreachable[member] = (
+                model, pk, 'unreachable',
+                "not fed from any root, fed from %s" % source)
+    return unreachable
+
+
+def _audit_unreachable():
+    unreachable = _find_unreachable()
+    findings = [(model._meta.model_name, code, kind, message)
+                for code, (model, _, kind, message)
+                in sorted(unreachable.items()) if kind]
+    for model in NODE_MODELS:
+        findings.extend(_validate(model, [
+            pk for node_model, pk, _, _ in unreachable.values()
+            if node_model is model]))
+
+    # transformers at unreachable stations or at stations which do not exist
+    stations = [code for code, node in unreachable.items()
+                if node[0] is Station]
+    pks = _transformer_pks(stations)
+    pks.extend(Transformer.all_objects.exclude(
+        station__in=Station.all_objects.values('code'))
+        .values_list('pk', flat=True))
+    findings.extend(_validate(Transformer, pks))
+    return len(unreachable) + len(pks), findings
+
+
+def _audit_ratings():
+    pks = list(TransformerRating.all_objects.values_list('pk', flat=True))
+    return len(pks), _validate(TransformerRating, pks)
+
+
+def audit_partition(partition):
+    """Audits the records within a partition. Returns the partition along
+    with the number of records checked, transformers included, and a list of
+    findings.
+    """
+    kind, root = partition
+    if kind == SUBTREE:
+        checked, findings = _audit_subtree(root)
+    elif kind == UNREACHABLE:
+        checked, findings = _audit_unreachable()
+    elif kind == RATINGS:
+        checked, findings = _audit_ratings()
+    else:
+        raise ValueError("Unknown partition kind: %s" % kind)
+    return partition, checked, findings
+
+
+def _init_worker():
+    # connections inherited from the parent must not be shared
+    connections.close_all()
+
+
+def _get_pool(processes):
+    # workers are forked to inherit the configured settings and loaded apps
+    if hasattr(multiprocessing, 'get_context'):
+        return multiprocessing.get_context('fork').Pool(processes,
+                                                        _init_worker)
+    return multiprocessing.Pool(processes, _init_worker)
+
+
+def run(processes=1, partitions=None):
+    """Audits the network, or the provided partitions, yielding the result
+    of `audit_partition` for each as soon as it completes. Partitions are
+    audited in a pool of processes where more than one is requested.
+    """
+    if partitions is None:
+        partitions = get_partitions()
+    if processes <= 1:
+        for partition in partitions:
+            yield audit_partition(partition)
+        return
+
+    connections.close_all()
+    pool = _get_pool(processes)
+    try:
+        for result in pool.imap_unordered(audit_partition, partitions):
+            yield result
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
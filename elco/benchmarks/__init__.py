@@ -0,0 +1,168 @@
+"""
+Benchmarks of the app's hot paths over synthetic networks of configurable
+size: form construction and rendering, model `clean`, code validators, the
+manage views through the test client and tree queries.
+
+Each case is run once to warm caches, once more to count queries, a number of
+times to measure wall time and once under `tracemalloc` to measure peak
+memory. Results are reported as JSON so runs for different releases can be
+compared with `compare`.
+
+Run from the repository root with::
+
+    python -m elco.benchmarks --sizes 1000 10000 --output results.json
+"""
+import gc
+import platform
+import time
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_REPEAT = 5
+
+_LIST_TEMPLATE = ('{% for record in page %}{{ record.code }} {{ record.name }} '
+                  '{{ record.source_label }}\n{% endfor %}'
+                  '{{ page.next_cursor }}')
+
+# settings required by cases besides those of the test runner
+SETTINGS = {
+    'ROOT_URLCONF': 'elco.benchmarks.urls',
+    'TEMPLATES': [{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'OPTIONS': {
+            'loaders': [('django.template.loaders.locmem.Loader', {
+                'elco/station_form.html': '{{ form.as_p }}',
+                'elco/powerline_form.html': '{{ form.as_p }}',
+                'elco/station_list.html': _LIST_TEMPLATE,
+                'elco/powerline_list.html': _LIST_TEMPLATE,
+            })],
+        },
+    }],
+}
+
+
+
+def measure(func, repeat=DEFAULT_REPEAT):
+    """Returns the query count, wall times and peak memory of func as a dict.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    func()
+    with CaptureQueriesContext(connection) as context:
+        func()
+    queries = len(context.captured_queries)
+
+    times = []
+    gc.collect()
+    for _ in range(repeat):
+        start = default_timer()
+        func()
+        times.append(default_timer() - start)
+
+    peak_memory = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            func()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'queries': queries,
+        'wall_time': {'min': min(times), 'mean': sum(times) / len(times),
+                      'max': max(times)},
+        'peak_memory': peak_memory,
+    }
+
+
+def clear_network():
+    """Deletes all network records with raw deletes, bypassing signals."""
+    from django.db import connection, transaction
+    from ..models import PowerLine, Station, Transformer, TransformerRating
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in (Transformer, TransformerRating, Station, PowerLine):
+            cursor.execute('DELETE FROM %s' % qn(model._meta.db_table))
+
+
+def run(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, names=None, log=None):
+    """Generates a network for each size and runs benchmark cases against
+    it, optionally only those named. Returns results as a dict.
+    """
+    from . import cases
+    from ..generator import generate_network
+    from ..importer import refresh_derived_data
+
+    results = []
+    for size in sizes:
+        clear_network()
+        refresh_derived_data()
+        start = default_timer()
+        try:
+            created = generate_network(size)
+        except ValueError as ex:
+            results.append({'size': size, 'skipped': str(ex)})
+            continue
+        entry = {'size': size, 'created': created,
+                 'generate_time': default_timer() - start, 'cases': {}}
+
+        for name, func in cases.get_cases(names):
+            if log:
+                log("%s stations: %s" % (size, name))
+            entry['cases'][name] = measure(func, repeat)
+        results.append(entry)
+    return make_report(results, repeat)
+
+
+def make_report(results, repeat):
+    """Returns results along with details of the environment they were
+    measured in as a dict.
+    """
+    import django
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': _get_vendor(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def _get_vendor():
+    from django.db import connection
+    return connection.vendor
+
+
+def compare(current, baseline, threshold=0.2):
+    """Returns (size, case, metric, baseline, current) tuples for metrics
+    which regressed by more than threshold, as a fraction, from baseline.
+    """
+    def index(report):
+        return dict((entry['size'], entry.get('cases', {}))
+                    for entry in report['results'])
+
+    regressions = []
+    baseline = index(baseline)
+    for size, cases in sorted(index(current).items()):
+        for name, result in sorted(cases.items()):
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            for metric, get in (
+                    ('wall_time', lambda r: r['wall_time']['min']),
+                    ('queries', lambda r: r['queries']),
+                    ('peak_memory', lambda r: r['peak_memory'])):
+                old, new = get(previous), get(result)
+                if old is not None and new is not None and \
+                        new > old * (1 + threshold) and new > old:
+                    regressions.append((size, name, metric, old, new))
+    return regressions
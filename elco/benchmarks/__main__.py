@@ -0,0 +1,109 @@
+"""
+Runs the benchmark suite against a scratch SQLite database, or the database
+named by --database, writing results as JSON.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+
+BASE_DIR = os.path.join(os.path.dirname(__file__), '..', '..')
+sys.path.insert(0, BASE_DIR)
+
+
+
+def configure(database):
+    from django.conf import settings
+    from elco import benchmarks
+    
+    options = dict(benchmarks.SETTINGS)
+    options.update({
+        'INSTALLED_APPS': ('address', 'elco'),
+        'DATABASES': {
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': database,
+            },
+        },
+        'MIDDLEWARE_CLASSES': (
+            'elco.middleware.IdentityMapMiddleware',
+        ),
+        'ALLOWED_HOSTS': ['testserver'],
+    })
+    settings.configure(**options)
+    
+    import django
+    django.setup()
+    
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m elco.benchmarks',
+                                     description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help="Numbers of stations of networks to generate.")
+    parser.add_argument('--repeat', type=int,
+                        help="Number of timed runs per case.")
+    parser.add_argument('--case', action='append', dest='cases',
+                        help="Name of a case to run; may be repeated.")
+    parser.add_argument('--plans', action='store_true',
+                        help="Report query plans and latency of queries for "
+                             "active records before and after their indexes "
+                             "instead of running cases.")
+    parser.add_argument('--database',
+                        help="Path to SQLite database; a scratch database "
+                             "is used by default.")
+    parser.add_argument('--output', help="Path to write JSON results.")
+    parser.add_argument('--compare',
+                        help="Path to JSON results to report regressions "
+                             "against.")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Fraction by which a metric must grow to be "
+                             "reported as a regression.")
+    args = parser.parse_args(argv)
+    
+    tempdir = None
+    if not args.database:
+        tempdir = tempfile.mkdtemp()
+        args.database = os.path.join(tempdir, 'benchmark.sqlite3')
+    
+    try:
+        configure(args.database)
+        from elco import benchmarks
+        from elco.benchmarks import plans
+        sizes = args.sizes or benchmarks.DEFAULT_SIZES
+        repeat = args.repeat or benchmarks.DEFAULT_REPEAT
+        log = lambda message: sys.stderr.write(message + '\n')
+        if args.plans:
+            report = plans.run(sizes, repeat, log=log)
+        else:
+            report = benchmarks.run(sizes, repeat, args.cases, log=log)
+    finally:
+        if tempdir:
+            shutil.rmtree(tempdir)
+    
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + '\n')
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = benchmarks.compare(report, baseline, args.threshold)
+        for size, name, metric, old, new in regressions:
+            sys.stderr.write("%s stations, %s: %s regressed from %s to %s\n"
+                             % (size, name, metric, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+Benchmark cases run against a generated network. Each case is a callable
+taking no arguments, registered under a name with the `case` decorator.
+"""
+from collections import OrderedDict
+
+from django.core.urlresolvers import reverse
+from django.forms.models import model_to_dict
+from django.test import Client
+
+from .. import allocation, impact, metrics, snapshot, topology
+from ..constants import Voltage
+from ..forms import PowerLineForm, StationForm
+from ..models import PowerLine, Station
+from ..pagination import DEFAULT_PAGE_SIZE
+from ..validators import validate_station_code_format, validate_station_codes
+
+
+# maximum number of codes passed to validator cases
+MAX_CODES = 10000
+
+# number of feeders failed at once by batch impact cases
+MAX_FAULTS = 10
+
+# number of codes reserved at once by bulk allocation cases
+MAX_RESERVED = 1000
+
+_registry = OrderedDict()
+
+
+
+def case(func):
+    _registry[func.__name__] = func
+    return func
+
+
+class Context(object):
+    """Holds records looked up once per network for use by cases."""
+
+    def __init__(self):
+        self.client = Client()
+        self.root = Station.objects.filter(source_feeder__isnull=True)\
+                                   .order_by('pk').first()
+        self.injection = Station.objects.filter(category=Station.INJECTION)\
+                                        .order_by('pk').first()
+        self.station = Station.objects.filter(category=Station.DISTRIBUTION)\
+                                      .order_by('pk').first()
+        self.feeder = self.station.source_feeder
+        self.codes = list(Station.objects.order_by('pk')
+                          .values_list('code', flat=True)[:MAX_CODES])
+        self.faults = list(PowerLine.objects.filter(voltage=Voltage.MVOLTH)
+                           .order_by('pk')
+                           .values_list('code', flat=True)[:MAX_FAULTS])
+        # built on first use by snapshot cases
+        self.snapshot = None
+        # cursor to the last page of stations listed by code
+        self.last_page = list(Station.objects.order_by('-code')
+                              .values_list('code', flat=True)
+                              [:DEFAULT_PAGE_SIZE + 1])[-1]
+
+
+def get_cases(names=None):
+    """Returns (name, callable) pairs for cases bound to the current network,
+    optionally only those named.
+    """
+    context = Context()
+    return [(name, _bind(func, context)) for name, func in _registry.items()
+            if not names or name in names]
+
+
+def _bind(func, context):
+    return lambda: func(context)
+
+
+def _post_data(form):
+    values = model_to_dict(form.instance, fields=form._meta.fields)
+    return dict((k, v) for k, v in values.items() if v is not None)
+
+
+@case
+def station_form_init(ctx):
+    StationForm(Station.DISTRIBUTION, instance=ctx.station)
+
+
+@case
+def station_form_render(ctx):
+    StationForm(Station.DISTRIBUTION, instance=ctx.station).as_p()
+
+
+@case
+def station_form_render_autocomplete(ctx):
+    StationForm(Station.DISTRIBUTION, instance=ctx.station,
+                autocomplete=True).as_p()
+
+
+@case
+def powerline_form_init(ctx):
+    PowerLineForm(PowerLine.FEEDER, instance=ctx.feeder)
+
+
+@case
+def powerline_form_render(ctx):
+    PowerLineForm(PowerLine.FEEDER, instance=ctx.feeder).as_p()
+
+
+@case
+def station_clean(ctx):
+    Station.objects.get(pk=ctx.station.pk).full_clean()
+
+
+@case
+def powerline_clean(ctx):
+    PowerLine.objects.get(pk=ctx.feeder.pk).full_clean()
+
+
+@case
+def validate_codes_scalar(ctx):
+    for code in ctx.codes:
+        validate_station_code_format(code)
+
+
+@case
+def validate_codes_batch(ctx):
+    validate_station_codes(ctx.codes)
+
+
+@case
+def manage_station_get(ctx):
+    url = reverse('manage_station', kwargs={'station_id': ctx.station.pk})
+    response = ctx.client.get(url)
+    assert response.status_code == 200, "Form not rendered."
+
+
+@case
+def manage_station_post(ctx):
+    url = reverse('manage_station', kwargs={'station_id': ctx.station.pk})
+    form = StationForm(Station.DISTRIBUTION, instance=ctx.station)
+    response = ctx.client.post(url, _post_data(form))
+    assert response.status_code == 302, "Station form rejected."
+
+
+@case
+def manage_powerline_get(ctx):
+    url = reverse('manage_powerline', kwargs={'powerline_id': ctx.feeder.pk})
+    response = ctx.client.get(url)
+    assert response.status_code == 200, "Form not rendered."
+
+
+@case
+def manage_powerline_post(ctx):
+    url = reverse('manage_powerline', kwargs={'powerline_id': ctx.feeder.pk})
+    form = PowerLineForm(PowerLine.FEEDER, instance=ctx.feeder)
+    response = ctx.client.post(url, _post_data(form))
+    assert response.status_code == 302, "Power line form rejected."
+
+
+@case
+def list_stations_first_page(ctx):
+    response = ctx.client.get(reverse('list_stations'))
+    assert response.status_code == 200, "List not rendered."
+
+
+@case
+def list_stations_last_page(ctx):
+    response = ctx.client.get(reverse('list_stations'),
+                              {'after': ctx.last_page})
+    assert response.status_code == 200, "List not rendered."
+
+
+@case
+def list_stations_filtered(ctx):
+    response = ctx.client.get(reverse('list_stations'), {
+        'category': Station.DISTRIBUTION, 'is_active': '1',
+        'source_feeder': ctx.feeder.code})
+    assert response.status_code == 200, "List not rendered."
+
+
+@case
+def list_powerlines_first_page(ctx):
+    response = ctx.client.get(reverse('list_powerlines'))
+    assert response.status_code == 200, "List not rendered."
+
+
+@case
+def descendants_of(ctx):
+    Station.objects.descendants_of(ctx.root.code).count()
+
+
+@case
+def ancestors_of(ctx):
+    list(PowerLine.objects.ancestors_of(ctx.station.code)
+                          .values_list('code', flat=True))
+
+
+@case
+def subtree_stats(ctx):
+    Station.objects.subtree_stats(ctx.injection.code)
+
+
+@case
+def under_path(ctx):
+    Station.objects.under_path(ctx.root.path).count()
+
+
+@case
+def topology_build(ctx):
+    topology.TopologyIndex.build()
+
+
+@case
+def topology_downstream(ctx):
+    topology.get_index().downstream(ctx.root.code)
+
+
+@case
+def impact_build(ctx):
+    impact.ImpactIndex.build()
+
+
+@case
+def impact_feeder(ctx):
+    impact.get_index().analyze([ctx.feeder.code]).as_dict()
+
+
+@case
+def impact_batch(ctx):
+    impact.get_index().analyze(ctx.faults).as_dict()
+
+
+@case
+def impact_totals(ctx):
+    result = impact.get_index().analyze([ctx.root.code])
+    result.transformer_count, result.capacity
+
+
+@case
+def reserve_codes_bulk(ctx):
+    # reserved codes are released so each run finds the same keyspace
+    key = max(sorted(allocation.KEYSPACES), key=allocation.available)
+    codes = allocation.reserve_many(
+        key, min(MAX_RESERVED, allocation.available(key)))
+    allocation.release(codes)
+
+
+if snapshot.np is not None:
+    @case
+    def snapshot_build(ctx):
+        snapshot.build()
+
+    @case
+    def snapshot_capacity(ctx):
+        if ctx.snapshot is None:
+            ctx.snapshot = snapshot.build()
+        ctx.snapshot.capacity_by_feeder()
+        ctx.snapshot.count_stations('voltage_ratio')
+
+
+@case
+def metrics_observe(ctx):
+    histogram = metrics.Histogram('benchmark', '', ('view',), registry=None)
+    for _ in range(10000):
+        histogram.observe(0.001, ('manage_station',))
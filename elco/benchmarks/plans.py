@@ -0,0 +1,126 @@
+"""
+Query plans and latency of queries for active records, measured before and
+after the indexes over active rows are created.
+
+A share of the records of each generated network is soft-deleted, then each
+query is explained and measured with the schema migrated back to before the
+indexes, where `is_active` has an index of its own, and again with the schema
+migrated forward to the latest migration, where it is left afterwards. Run from the repository root with::
+
+    python -m elco.benchmarks --plans --sizes 10000 131070
+"""
+from collections import OrderedDict
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+
+from ..constants import Voltage
+from ..models import PowerLine, Station
+from ..pagination import DEFAULT_PAGE_SIZE
+
+
+# one in this many records is soft-deleted
+INACTIVE_STEP = 5
+
+# migration of the app before the indexes over active rows
+BEFORE_MIGRATION = '0001_initial'
+
+
+
+def get_queries():
+    """Returns querysets for active records keyed by name, as read by the
+    list views and form choices.
+    """
+    injection = Station.objects.filter(category=Station.INJECTION)\
+                               .order_by('pk').first()
+    return OrderedDict([
+        ('stations_by_category', Station.objects.filter(
+            category=Station.INJECTION,
+            voltage_ratio=injection.voltage_ratio).values_list('code')),
+        ('powerlines_by_source', PowerLine.objects.filter(
+            voltage=Voltage.MVOLTL, source_station=injection.code)
+            .values_list('code')),
+        ('stations_page', Station.objects.order_by('code')
+            .values_list('code')[:DEFAULT_PAGE_SIZE + 1]),
+        ('powerlines_page', PowerLine.objects.order_by('code')
+            .values_list('code')[:DEFAULT_PAGE_SIZE + 1]),
+    ])
+
+
+def explain(queryset):
+    """Returns the lines of the plan the database chose for queryset."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql, params)
+        return [' '.join(str(value) for value in row)
+                for row in cursor.fetchall()]
+
+
+def soft_delete(step=INACTIVE_STEP):
+    """Marks one in step Station and PowerLine records inactive with raw
+    updates, bypassing signals.
+    """
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for model in (Station, PowerLine):
+            opts = model._meta
+            cursor.execute('UPDATE %s SET %s = %%s WHERE %s %%%% %%s = 0' % (
+                qn(opts.db_table), qn(opts.get_field('is_active').column),
+                qn(opts.pk.column)), [False, step])
+
+
+def get_leaf_migration():
+    """Returns the name of the latest migration of the app."""
+    loader = MigrationLoader(connection, ignore_no_migrations=True)
+    return loader.graph.leaf_nodes('elco')[0][1]
+
+
+def _analyze():
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def run(sizes, repeat, log=None):
+    """Generates a network for each size and reports the plan and
+    measurements of each query before and after the indexes as a dict,
+    leaving the schema at the latest migration.
+    """
+    from . import clear_network, make_report, measure
+    from ..generator import generate_network
+    from ..importer import refresh_derived_data
+
+    leaf = get_leaf_migration()
+    migrations = (('before', BEFORE_MIGRATION), ('after', leaf))
+    results = []
+    try:
+        for size in sizes:
+            clear_network()
+            refresh_derived_data()
+            try:
+                created = generate_network(size)
+            except ValueError as ex:
+                results.append({'size': size, 'skipped': str(ex)})
+                continue
+            soft_delete()
+            entry = {'size': size, 'created': created,
+                     'inactive_step': INACTIVE_STEP,
+                     'queries': OrderedDict()}
+
+            for label, migration in migrations:
+                call_command('migrate', 'elco', migration, verbosity=0)
+                _analyze()
+                for name, queryset in get_queries().items():
+                    if log:
+                        log("%s stations, %s: %s" % (size, label, name))
+                    result = measure(lambda: list(queryset.all()), repeat)
+                    result['plan'] = explain(queryset)
+                    entry['queries'].setdefault(name, {})[label] = result
+            results.append(entry)
+    finally:
+        call_command('migrate', 'elco', leaf, verbosity=0)
+    return make_report(results, repeat)
@@ -0,0 +1,13 @@
+from django.conf.urls import include, url
+
+from .. import views
+
+
+
+urlpatterns = [
+    url(r'^stations/(?P<station_id>\d+)/$', views.manage_station,
+        name='manage_station'),
+    url(r'^powerlines/(?P<powerline_id>\d+)/$', views.manage_powerline,
+        name='manage_powerline'),
+    url(r'^', include('elco.urls')),
+]
@@ -0,0 +1,216 @@
+"""
+A read-through cache for Station and PowerLine records, looked up by either
+pk or code, on top of Django's cache framework.
+
+Records are cached under their pk, with entries under their code pointing to
+the pk. Within a request, or any block wrapped with `identity_map`, records
+are further kept in a per-thread map so the same record is never fetched
+twice and the same instance is returned for repeated lookups.
+
+Entries are discarded on save and delete signals once the transaction making
+the change commits, so a lookup in between cannot cache the record as it was
+before. Entries are filled with `cache.add` under the version of the model
+read before fetching the record, so a fill racing with a newer one never
+replaces it, and one racing with `invalidate_model` lands under the discarded
+version. Bulk updates, which send no signals, should call `invalidate_model`
+to discard every cached record of the affected model.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404
+
+from . import metrics
+from .models import PowerLine, Station
+
+
+CACHE_KEY_PREFIX = 'elco:record'
+CACHE_TIMEOUT = 60 * 60
+
+# models whose records are cached, keyed by model name
+CACHED_MODELS = dict((m._meta.model_name, m) for m in (Station, PowerLine))
+
+_local = threading.local()
+
+
+
+def _get_version(model_name):
+    key = '%s:version:%s' % (CACHE_KEY_PREFIX, model_name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+@contextmanager
+def identity_map():
+    """Keeps records looked up within the block in a per-thread map."""
+    previous = getattr(_local, 'records', None)
+    _local.records = {} if previous is None else previous
+    try:
+        yield _local.records
+    finally:
+        _local.records = previous
+
+
+def activate_identity_map():
+    """Starts a per-thread identity map, discarding any previous one."""
+    _local.records = {}
+
+
+def deactivate_identity_map():
+    """Ends the per-thread identity map."""
+    _local.records = None
+
+
+def _get_identity_map():
+    return getattr(_local, 'records', None)
+
+
+def _make_key(model_name, lookup, value, version=None):
+    if version is None:
+        version = _get_version(model_name)
+    return '%s:%s:%s:%s:%s' % (CACHE_KEY_PREFIX, model_name, version, lookup,
+                               value)
+
+
+def get_object(model, pk=None, code=None):
+    """Returns the record of model with provided pk or code, raising
+    model.DoesNotExist if there is none.
+    """
+    model_name = model._meta.model_name
+    if model_name not in CACHED_MODELS:
+        raise ValueError("Records of %s are not cached." % model_name)
+    if (pk is None) == (code is None):
+        raise ValueError("Exactly one of pk or code must be provided.")
+
+    lookup, value = (('pk', int(pk)) if pk is not None else ('code', code))
+    records = _get_identity_map()
+    if records is not None:
+        record = records.get((model_name, lookup, value))
+        if record is not None:
+            metrics.CACHE_REQUESTS.inc(('identity_map', model_name, 'hit'))
+            return record
+        metrics.CACHE_REQUESTS.inc(('identity_map', model_name, 'miss'))
+
+    record = _get_cached(model, model_name, lookup, value)
+    metrics.CACHE_REQUESTS.inc(
+        ('record', model_name, 'miss' if record is None else 'hit'))
+    if record is None:
+        version = _get_version(model_name)
+        record = model._default_manager.get(**{lookup: value})
+        cache.add(_make_key(model_name, 'pk', record.pk, version), record,
+                  CACHE_TIMEOUT)
+        cache.add(_make_key(model_name, 'code', record.code, version),
+                  record.pk, CACHE_TIMEOUT)
+
+    if records is not None:
+        records[(model_name, 'pk', record.pk)] = record
+        records[(model_name, 'code', record.code)] = record
+    return record
+
+
+def _get_cached(model, model_name, lookup, value):
+    if lookup == 'pk':
+        return cache.get(_make_key(model_name, 'pk', value))
+
+    # entries under code point to pk; the record found is checked to still
+    # carry the code as the pointer is not discarded when a code changes.
+    pk = cache.get(_make_key(model_name, 'code', value))
+    if pk is None:
+        return None
+    record = cache.get(_make_key(model_name, 'pk', pk))
+    if record is not None and record.code == value:
+        return record
+    return None
+
+
+def get_object_or_404(model, pk=None, code=None):
+    """Returns the record of model with provided pk or code, raising Http404
+    if there is none.
+    """
+    try:
+        return get_object(model, pk=pk, code=code)
+    except model.DoesNotExist:
+        raise Http404("No %s matches the given query." %
+                      model._meta.object_name)
+
+
+def get_related(instance, field_name):
+    """Returns the record referenced by the named foreign key of instance,
+    going through the cache where the related model is cached. The record is
+    also set on the instance as Django does on first access.
+    """
+    field = instance._meta.get_field(field_name)
+    cache_name = field.get_cache_name()
+    if hasattr(instance, cache_name):
+        return getattr(instance, cache_name)
+
+    value = getattr(instance, field.attname)
+    if value is None:
+        return None
+
+    related_model = field.related_model
+    if related_model._meta.model_name not in CACHED_MODELS:
+        return getattr(instance, field_name)
+
+    lookup = field.remote_field.field_name
+    record = get_object(related_model, **{lookup: value})
+    setattr(instance, cache_name, record)
+    return record
+
+
+def invalidate(instance):
+    """Discards cached entries for the provided record."""
+    invalidate_many(type(instance), [(instance.pk, instance.code)])
+
+
+def invalidate_many(model, records):
+    """Discards cached entries for records of model given as (pk, code)."""
+    model_name = model._meta.model_name
+    keys = []
+    for pk, code in records:
+        keys.extend((_make_key(model_name, 'pk', pk),
+                     _make_key(model_name, 'code', code)))
+    cache.delete_many(keys)
+
+    identity_map = _get_identity_map()
+    if identity_map is not None:
+        pks = set(pk for pk, _ in records)
+        for key in [k for k, v in identity_map.items()
+                    if k[0] == model_name and v.pk in pks]:
+            del identity_map[key]
+
+
+def invalidate_model(model):
+    """Discards all cached entries for records of the provided model."""
+    model_name = model._meta.model_name
+    try:
+        cache.incr('%s:version:%s' % (CACHE_KEY_PREFIX, model_name))
+    except ValueError:
+        # no version yet, thus nothing cached
+        pass
+
+    records = _get_identity_map()
+    if records is not None:
+        for key in [k for k in records if k[0] == model_name]:
+            del records[key]
+
+
+def _on_record_changed(sender, instance, **kwargs):
+    # pk and code are read now as deletion clears the pk
+    records = [(instance.pk, instance.code)]
+    transaction.on_commit(lambda: invalidate_many(sender, records))
+
+
+def connect_signals():
+    uid = 'elco.caching.%s_%s'
+    for model_name, model in CACHED_MODELS.items():
+        post_save.connect(_on_record_changed, sender=model,
+                          dispatch_uid=uid % (model_name, 'saved'))
+        post_delete.connect(_on_record_changed, sender=model,
+                            dispatch_uid=uid % (model_name, 'deleted'))
@@ -0,0 +1,227 @@
+"""
+An append-only log of changes made to Station, PowerLine, TransformerRating
+and Transformer records, read by clients holding a copy of the network to
+pull only what changed since they last synced.
+
+Each `Change` entry carries a sequence number, the row version of the record
+after the change and, as JSON, the values of the fields which changed: all
+fields for a created record, changed fields for an updated one and none for a
+deleted one. Fields logged are those read by the importer; derived fields such
+as paths and rollups are left out.
+
+Entries are written from save and delete signals. Bulk writes send no signals,
+thus code writing records in bulk logs them with `log_created` and applies
+updates with `log_update`.
+
+Sequence numbers are assigned as entries are inserted. On backends which run
+writers concurrently an entry may commit after one with a higher number, thus
+clients should overlap their `since` cursor where that matters.
+"""
+import json
+
+from django.db.models import F, Max
+from django.db.models.signals import post_delete, post_save, pre_delete,\
+        pre_save
+
+from .importer import POWERLINE_FIELDS, RATING_FIELDS, STATION_FIELDS,\
+        TRANSFORMER_FIELDS
+from .models import Change, PowerLine, Station, Transformer,\
+        TransformerRating
+
+
+DEFAULT_BATCH_SIZE = 500
+
+# fields logged for each model
+LOGGED_FIELDS = {
+    Station: STATION_FIELDS + ('source_feeder',),
+    PowerLine: POWERLINE_FIELDS,
+    TransformerRating: RATING_FIELDS,
+    Transformer: TRANSFORMER_FIELDS,
+}
+
+
+
+def _get_attnames(model):
+    opts = model._meta
+    return [opts.get_field(f).attname for f in LOGGED_FIELDS[model]]
+
+
+def _encode(values):
+    if not values:
+        return ''
+    return json.dumps(values, sort_keys=True, separators=(',', ':'),
+                      default=str)
+
+
+def _make_change(model, pk, code, action, row_version, values=None):
+    return Change(model=model._meta.model_name, object_id=pk, code=code,
+                  action=action, row_version=row_version,
+                  data=_encode(values))
+
+
+def _on_saving(sender, instance, update_fields=None, **kwargs):
+    fields, names = LOGGED_FIELDS[sender], _get_attnames(sender)
+    new = dict((f, getattr(instance, n)) for f, n in zip(fields, names))
+    old = None
+    if instance.pk is not None:
+        old = sender._default_manager.filter(pk=instance.pk)\
+                    .values('row_version', *names).first()
+
+    if old is None:
+        instance.row_version = 1
+        instance._change = (Change.CREATE, new)
+        return
+
+    delta = dict((f, new[f]) for f, n in zip(fields, names)
+                 if old[n] != new[f] and
+                 (update_fields is None or f in update_fields))
+    if delta:
+        instance.row_version = old['row_version'] + 1
+        instance._change = (Change.UPDATE, delta)
+    else:
+        instance.row_version = old['row_version']
+        instance._change = None
+
+
+def _on_saved(sender, instance, update_fields=None, **kwargs):
+    change = instance.__dict__.pop('_change', None)
+    if change is None:
+        return
+
+    if update_fields is not None and 'row_version' not in update_fields:
+        sender._default_manager.filter(pk=instance.pk)\
+              .update(row_version=instance.row_version)
+    action, values = change
+    _make_change(sender, instance.pk, instance.code, action,
+                 instance.row_version, values).save()
+
+
+def _on_deleting(sender, instance, **kwargs):
+    instance._deleted_version = sender._default_manager\
+            .filter(pk=instance.pk)\
+            .values_list('row_version', flat=True).first()
+
+
+def _on_deleted(sender, instance, **kwargs):
+    row_version = instance.__dict__.pop('_deleted_version', None)
+    if row_version is None:
+        row_version = instance.row_version
+    _make_change(sender, instance.pk, instance.code, Change.DELETE,
+                 row_version + 1).save()
+
+
+def log_created(model, records, batch_size=DEFAULT_BATCH_SIZE):
+    """Logs a create entry for each of the provided records of model written
+    in bulk, reading their values in batches.
+    """
+    fields, names = LOGGED_FIELDS[model], _get_attnames(model)
+    records = records.order_by('pk')\
+                     .values_list('pk', 'code', 'row_version', *names)
+    last_pk = None
+    while True:
+        batch = records if last_pk is None else records.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        Change.objects.bulk_create([
+            _make_change(model, row[0], row[1], Change.CREATE, row[2],
+                         dict(zip(fields, row[3:])))
+            for row in batch])
+        if len(batch) < batch_size:
+            return
+        last_pk = batch[-1][0]
+
+
+def log_update(model, records, batch_size=DEFAULT_BATCH_SIZE, **values):
+    """Applies a bulk update of the provided field values to records of
+    model, bumping their row version, and logs an update entry for each.
+    """
+    opts = model._meta
+    data = {}
+    for name, value in values.items():
+        field = opts.get_field(name)
+        if field.is_relation and isinstance(value, field.related_model):
+            value = getattr(value, field.remote_field.field_name)
+        if name in LOGGED_FIELDS[model]:
+            data[name] = value
+
+    changed = list(records.values_list('pk', 'code', 'row_version'))
+    for start in range(0, len(changed), batch_size):
+        batch = changed[start:start + batch_size]
+        model._default_manager.filter(pk__in=[pk for pk, _, _ in batch])\
+             .update(row_version=F('row_version') + 1, **values)
+        Change.objects.bulk_create([
+            _make_change(model, pk, code, Change.UPDATE, row_version + 1,
+                         data)
+            for pk, code, row_version in batch])
+
+
+def get_last_pk(model):
+    """Returns the highest pk of model records, 0 where there is none; used
+    to select records written after it for `log_created`.
+    """
+    return model._default_manager.aggregate(last=Max('pk'))['last'] or 0
+
+
+def get_version(model_name, pk):
+    """Returns (seq, timestamp) of the last change logged for the record of
+    the named model with pk; None where no change is logged or the record has
+    been deleted. Only the change log is read.
+    """
+    last = Change.objects.filter(model=model_name, object_id=pk)\
+                         .order_by('-seq')\
+                         .values_list('seq', 'timestamp', 'action').first()
+    if last is None or last[2] == Change.DELETE:
+        return None
+    return last[:2]
+
+
+def get_collection_versions(model_names):
+    """Returns (seq, timestamp) of the last change logged for records of
+    each of the named models keyed by name, with a single query over the
+    change log; models without logged changes are left out.
+    """
+    rows = Change.objects.filter(model__in=model_names).values('model')\
+                 .annotate(last_seq=Max('seq'), last_time=Max('timestamp'))\
+                 .order_by()
+    return dict((row['model'], (row['last_seq'], row['last_time']))
+                for row in rows)
+
+
+def changes_since(seq=0, limit=DEFAULT_BATCH_SIZE, models=None):
+    """Returns a batch of up to limit changes logged after the provided
+    sequence number, oldest first, optionally only those for the named
+    models, as a dict holding the `changes`, the `last_seq` to pass to get
+    the next batch and whether `more` changes follow.
+    """
+    entries = Change.objects.filter(seq__gt=seq).order_by('seq')
+    if models:
+        entries = entries.filter(model__in=models)
+    rows = list(entries.values_list(
+        'seq', 'model', 'object_id', 'code', 'action', 'row_version',
+        'data')[:limit + 1])
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    changes = [{
+        'seq': row[0], 'model': row[1], 'id': row[2], 'code': row[3],
+        'action': row[4], 'version': row[5],
+        'data': json.loads(row[6]) if row[6] else {},
+    } for row in rows]
+    return {
+        'changes': changes,
+        'last_seq': rows[-1][0] if rows else seq,
+        'more': more,
+    }
+
+
+def connect_signals():
+    uid = 'elco.changelog.%s.%s'
+    for model in LOGGED_FIELDS:
+        name = model._meta.model_name
+        pre_save.connect(_on_saving, sender=model,
+                         dispatch_uid=uid % (name, 'saving'))
+        post_save.connect(_on_saved, sender=model,
+                          dispatch_uid=uid % (name, 'saved'))
+        pre_delete.connect(_on_deleting, sender=model,
+                           dispatch_uid=uid % (name, 'deleting'))
+        post_delete.connect(_on_deleted, sender=model,
+                            dispatch_uid=uid % (name, 'deleted'))
@@ -0,0 +1,177 @@
+"""
+Cached choice lists for the source feeder and source station fields of the
+Station and PowerLine forms.
+
+Choices are stored as lightweight (code, label) tuples built from a values
+query, thus no model instance is created to render them. Cached lists are
+keyed by the filter applied and by a version number per model which is bumped
+whenever a record of that model is saved or deleted.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+
+from . import metrics
+from .constants import Voltage
+from .models import PowerLine, Station
+
+
+CACHE_KEY_PREFIX = 'elco:choices'
+CACHE_TIMEOUT = 60 * 60
+
+
+
+def _get_version(model_name):
+    key = '%s:version:%s' % (CACHE_KEY_PREFIX, model_name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _get_cached(model_name, filter_key, build):
+    key = '%s:%s:%s:%s' % (CACHE_KEY_PREFIX, model_name,
+                           _get_version(model_name), filter_key)
+    choices = cache.get(key)
+    metrics.CACHE_REQUESTS.inc(
+        ('choices', model_name, 'miss' if choices is None else 'hit'))
+    if choices is None:
+        choices = build()
+        cache.set(key, choices, CACHE_TIMEOUT)
+    return choices
+
+
+def get_feeder_voltages(category=None):
+    """Returns voltages of power lines which can feed a station of the
+    provided category; None for transmission stations which have no feeder.
+    """
+    # expects 33KV feeder as source; distribution substations are
+    # some what a misnoma as can accept both 33KV & 11KV source.
+    if category == Station.TRANSMISSION:
+        return None
+    if category == Station.INJECTION:
+        return (Voltage.MVOLTH,)
+    return (Voltage.MVOLTH, Voltage.MVOLTL)
+
+
+def get_station_categories(line_type=None):
+    """Returns categories of stations which can be the source of a power line
+    of the provided type; None where all categories apply.
+    """
+    if line_type == PowerLine.UPRISER:
+        return (Station.DISTRIBUTION,)
+    if line_type == PowerLine.FEEDER:
+        return (Station.TRANSMISSION, Station.INJECTION)
+    return None
+
+
+def get_feeder_label(name, voltage):
+    return "%s %s" % (name, Voltage._text[voltage])
+
+
+def get_station_label(name, voltage_ratio):
+    return "%s %s" % (name, Voltage.Ratio._text[voltage_ratio])
+
+
+def _feeder_queryset(voltages):
+    return PowerLine.objects.all_with_inactive()\
+                            .filter(voltage__in=voltages)\
+                            .values_list('code', 'name', 'voltage')
+
+
+def _station_queryset(categories):
+    records = Station.objects.all_with_inactive()
+    if categories:
+        records = records.filter(category__in=categories)
+    return records.values_list('code', 'name', 'voltage_ratio')
+
+
+def _prefix_filter(prefix):
+    return (Q(code__startswith=prefix.upper()) |
+            Q(alt_code__istartswith=prefix) |
+            Q(name__istartswith=prefix))
+
+
+def get_feeder_choices(voltages):
+    """Returns (code, label) tuples for power lines of the provided voltages."""
+    voltages = tuple(sorted(voltages))
+
+    def build():
+        records = _feeder_queryset(voltages).order_by('pk')
+        return tuple((code, get_feeder_label(name, voltage))
+                     for code, name, voltage in records.iterator())
+
+    filter_key = ','.join(str(x) for x in voltages)
+    return _get_cached('powerline', filter_key, build)
+
+
+def get_station_choices(categories=None):
+    """Returns (code, label) tuples for stations of the provided categories
+    or for all stations where categories is not provided.
+    """
+    categories = tuple(sorted(categories)) if categories else None
+
+    def build():
+        records = _station_queryset(categories).order_by('pk')
+        return tuple((code, get_station_label(name, voltage_ratio))
+                     for code, name, voltage_ratio in records.iterator())
+
+    filter_key = ','.join(categories) if categories else '*'
+    return _get_cached('station', filter_key, build)
+
+
+def search_feeders(prefix, voltages, offset=0, limit=20):
+    """Returns up to limit (code, label) tuples for power lines of provided
+    voltages whose code, alternate code or name starts with prefix, along
+    with a flag indicating if more matches exist.
+    """
+    records = _feeder_queryset(voltages).filter(_prefix_filter(prefix))\
+                                        .order_by('code')
+    records = list(records[offset:offset + limit + 1])
+    return ([(code, get_feeder_label(name, voltage))
+             for code, name, voltage in records[:limit]],
+            len(records) > limit)
+
+
+def search_stations(prefix, categories, offset=0, limit=20):
+    """Returns up to limit (code, label) tuples for stations of the provided
+    categories whose code, alternate code or name starts with prefix, along
+    with a flag indicating if more matches exist.
+    """
+    records = _station_queryset(categories).filter(_prefix_filter(prefix))\
+                                           .order_by('code')
+    records = list(records[offset:offset + limit + 1])
+    return ([(code, get_station_label(name, voltage_ratio))
+             for code, name, voltage_ratio in records[:limit]],
+            len(records) > limit)
+
+
+def invalidate(model_name):
+    """Discards all cached choices for records of the named model."""
+    key = '%s:version:%s' % (CACHE_KEY_PREFIX, model_name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # no version yet, thus nothing cached
+        pass
+
+
+# versions are bumped once the writer commits, lest a concurrent request
+# refill the cache from the pre-change rows under the new version
+def _on_powerline_changed(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate('powerline'))
+
+
+def _on_station_changed(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate('station'))
+
+
+def connect_signals():
+    uid = 'elco.choices.%s'
+    for signal, name in ((post_save, 'saved'), (post_delete, 'deleted')):
+        signal.connect(_on_powerline_changed, sender=PowerLine,
+                       dispatch_uid=uid % ('powerline_' + name))
+        signal.connect(_on_station_changed, sender=Station,
+                       dispatch_uid=uid % ('station_' + name))
@@ -0,0 +1,82 @@
+"""
+Conditional GET support for elco views.
+
+Responses carry a strong ETag and a Last-Modified date derived from version
+stamps read from the change log: the sequence number of the last change
+logged for each record or collection of records a response is built from.
+Requests whose `If-None-Match` matches the current ETag are answered with 304
+after reading only the change log, thus without the view building forms or
+querying the network tables.
+
+Responses rendering forms embed the CSRF token of the client, thus their
+ETags further carry a digest of that token, so a client is never answered
+304 for a page it fetched with another token.
+"""
+import hashlib
+from functools import wraps
+
+from django.middleware.csrf import get_token
+from django.utils.encoding import force_bytes
+from django.views.decorators.http import condition
+
+from . import changelog
+
+
+
+def get_stamp(collections=(), records=()):
+    """Returns an (etag, last_modified) pair for a response built from the
+    named model collections and (model name, pk) records; None where one of
+    the records has no logged change, as its version can't be told.
+    """
+    parts, times = [], []
+    versions = changelog.get_collection_versions(collections)\
+            if collections else {}
+    for name in collections:
+        version = versions.get(name)
+        parts.append('%s.%s' % (name, version[0] if version else 0))
+        if version:
+            times.append(version[1])
+    for name, pk in records:
+        version = changelog.get_version(name, pk)
+        if version is None:
+            return None
+        parts.append('%s.%s.%s' % (name, pk, version[0]))
+        times.append(version[1])
+    return ('-'.join(parts), max(times) if times else None)
+
+
+def get_form_stamp(request, collections=(), records=()):
+    """Returns the stamp of `get_stamp` for a response rendering a form, with
+    a digest of the CSRF token of the request added to the ETag.
+    """
+    stamp = get_stamp(collections, records)
+    if stamp is None:
+        return None
+    token = hashlib.sha1(force_bytes(get_token(request))).hexdigest()[:16]
+    return ('%s-csrf.%s' % (stamp[0], token), stamp[1])
+
+
+def conditional(stamp_func):
+    """Decorates a view to answer GET and HEAD requests conditionally, with
+    stamp_func returning the (etag, last_modified) pair for a request given
+    the view arguments. Other requests are passed to the view as they are.
+    """
+    def decorator(view):
+        def get_stamp(request, *args, **kwargs):
+            if not hasattr(request, '_elco_stamp'):
+                stamp = stamp_func(request, *args, **kwargs)
+                request._elco_stamp = stamp or (None, None)
+            return request._elco_stamp
+
+        conditional_view = condition(
+            etag_func=lambda *args, **kwargs: get_stamp(*args, **kwargs)[0],
+            last_modified_func=lambda *args, **kwargs:
+                get_stamp(*args, **kwargs)[1])(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            return conditional_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,142 @@
+"""
+A streaming exporter for Station, PowerLine, TransformerRating and Transformer
+records as CSV or JSON-lines, in the same layout read by the importer.
+
+Records are read as `values()` dicts in keyset-paginated chunks ordered by pk,
+thus no model instance is created and only a chunk of rows is held in memory
+at any time regardless of table size. Choice values are written as their
+display text from the `constants` tables, and output can be gzip compressed
+on the fly.
+"""
+import csv
+import json
+import zlib
+
+from .constants import Condition, Voltage
+from .importer import POWERLINE_FIELDS, RATING_FIELDS, STATION_FIELDS,\
+        TRANSFORMER_FIELDS
+from .models import PowerLine, Station, Transformer, TransformerRating
+
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# model and fields exported for each kind of record
+EXPORTS = {
+    'stations': (Station, STATION_FIELDS + ('source_feeder',)),
+    'powerlines': (PowerLine, POWERLINE_FIELDS),
+    'ratings': (TransformerRating, RATING_FIELDS),
+    'transformers': (Transformer, TRANSFORMER_FIELDS),
+}
+
+# display text for choice fields keyed by stored value
+DISPLAY_TEXT = {
+    'category': dict(Station.CATEGORY_CHOICES),
+    'type': dict(PowerLine.POWERLINE_CHOICES),
+    'voltage': Voltage._text,
+    'voltage_ratio': Voltage.Ratio._text,
+    'condition': Condition._text,
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+
+class _Echo(object):
+    """A file-like object returning what is written, used to have rows
+    formatted by a csv writer without buffering them.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_records(model, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields a dict of field values for each record of model, fetching
+    chunk_size records per query after the last pk seen.
+    """
+    opts = model._meta
+    names = [opts.get_field(f).attname for f in fields]
+    records = model._default_manager.order_by('pk')
+    last_pk = None
+    while True:
+        chunk = records if last_pk is None else records.filter(pk__gt=last_pk)
+        chunk = list(chunk.values('pk', *names)[:chunk_size])
+        for values in chunk:
+            last_pk = values.pop('pk')
+            yield dict((f, values[n]) for f, n in zip(fields, names))
+        if len(chunk) < chunk_size:
+            return
+
+
+def iter_rows(kind, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields a list of values for each record of the named kind with choice
+    values replaced by their display text.
+    """
+    model, fields = EXPORTS[kind]
+    lookups = [DISPLAY_TEXT.get(f) for f in fields]
+    for values in iter_records(model, fields, chunk_size):
+        row = []
+        for field, lookup in zip(fields, lookups):
+            value = values[field]
+            if lookup is not None and value is not None:
+                value = lookup.get(value, value)
+            row.append(value)
+        yield row
+
+
+def iter_csv(kind, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields CSV text with a header line followed by a line per record."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORTS[kind][1])
+    for row in iter_rows(kind, chunk_size):
+        yield writer.writerow(['' if v is None else v for v in row])
+
+
+def iter_jsonlines(kind, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields a JSON object line per record."""
+    fields = EXPORTS[kind][1]
+    for row in iter_rows(kind, chunk_size):
+        values = dict(zip(fields, row))
+        yield json.dumps(values, sort_keys=True, default=str) + '\n'
+
+
+def iter_export(kind, fmt='csv', compress=False,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields the export of the named kind of records in the provided format
+    as utf-8 encoded bytes, gzip compressed where requested.
+    """
+    if kind not in EXPORTS:
+        raise ValueError("Unknown export kind: %s" % kind)
+    if fmt not in CONTENT_TYPES:
+        raise ValueError("Unknown export format: %s" % fmt)
+
+    lines = (iter_csv if fmt == 'csv' else iter_jsonlines)(kind, chunk_size)
+    chunks = _join(lines)
+    return gzip_stream(chunks) if compress else chunks
+
+
+def _join(lines, size=64 * 1024):
+    """Yields encoded lines joined into chunks of about size bytes."""
+    buffer, length = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_stream(chunks, level=6):
+    """Yields chunks of bytes compressed as a gzip stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,13 +1,16 @@
+from timeit import default_timer
+
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 from django import forms
 
 from .models import Station, PowerLine
 from .constants import Voltage
-
-
-MSG_INVALID_XFMR_CAPACITY = _("Invalid power transformer capacity")
-MSG_INVALID_VOLTAGE_RATIO = _("Invalid voltage ratio value or text")
+from .ratings import MSG_INVALID_XFMR_CAPACITY, MSG_INVALID_VOLTAGE_RATIO
+from .choices import get_feeder_choices, get_feeder_voltages,\
+        get_station_choices, get_station_categories
+from .widgets import AutocompleteInput
+from . import metrics, ratings
 
 
 
@@ -20,48 +23,7 @@ def build_transformer_rating_code(capacity, voltage_ratio):
             defined under Voltage or the string of the voltage ratio in the
             proper format e.g. 33/11KV.
     """
-    VR, voltage_ratio_text = Voltage.Ratio, None
-    POWER_VRS = (VR.HVOLTL_MVOLTH, VR.HVOLTL_MVOLTL, VR.MVOLTH_MVOLTL)
-    
-    if type(voltage_ratio) is str:
-        try:
-            value = VR.get_value_from_text(voltage_ratio)
-            voltage_ratio_text, voltage_ratio = voltage_ratio, value
-        except:
-            try:
-                value = int(voltage_ratio)
-                voltage_ratio = value
-            except:
-                raise ValueError(MSG_INVALID_VOLTAGE_RATIO)
-        
-    if not voltage_ratio_text:
-        # ensure voltage ratio value is unknown
-        voltage_ratio_text = VR.get_display_text(voltage_ratio)
-    
-    # encode transformer type and voltage ratio
-    xfmr_type = ('P' if voltage_ratio in POWER_VRS else 'D')
-    xfmr_vr = voltage_ratio_text.replace('KV', '')
-    xfmr_vr = xfmr_vr[-1] if xfmr_type == 'P' else xfmr_vr[0]
-    
-    xfmr_cap = ''
-    if capacity < 1000:
-        if xfmr_type == 'P':
-            raise ValueError(MSG_INVALID_XFMR_CAPACITY)
-        xfmr_cap ='{:0>3}'.format(capacity)
-    else:
-        quotient, remainder = (capacity // 1000), (capacity % 1000)
-        if quotient >= 1000:
-            raise ValueError(MSG_INVALID_XFMR_CAPACITY)
-        
-        if remainder == 0:
-            xfmr_cap = ('{:0>2}M' if quotient < 100 else '{}').format(str(quotient))
-        else:
-            xfmr_cap = '{}{[0]}m'.format(str(quotient), str(remainder))
-        
-    code = '{}{}{}'.format(xfmr_type, xfmr_vr, xfmr_cap)
-    if len(code) != 5:
-        raise ValueError(MSG_INVALID_XFMR_CAPACITY)
-    return code
+    return ratings.encode(capacity, voltage_ratio)
 
 
 def _make_generator(choices, text="One", unpack_model=None):
@@ -84,10 +46,14 @@ class StationForm(forms.ModelForm):
                   'notes']
     
     def __init__(self, category=None, source_feeder=None, *args, **kwargs):
+        start = default_timer()
+        self.autocomplete = kwargs.pop('autocomplete', False)
         super(StationForm, self).__init__(*args, **kwargs)
         self._prep_voltage_ratio_field(category, source_feeder)
         self._prep_source_feeder_field(category, source_feeder)
         self._prep_category_field(category, source_feeder)
+        metrics.FORM_INIT_LATENCY.observe(default_timer() - start,
+                                          ('StationForm',))
     
     def _prep_category_field(self, category, source_feeder):
         field_key = 'category'
@@ -105,28 +71,26 @@ class StationForm(forms.ModelForm):
             self.fields[field_key].choices = _make_generator(choices)
     
     def _prep_source_feeder_field(self, category, source_feeder):
-        # expects 33KV feeder as source; distribution substations are
-        # some what a misnoma as can accept both 33KV & 11KV source. 
-        if category == Station.TRANSMISSION:
-            choices = _make_generator([], "Not Applicable")
-        else:
-            manager = PowerLine.objects
-            station_input = ((Voltage.MVOLTH,)
-                if category == Station.INJECTION
-                else (Voltage.MVOLTH, Voltage.MVOLTL)) 
-            
-            records = manager.filter(voltage__in=station_input)
-            choices = _make_generator(records, unpack_model=lambda r: (r.code, r))
-        
-        # prepare field
         field_key = 'source_feeder'
-        self.fields[field_key].choices = choices
-        if category == Station.TRANSMISSION:
+        station_input = get_feeder_voltages(category)
+        if station_input is None:
             del self.fields[field_key]
+            return
+        
+        # prepare field
+        field = self.fields[field_key]
+        if self.autocomplete:
+            field.queryset = PowerLine.objects.all_with_inactive().filter(
+                voltage__in=station_input)
+            field.widget = AutocompleteInput(
+                'feeders', {'category': category or ''})
+        else:
+            records = get_feeder_choices(station_input)
+            field.choices = _make_generator(records)
         
         if source_feeder:
-            self.fields[field_key].initial = source_feeder.code
-            self.fields[field_key].widget.attrs['disabled'] = True
+            field.initial = source_feeder.code
+            field.widget.attrs['disabled'] = True
     
     def _prep_voltage_ratio_field(self, category, source_feeder):
         VR, choices = Voltage.Ratio, Voltage.Ratio.CHOICES
@@ -163,6 +127,8 @@ class PowerLineForm(forms.ModelForm):
 
     def __init__(self, line_type=None, source_station=None, 
                  hide_widgets=False, *args, **kwargs):
+        start = default_timer()
+        self.autocomplete = kwargs.pop('autocomplete', False)
         super(PowerLineForm, self).__init__(*args, **kwargs)
         self.hide_widgets = hide_widgets
         if source_station:
@@ -173,6 +139,8 @@ class PowerLineForm(forms.ModelForm):
         self._prep_line_type_field(line_type)
         self._prep_voltage_field(line_type, source_station)
         self._prep_source_station(line_type, source_station)
+        metrics.FORM_INIT_LATENCY.observe(default_timer() - start,
+                                          ('PowerLineForm',))
     
     def _prep_line_type_field(self, line_type):
         field_key = 'type'
@@ -213,26 +181,24 @@ class PowerLineForm(forms.ModelForm):
                 del self.fields[field_key]
     
     def _prep_source_station(self, line_type, source_station):
-        manager = Station.objects
-        if not line_type:
-            records = manager.all()
-        else:
-            if line_type == PowerLine.UPRISER:
-                records = manager.filter(category=Station.DISTRIBUTION)
-            else:
-                expected = (Station.TRANSMISSION, Station.INJECTION)
-                records = manager.filter(category__in=expected)
-        
-        choices = _make_generator(records, unpack_model=lambda r: (r.code, r))
+        categories = get_station_categories(line_type)
         
         # prepare field
         field_key = 'source_station'
-        self.fields[field_key].choices = choices
+        field = self.fields[field_key]
+        if self.autocomplete:
+            if categories:
+                field.queryset = Station.objects.all_with_inactive()\
+                                     .filter(category__in=categories)
+            field.widget = AutocompleteInput(
+                'stations', {'line_type': line_type or ''})
+        else:
+            records = get_station_choices(categories)
+            field.choices = _make_generator(records)
         
         if source_station:
-            self.fields[field_key].initial = source_station.code
+            field.initial = source_station.code
             if not self.hide_widgets:
-                self.fields[field_key].widget.attrs['disabled'] = True
+                field.widget.attrs['disabled'] = True
             else:
                 del self.fields[field_key]
-
@@ -0,0 +1,276 @@
+"""
+Generates seeded synthetic networks for load and performance testing. Every
+record generated passes the field validators and model `clean` rules: codes
+carry the prefix and voltage digit matching their record, station ratios
+match their category, feeder voltages match the output of their source
+station and transformer rating codes are built with
+`build_transformer_rating_code`.
+
+Networks fan out as transmission station -> 33KV feeders -> injection
+stations -> 11KV feeders -> distribution stations -> uprisers, with some
+distribution stations fed directly off 33KV feeders. The number of children
+at each level is drawn from configurable (min, max) ranges.
+
+The size of a network is bounded by the code space: power line codes are
+globally unique with at most 255 per voltage (F1xx, F3xx) and 4 uprisers
+(U1-U4), injection codes are limited to I3xx and distribution codes to 65535
+per voltage digit. Once feeder or injection codes run out, the remaining
+distribution stations are spread over the existing feeders.
+
+Records are written with `bulk_create` in batches as they are generated, so
+memory stays bounded, after which paths, rollups and in-process caches are
+refreshed.
+"""
+import random
+from collections import namedtuple
+from itertools import cycle
+
+from django.db import transaction
+
+from .changelog import get_last_pk, log_created
+from .constants import Condition, Voltage
+from .forms import build_transformer_rating_code
+from .importer import refresh_derived_data
+from .models import PowerLine, Station, Transformer, TransformerRating
+
+
+MAX_CODES = 0xFF
+MAX_DISTRIBUTION_CODES = 0xFFFF
+MAX_UPRISERS = 4
+MAX_STATIONS = MAX_CODES * 2 + MAX_DISTRIBUTION_CODES * 2
+
+DEFAULT_BATCH_SIZE = 5000
+
+# (min, max) number of children per parent at each level of the network
+Branching = namedtuple('Branching', (
+    'feeders33 injection distribution33 feeders11 distribution11 '
+    'uprisers transformers'))
+
+DEFAULT_BRANCHING = Branching(
+    feeders33=(2, 6),           # 33KV feeders per transmission station
+    injection=(1, 3),           # injection stations per 33KV feeder
+    distribution33=(0, 4),      # distribution stations per 33KV feeder
+    feeders11=(2, 5),           # 11KV feeders per injection station
+    distribution11=(10, 40),    # distribution stations per 11KV feeder
+    uprisers=(0, 1),            # uprisers per distribution station
+    transformers=(1, 2),        # transformers per station
+)
+
+# transformer capacities in KVA drawn for stations of each voltage ratio
+CAPACITIES = {
+    Voltage.Ratio.HVOLTL_MVOLTH: (30000, 45000, 60000),
+    Voltage.Ratio.MVOLTH_MVOLTL: (7500, 15000),
+    Voltage.Ratio.MVOLTH_LVOLT: (300, 500, 1000),
+    Voltage.Ratio.MVOLTL_LVOLT: (200, 300, 500),
+}
+
+
+
+class NetworkGenerator(object):
+    """Generates and writes a network with a number of stations into a
+    database holding no stations or power lines.
+    """
+
+    def __init__(self, seed=0, branching=DEFAULT_BRANCHING,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        self.random = random.Random(seed)
+        self.branching = branching
+        self.batch_size = batch_size
+        self.created = {}
+        self._pending = {}
+        # codes left for allocation keyed by prefix, popped from the end
+        self._codes = {
+            'T1': self._code_pool('T1%02X', MAX_CODES),
+            'I3': self._code_pool('I3%02X', MAX_CODES),
+            'F3': self._code_pool('F3%02X', MAX_CODES),
+            'F1': self._code_pool('F1%02X', MAX_CODES),
+            'S3': self._code_pool('S3%04X', MAX_DISTRIBUTION_CODES),
+            'S1': self._code_pool('S1%04X', MAX_DISTRIBUTION_CODES),
+            'U': self._code_pool('U%X', MAX_UPRISERS),
+        }
+        self._ratings = {}
+        self._serialno = 0
+        self._remaining = 0
+
+    @staticmethod
+    def _code_pool(fmt, count):
+        return [fmt % n for n in range(count, 0, -1)]
+
+    def _draw(self, level):
+        low, high = getattr(self.branching, level)
+        return self.random.randint(low, high)
+
+    def _has_code(self, key):
+        return bool(self._codes[key])
+
+    def _next_code(self, key):
+        codes = self._codes[key]
+        return codes.pop() if codes else None
+
+    def generate(self, stations):
+        """Writes a network of the requested number of stations returning
+        counts of records created keyed by model name.
+        """
+        if stations < 1:
+            raise ValueError("A network needs at least 1 station.")
+        if stations > MAX_STATIONS:
+            raise ValueError("A network of %s stations exceeds the code space "
+                             "limit of %s stations." % (stations, MAX_STATIONS))
+
+        if (Station.objects.all_with_inactive().exists() or
+                PowerLine.objects.all_with_inactive().exists()):
+            raise ValueError("Networks can only be generated into an empty "
+                             "database.")
+
+        # ratings are shared hence existing ones are reused
+        ratings = TransformerRating.objects.all_with_inactive()\
+                                   .values_list('code', 'capacity',
+                                                'voltage_ratio')
+        self._ratings = dict(((capacity, ratio), code)
+                             for code, capacity, ratio in ratings)
+        self._remaining = stations
+        models = (TransformerRating, Station, PowerLine, Transformer)
+        with transaction.atomic():
+            last_pks = [get_last_pk(model) for model in models]
+            feeders = {Voltage.MVOLTH: [], Voltage.MVOLTL: []}
+            while self._remaining:
+                if not self._add_transmission(feeders):
+                    break
+            self._spread_distribution(feeders)
+            self._flush()
+            for model, last_pk in zip(models, last_pks):
+                log_created(model, model._default_manager.filter(
+                    pk__gt=last_pk))
+            refresh_derived_data()
+        return dict(self.created)
+
+    def _add_transmission(self, feeders):
+        code = self._next_code('T1')
+        if code is None or not self._has_code('F3'):
+            return False
+
+        self._add_station(code, Station.TRANSMISSION,
+                          Voltage.Ratio.HVOLTL_MVOLTH, None)
+        for _ in range(max(1, self._draw('feeders33'))):
+            feeder = self._add_feeder(Voltage.MVOLTH, code)
+            if feeder is None:
+                break
+            feeders[Voltage.MVOLTH].append(feeder)
+
+            for _ in range(self._draw('injection')):
+                if not self._add_injection(feeder, feeders):
+                    break
+            for _ in range(self._draw('distribution33')):
+                if not self._add_distribution(feeder, Voltage.MVOLTH):
+                    break
+        return True
+
+    def _add_injection(self, source_feeder, feeders):
+        if not self._remaining:
+            return False
+        code = self._next_code('I3')
+        if code is None:
+            return False
+
+        self._add_station(code, Station.INJECTION,
+                          Voltage.Ratio.MVOLTH_MVOLTL, source_feeder)
+        for _ in range(max(1, self._draw('feeders11'))):
+            feeder = self._add_feeder(Voltage.MVOLTL, code)
+            if feeder is None:
+                break
+            feeders[Voltage.MVOLTL].append(feeder)
+            for _ in range(self._draw('distribution11')):
+                if not self._add_distribution(feeder, Voltage.MVOLTL):
+                    break
+        return True
+
+    def _add_distribution(self, source_feeder, voltage):
+        if not self._remaining:
+            return False
+        ratio = (Voltage.Ratio.MVOLTH_LVOLT if voltage == Voltage.MVOLTH
+                 else Voltage.Ratio.MVOLTL_LVOLT)
+        code = self._next_code('S3' if voltage == Voltage.MVOLTH else 'S1')
+        if code is None:
+            return False
+
+        self._add_station(code, Station.DISTRIBUTION, ratio, source_feeder)
+        for _ in range(self._draw('uprisers')):
+            upriser = self._next_code('U')
+            if upriser is None:
+                break
+            self._add(PowerLine(
+                code=upriser, name='Upriser %s' % upriser,
+                type=PowerLine.UPRISER, voltage=Voltage.LVOLT,
+                source_station_id=code))
+        return True
+
+    def _spread_distribution(self, feeders):
+        """Adds remaining distribution stations over existing feeders once
+        feeder or injection codes run out.
+        """
+        for voltage in (Voltage.MVOLTL, Voltage.MVOLTH):
+            if not feeders[voltage]:
+                continue
+            for feeder in cycle(feeders[voltage]):
+                if not self._add_distribution(feeder, voltage):
+                    break
+        if self._remaining:
+            raise ValueError("Out of codes with %s stations left to add."
+                             % self._remaining)
+
+    def _add_feeder(self, voltage, source_station):
+        code = self._next_code('F3' if voltage == Voltage.MVOLTH else 'F1')
+        if code is None:
+            return None
+        self._add(PowerLine(
+            code=code, name='Feeder %s' % code, type=PowerLine.FEEDER,
+            voltage=voltage, source_station_id=source_station))
+        return code
+
+    def _add_station(self, code, category, ratio, source_feeder):
+        self._remaining -= 1
+        self._add(Station(
+            code=code, name='%s %s' % (category, code), category=category,
+            voltage_ratio=ratio, source_feeder_id=source_feeder))
+
+        for number in range(1, self._draw('transformers') + 1):
+            self._serialno += 1
+            self._add(Transformer(
+                code='TX%s' % number, station_id=code,
+                rating_id=self._get_rating(ratio),
+                condition=Condition.OK, serialno='SN%08d' % self._serialno))
+
+    def _get_rating(self, ratio):
+        capacity = self.random.choice(CAPACITIES[ratio])
+        key = (capacity, ratio)
+        if key not in self._ratings:
+            code = build_transformer_rating_code(capacity, ratio)
+            self._ratings[key] = code
+            self._add(TransformerRating(code=code, capacity=capacity,
+                                        voltage_ratio=ratio))
+        return self._ratings[key]
+
+    def _add(self, instance):
+        model = type(instance)
+        pending = self._pending.setdefault(model, [])
+        pending.append(instance)
+        if len(pending) >= self.batch_size:
+            self._flush(model)
+
+    def _flush(self, model=None):
+        for model in ([model] if model else list(self._pending)):
+            instances = self._pending.pop(model, [])
+            if instances:
+                model._default_manager.bulk_create(instances)
+                name = model._meta.model_name
+                self.created[name] = self.created.get(name, 0) + len(instances)
+
+
+def generate_network(stations, seed=0, branching=DEFAULT_BRANCHING,
+                     batch_size=DEFAULT_BATCH_SIZE):
+    """Writes a network of the requested number of stations generated with
+    the provided seed and branching. Returns counts of records created keyed
+    by model name.
+    """
+    generator = NetworkGenerator(seed, branching, batch_size)
+    return generator.generate(stations)
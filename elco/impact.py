@@ -0,0 +1,447 @@
+"""
+Outage impact analysis: the stations and power lines de-energized by the
+failure of a set of network nodes, along with the transformers at those
+stations and their total capacity, answered without touching the database.
+
+The analysis runs over the process-wide `topology` index, to which it adds the
+state of each node along with totals over its subtree: the count and capacity
+of active transformers and the number of stations by category. A node adds
+its totals to those of its parent only while active, thus the totals of an
+energized node, one reached from a root through active nodes only, cover
+exactly what its failure de-energizes and are read in constant time.
+
+Totals are kept current from save and delete signals by applying the
+difference a change makes to the node and on up through its active ancestors,
+thus creating, deleting, re-parenting, activating or deactivating a node costs
+no more than the depth of the network. Simultaneous faults are analyzed
+together, a fault within the subtree of another adding nothing.
+"""
+import threading
+from itertools import chain
+
+from django.db.models.signals import post_delete, post_save
+
+from . import topology
+from .models import PowerLine, Station, Transformer, TransformerRating
+from .topology import NO_PARENT
+
+
+# slots within the totals kept for each node
+COUNT = 0
+CAPACITY = 1
+CATEGORY_SLOTS = dict((category, 2 + i) for i, (category, _)
+                      in enumerate(Station.CATEGORY_CHOICES))
+TOTALS_SIZE = 2 + len(CATEGORY_SLOTS)
+
+
+
+class Impact(object):
+    """The outcome of the failure of a set of nodes. Totals are computed
+    upfront while the lists of affected records are built on access.
+    """
+
+    def __init__(self, index, failed, fault_ids):
+        self.failed = failed
+        self._index = index
+        self._fault_ids = fault_ids
+        self._walked = None
+        totals = [0] * TOTALS_SIZE
+        for node_id in fault_ids:
+            for slot, value in enumerate(index._totals[node_id]):
+                totals[slot] += value
+        self._totals = totals
+        self.transformer_count = totals[COUNT]
+        self.capacity = totals[CAPACITY]
+
+    def _walk(self):
+        if self._walked is None:
+            self._walked = self._index._walk_energized(self._fault_ids)
+        return self._walked
+
+    @property
+    def stations(self):
+        """Codes of de-energized stations, in pre-order per fault."""
+        return self._walk()[0]
+
+    @property
+    def powerlines(self):
+        """Codes of de-energized power lines."""
+        return self._walk()[1]
+
+    @property
+    def transformers(self):
+        """(station code, transformer code) pairs of affected transformers."""
+        return self._walk()[2]
+
+    def count_by_category(self):
+        """Returns the number of de-energized stations keyed by category."""
+        return dict((category, self._totals[slot])
+                    for category, slot in CATEGORY_SLOTS.items()
+                    if self._totals[slot])
+
+    def as_dict(self):
+        return {
+            'failed': self.failed,
+            'stations': self.stations,
+            'powerlines': self.powerlines,
+            'stations_by_category': self.count_by_category(),
+            'transformers': self.transformers,
+            'transformer_count': self.transformer_count,
+            'capacity': self.capacity,
+        }
+
+
+class ImpactIndex(object):
+    """Holds the state and subtree totals of nodes within a TopologyIndex,
+    keyed by node id, along with the transformers at each station.
+    """
+
+    def __init__(self, topology_index):
+        self._topology = topology_index
+        self._active = []       # node id -> True for active records
+        self._categories = []   # node id -> station category, None for line
+        self._totals = []       # node id -> totals over node and subtree
+        self._linked = []       # node id -> id of parent holding its totals
+        self._located = {}      # node id -> [transformer code, ...]
+        self._transformers = {} # pk -> (node id, code, rating, is_active)
+        self._by_rating = {}    # rating code -> set of transformer pks
+        self._ratings = {}      # rating code -> capacity
+        self._lock = threading.RLock()
+
+    @classmethod
+    def build(cls):
+        """Builds an index over the process-wide topology index using four
+        queries which fetch no more than the states and capacities needed.
+        """
+        topology_index = topology.get_index()
+        index = cls(topology_index)
+        stations = Station.objects.all_with_inactive().values_list(
+            'code', 'category', 'is_active')
+        powerlines = PowerLine.objects.all_with_inactive().values_list(
+            'code', 'is_active')
+        nodes = chain(stations.iterator(),
+                      ((code, None, is_active)
+                       for code, is_active in powerlines.iterator()))
+        for code, category, is_active in nodes:
+            node_id = index._get_id(code)
+            if node_id is not None:
+                index._set_node(node_id, category, is_active)
+
+        index._ratings = dict(TransformerRating.objects.all_with_inactive()
+                              .values_list('code', 'capacity'))
+        transformers = Transformer.objects.all_with_inactive().values_list(
+            'pk', 'code', 'station', 'rating', 'is_active')
+        for pk, code, station, rating, is_active in transformers.iterator():
+            node_id = index._get_id(station)
+            if node_id is not None:
+                index._add_transformer(pk, node_id, code, rating, is_active)
+
+        # add totals bottom-up, children being visited before parents
+        totals, active = index._totals, index._active
+        for node_id in reversed(list(topology_index.walk_from_roots())):
+            index._ensure(node_id)
+            parent_id = topology_index.parent_of(node_id)
+            index._linked[node_id] = parent_id
+            if parent_id != NO_PARENT and active[node_id]:
+                parent_totals = totals[parent_id]
+                for slot, value in enumerate(totals[node_id]):
+                    parent_totals[slot] += value
+        return index
+
+    def __len__(self):
+        return self._active.count(True)
+
+    def _ensure(self, node_id):
+        while len(self._active) <= node_id:
+            self._active.append(False)
+            self._categories.append(None)
+            self._totals.append([0] * TOTALS_SIZE)
+            self._linked.append(NO_PARENT)
+
+    def _get_id(self, code):
+        node_id = self._topology.node_id(code)
+        if node_id is not None:
+            self._ensure(node_id)
+        return node_id
+
+    def _propagate(self, node_id, delta):
+        """Applies (slot, value) pairs to the totals of the nodes holding the
+        totals of node, stopping after the first inactive one.
+        """
+        seen = set()
+        parent_id = self._linked[node_id]
+        while parent_id != NO_PARENT and parent_id not in seen:
+            seen.add(parent_id)
+            totals = self._totals[parent_id]
+            for slot, value in delta:
+                totals[slot] += value
+            if not self._active[parent_id]:
+                break
+            parent_id = self._linked[parent_id]
+
+    def _unlink(self, node_id):
+        if self._active[node_id]:
+            self._propagate(node_id, [(slot, -value) for slot, value
+                                      in enumerate(self._totals[node_id])
+                                      if value])
+        self._linked[node_id] = NO_PARENT
+
+    def _link(self, node_id, parent_id):
+        self._linked[node_id] = parent_id
+        if self._active[node_id]:
+            self._propagate(node_id, [(slot, value) for slot, value
+                                      in enumerate(self._totals[node_id])
+                                      if value])
+
+    def _set_node(self, node_id, category, is_active):
+        # only called for unlinked nodes, thus nothing is propagated
+        old_category = self._categories[node_id]
+        if old_category != category:
+            totals = self._totals[node_id]
+            if old_category is not None:
+                totals[CATEGORY_SLOTS[old_category]] -= 1
+            if category is not None:
+                totals[CATEGORY_SLOTS[category]] += 1
+            self._categories[node_id] = category
+        self._active[node_id] = bool(is_active)
+
+    def _add_to_node(self, node_id, count, capacity):
+        totals = self._totals[node_id]
+        totals[COUNT] += count
+        totals[CAPACITY] += capacity
+        if self._active[node_id]:
+            self._propagate(node_id, [(COUNT, count), (CAPACITY, capacity)])
+
+    def _add_transformer(self, pk, node_id, code, rating_code, is_active):
+        self._transformers[pk] = (node_id, code, rating_code, is_active)
+        self._by_rating.setdefault(rating_code, set()).add(pk)
+        if is_active:
+            self._located.setdefault(node_id, []).append(code)
+            self._add_to_node(node_id, 1, self._ratings.get(rating_code, 0))
+
+    def _is_energized(self, node_id):
+        topology_index, seen = self._topology, set()
+        while self._active[node_id]:
+            seen.add(node_id)
+            parent_id = topology_index.parent_of(node_id)
+            if (parent_id == NO_PARENT or
+                    not topology_index.is_present(parent_id)):
+                return True
+            if parent_id in seen:
+                return False
+            node_id = parent_id
+        return False
+
+    def _has_ancestor_in(self, node_id, node_ids):
+        seen = set([node_id])
+        parent_id = self._linked[node_id]
+        while parent_id != NO_PARENT and parent_id not in seen:
+            if parent_id in node_ids:
+                return True
+            seen.add(parent_id)
+            parent_id = self._linked[parent_id]
+        return False
+
+    def _walk_energized(self, fault_ids):
+        """Returns the codes of stations and power lines, and the
+        (station code, transformer code) pairs, within the energized subtrees
+        of the provided nodes in pre-order, children in the order linked.
+        """
+        topology_index, categories = self._topology, self._categories
+        with self._lock:
+            node_ids = []
+            for fault_id in fault_ids:
+                node_ids.extend(topology_index.preorder(fault_id,
+                                                        self._active))
+            station_ids = [x for x in node_ids if categories[x] is not None]
+            stations = topology_index.codes_of(station_ids)
+            powerlines = topology_index.codes_of(
+                [x for x in node_ids if categories[x] is None])
+            located, transformers = self._located, []
+            for node_id, code in zip(station_ids, stations):
+                codes = located.get(node_id)
+                if codes:
+                    transformers.extend([(code, x) for x in codes])
+        return stations, powerlines, transformers
+
+    def analyze(self, codes):
+        """Returns the Impact of the simultaneous failure of the nodes with
+        the provided codes. Nodes which are not energized add nothing; a
+        KeyError is raised for codes of unknown nodes.
+        """
+        codes = list(codes)
+        with self._lock:
+            fault_ids = set()
+            for code in codes:
+                if code not in self._topology:
+                    raise KeyError(code)
+                node_id = self._get_id(code)
+                if self._is_energized(node_id):
+                    fault_ids.add(node_id)
+            fault_ids = sorted(
+                (x for x in fault_ids
+                 if not self._has_ancestor_in(x, fault_ids)),
+                key=self._topology.code_of)
+            return Impact(self, codes, fault_ids)
+
+    def update_node(self, model_name, pk, code, parent_code, category,
+                    is_active):
+        """Updates the index to reflect the current state of a Station or
+        PowerLine record, thus handling its creation, renaming, re-parenting,
+        activation and deactivation.
+        """
+        with self._lock:
+            self._topology.update_node(model_name, pk, code, parent_code)
+            node_id = self._get_id(code)
+            self._unlink(node_id)
+            self._set_node(node_id, category, is_active)
+            self._link(node_id, self._topology.parent_of(node_id))
+
+    def remove_node(self, model_name, pk, code):
+        """Removes the node of a deleted Station or PowerLine record."""
+        with self._lock:
+            node_id = self._get_id(code)
+            if node_id is not None:
+                self._unlink(node_id)
+                self._set_node(node_id, None, False)
+            self._topology.remove_node(model_name, pk)
+
+    def update_rating(self, code, capacity):
+        """Applies a change in the capacity of a rating to the totals."""
+        with self._lock:
+            old_capacity = self._ratings.get(code)
+            self._ratings[code] = capacity
+            if old_capacity is None or old_capacity == capacity:
+                return
+            for pk in self._by_rating.get(code, ()):
+                node_id, _, _, is_active = self._transformers[pk]
+                if is_active:
+                    self._add_to_node(node_id, 0, capacity - old_capacity)
+
+    def remove_rating(self, code):
+        with self._lock:
+            self._ratings.pop(code, None)
+
+    def update_transformer(self, pk, code, station_code, rating_code,
+                           is_active):
+        """Updates the index to reflect the current state of a transformer,
+        thus handling its creation, relocation, re-rating and deactivation.
+        """
+        with self._lock:
+            self.remove_transformer(pk)
+            node_id = self._get_id(station_code)
+            if node_id is None:
+                return
+            if rating_code not in self._ratings:
+                self._ratings[rating_code] = TransformerRating.objects\
+                        .all_with_inactive().filter(code=rating_code)\
+                        .values_list('capacity', flat=True).first() or 0
+            self._add_transformer(pk, node_id, code, rating_code, is_active)
+
+    def remove_transformer(self, pk):
+        with self._lock:
+            entry = self._transformers.pop(pk, None)
+            if entry is None:
+                return
+            node_id, code, rating_code, is_active = entry
+            self._by_rating[rating_code].discard(pk)
+            if is_active:
+                self._located[node_id].remove(code)
+                self._add_to_node(node_id, -1,
+                                  -self._ratings.get(rating_code, 0))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the process-wide impact index, building it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ImpactIndex.build()
+    return _index
+
+
+def reset_index():
+    """Discards the process-wide impact index; it gets rebuilt on next use.
+    Only needed after bulk writes, which send no signals.
+    """
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def analyze(codes):
+    """Returns the Impact of the simultaneous failure of the nodes with the
+    provided Station or PowerLine codes.
+    """
+    return get_index().analyze(codes)
+
+
+def _on_station_saved(sender, instance, raw=False, **kwargs):
+    if _index is not None:
+        _index.update_node('station', instance.pk, instance.code,
+                           instance.source_feeder_id, instance.category,
+                           instance.is_active)
+
+
+def _on_powerline_saved(sender, instance, raw=False, **kwargs):
+    if _index is not None:
+        _index.update_node('powerline', instance.pk, instance.code,
+                           instance.source_station_id, None,
+                           instance.is_active)
+
+
+def _on_station_deleted(sender, instance, **kwargs):
+    if _index is not None:
+        _index.remove_node('station', instance.pk, instance.code)
+
+
+def _on_powerline_deleted(sender, instance, **kwargs):
+    if _index is not None:
+        _index.remove_node('powerline', instance.pk, instance.code)
+
+
+def _on_rating_saved(sender, instance, raw=False, **kwargs):
+    if _index is not None:
+        _index.update_rating(instance.code, instance.capacity)
+
+
+def _on_rating_deleted(sender, instance, **kwargs):
+    if _index is not None:
+        _index.remove_rating(instance.code)
+
+
+def _on_transformer_saved(sender, instance, raw=False, **kwargs):
+    if _index is not None:
+        _index.update_transformer(instance.pk, instance.code,
+                                  instance.station_id, instance.rating_id,
+                                  instance.is_active)
+
+
+def _on_transformer_deleted(sender, instance, **kwargs):
+    if _index is not None:
+        _index.remove_transformer(instance.pk)
+
+
+def connect_signals():
+    uid = 'elco.impact.%s'
+    post_save.connect(_on_station_saved, sender=Station,
+                      dispatch_uid=uid % 'station_saved')
+    post_save.connect(_on_powerline_saved, sender=PowerLine,
+                      dispatch_uid=uid % 'powerline_saved')
+    post_save.connect(_on_rating_saved, sender=TransformerRating,
+                      dispatch_uid=uid % 'rating_saved')
+    post_save.connect(_on_transformer_saved, sender=Transformer,
+                      dispatch_uid=uid % 'transformer_saved')
+    post_delete.connect(_on_station_deleted, sender=Station,
+                        dispatch_uid=uid % 'station_deleted')
+    post_delete.connect(_on_powerline_deleted, sender=PowerLine,
+                        dispatch_uid=uid % 'powerline_deleted')
+    post_delete.connect(_on_rating_deleted, sender=TransformerRating,
+                        dispatch_uid=uid % 'rating_deleted')
+    post_delete.connect(_on_transformer_deleted, sender=Transformer,
+                        dispatch_uid=uid % 'transformer_deleted')
@@ -0,0 +1,302 @@
+"""
+A streaming importer for Station, PowerLine, TransformerRating and Transformer
+records provided as CSV or JSON-lines where each row maps field names to
+values.
+
+Rows are consumed lazily and processed in chunks. Each chunk is validated with
+`bulk_full_clean`, which applies the model field validators, `clean` rules and
+unique checks using a fixed number of queries, then written with a single
+`bulk_create`. Rows failing validation are skipped without aborting the
+import and passed as they are found to an error callback, such as a
+`ReportWriter`, so memory use does not grow with the number of rejected rows.
+
+The circular reference between `Station.source_feeder` and
+`PowerLine.source_station` is resolved in two passes: stations are written
+without their source feeder, power lines are then written against those
+stations, and finally the deferred source feeder links are validated and set
+with bulk updates. Deferred links are spooled to a temporary file until then.
+Stations whose link is rejected are kept, thus reported as imported without
+their source feeder.
+"""
+import csv
+import json
+import tempfile
+from collections import namedtuple
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .constants import Condition, Voltage
+from .models import PowerLine, Station, Transformer, TransformerRating,\
+        rebuild_network_paths
+
+
+DEFAULT_CHUNK_SIZE = 500
+
+# fields accepted from import rows for each model
+STATION_FIELDS = (
+    'code', 'alt_code', 'name', 'category', 'voltage_ratio', 'public',
+    'date_commissioned', 'notes', 'is_active')
+POWERLINE_FIELDS = (
+    'code', 'alt_code', 'name', 'type', 'voltage', 'public', 'source_station',
+    'date_commissioned', 'notes', 'is_active')
+RATING_FIELDS = ('code', 'capacity', 'voltage_ratio', 'notes', 'is_active')
+TRANSFORMER_FIELDS = (
+    'code', 'rating', 'station', 'serialno', 'model', 'manufacturer',
+    'condition', 'date_installed', 'date_manufactured', 'notes', 'is_active')
+
+
+RowError = namedtuple('RowError', 'line model code messages')
+
+
+
+def read_csv(fileobj):
+    """Yields a dict for each row within a CSV file with a header row."""
+    for row in csv.DictReader(fileobj):
+        yield row
+
+
+def read_jsonlines(fileobj):
+    """Yields a dict for each non-blank line within a JSON-lines file."""
+    for line in fileobj:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+class ReportWriter(object):
+    """Writes import errors as CSV with a row per error message, as each
+    error is passed to it.
+    """
+
+    def __init__(self, fileobj):
+        self._writer = csv.writer(fileobj)
+        self._writer.writerow(['line', 'model', 'code', 'message'])
+
+    def __call__(self, error):
+        for message in error.messages:
+            self._writer.writerow([error.line, error.model, error.code,
+                                   message])
+
+
+def write_report(errors, fileobj):
+    """Writes import errors as CSV with a row per error message."""
+    writer = ReportWriter(fileobj)
+    for error in errors:
+        writer(error)
+
+
+def chunked(iterable, size):
+    """Yields lists of up to size items from iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _get_choice_value(choices, text):
+    text = text.strip()
+    for key, value in choices:
+        if text.lower() in (str(key).lower(), str(value).lower()):
+            return key
+    return text
+
+
+def _coerce_row(row):
+    """Maps display text for choice fields to their stored values and drops
+    blank values so model defaults apply.
+    """
+    values = {}
+    for key, value in row.items():
+        if value is None or (hasattr(value, 'strip') and not value.strip()):
+            continue
+        if hasattr(value, 'strip'):
+            if key == 'category':
+                value = _get_choice_value(Station.CATEGORY_CHOICES, value)
+            elif key == 'type':
+                value = _get_choice_value(PowerLine.POWERLINE_CHOICES, value)
+            elif key == 'voltage':
+                value = _get_choice_value(Voltage._text.items(), value)
+            elif key == 'voltage_ratio':
+                value = _get_choice_value(Voltage.Ratio.CHOICES, value)
+            elif key == 'condition':
+                value = _get_choice_value(Condition.CHOICES, value)
+        values[key] = value
+    return values
+
+
+def _get_messages(error):
+    if hasattr(error, 'message_dict'):
+        return ['%s: %s' % (field, message)
+                for field, messages in sorted(error.message_dict.items())
+                for message in messages]
+    return list(error.messages)
+
+
+def refresh_derived_data():
+    """Rebuilds network paths and rollups, then discards in-process caches
+    and indexes. Bulk writes send no signals hence this is required after
+    records are written in bulk.
+    """
+    from . import caching, choices, impact, rollups, spatial, topology
+    rebuild_network_paths()
+    rollups.rebuild()
+    choices.invalidate('station')
+    choices.invalidate('powerline')
+    caching.invalidate_model(Station)
+    caching.invalidate_model(PowerLine)
+    topology.reset_index()
+    spatial.reset_index()
+    impact.reset_index()
+
+
+class NetworkImporter(object):
+    """Imports network records from row iterables, accumulating counts of
+    created records and rejected rows. A `RowError` for each row which could
+    not be imported is passed to on_error where provided.
+
+    Stations must be imported before the power lines and transformers which
+    reference them, and ratings before transformers. Calling `finish` after
+    all rows are imported sets the deferred source feeder links and rebuilds
+    the materialized network paths and rollups.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, on_error=None):
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+        self.error_count = 0
+        self.created = {}
+        # stations created but left without their source feeder
+        self.unlinked = 0
+        self._deferred_feeders = None
+
+    def import_stations(self, rows):
+        for chunk in chunked(enumerate(rows, 1), self.chunk_size):
+            entries = []
+            for line, row in chunk:
+                row = _coerce_row(row)
+                feeder_code = row.pop('source_feeder', None)
+                entries.append((line, row, feeder_code))
+
+            created = self._import_chunk(
+                Station, STATION_FIELDS, [(l, r) for l, r, _ in entries])
+            for line, row, feeder_code in entries:
+                if feeder_code and row.get('code') in created:
+                    self._defer_feeder(line, row['code'], feeder_code)
+
+    def import_powerlines(self, rows):
+        for chunk in chunked(enumerate(rows, 1), self.chunk_size):
+            entries = [(l, _coerce_row(r)) for l, r in chunk]
+            self._import_chunk(PowerLine, POWERLINE_FIELDS, entries)
+
+    def import_ratings(self, rows):
+        for chunk in chunked(enumerate(rows, 1), self.chunk_size):
+            entries = [(l, _coerce_row(r)) for l, r in chunk]
+            self._import_chunk(TransformerRating, RATING_FIELDS, entries)
+
+    def import_transformers(self, rows):
+        for chunk in chunked(enumerate(rows, 1), self.chunk_size):
+            entries = [(l, _coerce_row(r)) for l, r in chunk]
+            self._import_chunk(Transformer, TRANSFORMER_FIELDS, entries)
+
+    def finish(self):
+        """Sets deferred source feeder links then rebuilds network paths and
+        rollups.
+        """
+        spool, self._deferred_feeders = self._deferred_feeders, None
+        if spool is not None:
+            with spool:
+                spool.seek(0)
+                for chunk in chunked(read_jsonlines(spool), self.chunk_size):
+                    self._link_source_feeders(chunk)
+        refresh_derived_data()
+
+    def _defer_feeder(self, line, station_code, feeder_code):
+        if self._deferred_feeders is None:
+            self._deferred_feeders = tempfile.TemporaryFile('w+')
+        self._deferred_feeders.write(
+            json.dumps([line, station_code, feeder_code]) + '\n')
+
+    def _add_error(self, model, line, code, messages):
+        self.error_count += 1
+        if self.on_error is not None:
+            self.on_error(
+                RowError(line, model._meta.model_name, code, messages))
+
+    def _import_chunk(self, model, fields, rows):
+        """Validates and writes a chunk of (line, row) pairs returning the set
+        of codes for records created.
+        """
+        opts, instances = model._meta, []
+        for line, row in rows:
+            values = dict((opts.get_field(k).attname, v)
+                          for k, v in row.items() if k in fields)
+            instances.append(model(**values))
+
+        errors = model._default_manager.bulk_full_clean(instances)
+        valid = []
+        for index, (line, row) in enumerate(rows):
+            if index in errors:
+                self._add_error(model, line, row.get('code'),
+                                _get_messages(errors[index]))
+                continue
+            valid.append((line, instances[index]))
+
+        from .changelog import get_last_pk, log_created
+        instances = [instance for _, instance in valid]
+        try:
+            with transaction.atomic():
+                last_pk = get_last_pk(model)
+                model._default_manager.bulk_create(instances)
+                log_created(model, model._default_manager.filter(
+                    pk__gt=last_pk))
+        except IntegrityError:
+            # fall back to row by row inserts to isolate offending rows
+            instances = []
+            for line, instance in valid:
+                try:
+                    with transaction.atomic():
+                        instance.save()
+                    instances.append(instance)
+                except IntegrityError as ex:
+                    self._add_error(model, line, instance.code, [str(ex)])
+
+        name = model._meta.model_name
+        self.created[name] = self.created.get(name, 0) + len(instances)
+        return set(instance.code for instance in instances)
+
+    def _link_source_feeders(self, links):
+        station_codes = set(code for _, code, _ in links)
+        feeder_codes = set(code for _, _, code in links)
+        stations = Station.objects.all_with_inactive()\
+                                  .in_bulk_by_code(station_codes)
+        feeders = PowerLine.objects.all_with_inactive()\
+                                   .in_bulk_by_code(feeder_codes)
+
+        linked = {}
+        for line, station_code, feeder_code in links:
+            station = stations[station_code]
+            feeder = feeders.get(feeder_code)
+            try:
+                if feeder is None:
+                    raise ValidationError(
+                        "Unknown source_feeder: %s" % feeder_code)
+                station.source_feeder = feeder
+                station._validate_source_feeder()
+            except ValidationError as ex:
+                self.unlinked += 1
+                self._add_error(Station, line, station_code, [
+                    'imported without its source feeder; %s' % message
+                    for message in _get_messages(ex)])
+                continue
+            linked.setdefault(feeder_code, []).append(station_code)
+
+        from .changelog import log_update
+        for feeder_code, codes in linked.items():
+            records = Station.objects.all_with_inactive()\
+                             .filter(code__in=codes)
+            log_update(Station, records,
+                       source_feeder=feeders[feeder_code])
@@ -0,0 +1,129 @@
+"""
+Indexes over active Station and PowerLine records, which back the filters and
+orderings applied through the default managers of those models.
+
+Soft-deleted records are kept with `is_active` cleared, thus an index over all
+rows grows with records no query reads. Where the database supports partial
+indexes (SQLite and PostgreSQL) the indexes only cover active rows; elsewhere
+`is_active` leads the indexed columns so active rows are still found by a
+single range scan.
+
+Prefix searches for source feeders and stations match codes, alternate codes
+and names by `startswith` and `istartswith` over all rows, which run as LIKE
+over each column. These are backed by an index per column, built over
+expressions the LIKE can be matched against: case folded on SQLite, whose
+LIKE ignores case, and upper cased with pattern operators on PostgreSQL,
+where Django already indexes unique codes with pattern operators.
+
+Django 1.9 cannot declare such indexes on a model, thus they are created and
+dropped by migrations with `create_indexes` and `drop_indexes`, and
+`create_prefix_indexes` and `drop_prefix_indexes`.
+"""
+
+
+# (model name, index name suffix, fields) of indexes over active rows
+ACTIVE_INDEXES = (
+    ('station', 'category', ('category', 'voltage_ratio')),
+    ('station', 'code', ('code',)),
+    ('powerline', 'voltage', ('voltage', 'source_station')),
+    ('powerline', 'code', ('code',)),
+)
+
+# (model name, field, case sensitive) of columns searched by prefix
+PREFIX_INDEXES = (
+    ('station', 'code', True),
+    ('station', 'alt_code', False),
+    ('station', 'name', False),
+    ('powerline', 'code', True),
+    ('powerline', 'alt_code', False),
+    ('powerline', 'name', False),
+)
+
+# conditions selecting active rows, by vendor, for partial indexes
+PARTIAL_CONDITIONS = {
+    'sqlite': '%s = 1',
+    'postgresql': '%s',
+}
+
+# indexed expressions for prefix searches by vendor and case sensitivity, None
+# where no index is needed; vendors not listed index the column as is.
+PREFIX_EXPRESSIONS = {
+    'sqlite': {True: '%s COLLATE NOCASE', False: '%s COLLATE NOCASE'},
+    'postgresql': {True: None, False: '(UPPER(%s::text)) text_pattern_ops'},
+}
+
+
+
+def get_index_name(model, suffix):
+    return '%s_active_%s' % (model._meta.db_table, suffix)
+
+
+def _get_columns(model, fields):
+    return [model._meta.get_field(name).column for name in fields]
+
+
+def _create_index_sql(schema_editor, model, suffix, fields):
+    qn = schema_editor.quote_name
+    columns = _get_columns(model, fields)
+    is_active = qn(_get_columns(model, ('is_active',))[0])
+    condition = PARTIAL_CONDITIONS.get(schema_editor.connection.vendor)
+    if condition:
+        where = ' WHERE %s' % (condition % is_active)
+        columns = [qn(column) for column in columns]
+    else:
+        where = ''
+        columns = [is_active] + [qn(column) for column in columns]
+    return 'CREATE INDEX %s ON %s (%s)%s' % (
+        qn(get_index_name(model, suffix)), qn(model._meta.db_table),
+        ', '.join(columns), where)
+
+
+def create_indexes(apps, schema_editor):
+    """Creates the indexes over active rows; usable with `RunPython`."""
+    for model_name, suffix, fields in ACTIVE_INDEXES:
+        model = apps.get_model('elco', model_name)
+        schema_editor.execute(
+            _create_index_sql(schema_editor, model, suffix, fields))
+
+
+def drop_indexes(apps, schema_editor):
+    """Drops the indexes over active rows; usable with `RunPython`."""
+    qn = schema_editor.quote_name
+    for model_name, suffix, _ in ACTIVE_INDEXES:
+        model = apps.get_model('elco', model_name)
+        schema_editor.execute(schema_editor.sql_delete_index % {
+            'name': qn(get_index_name(model, suffix)),
+            'table': qn(model._meta.db_table),
+        })
+
+
+def _get_prefix_indexes(schema_editor):
+    expressions = PREFIX_EXPRESSIONS.get(schema_editor.connection.vendor)
+    for model_name, field, case_sensitive in PREFIX_INDEXES:
+        expression = (expressions[case_sensitive] if expressions is not None
+                      else '%s')
+        if expression is not None:
+            yield model_name, field, expression
+
+
+def create_prefix_indexes(apps, schema_editor):
+    """Creates the indexes backing prefix searches; usable with `RunPython`.
+    """
+    qn = schema_editor.quote_name
+    for model_name, field, expression in _get_prefix_indexes(schema_editor):
+        model = apps.get_model('elco', model_name)
+        column = qn(_get_columns(model, (field,))[0])
+        schema_editor.execute('CREATE INDEX %s ON %s (%s)' % (
+            qn('%s_prefix_%s' % (model._meta.db_table, field)),
+            qn(model._meta.db_table), expression % column))
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    """Drops the indexes backing prefix searches; usable with `RunPython`."""
+    qn = schema_editor.quote_name
+    for model_name, field, _ in _get_prefix_indexes(schema_editor):
+        model = apps.get_model('elco', model_name)
+        schema_editor.execute(schema_editor.sql_delete_index % {
+            'name': qn('%s_prefix_%s' % (model._meta.db_table, field)),
+            'table': qn(model._meta.db_table),
+        })
@@ -0,0 +1,202 @@
+"""
+SQL query instrumentation for the elco views: records the number of queries,
+total database time, duplicated SQL fingerprints and the Python call sites
+which issued them, flagging fingerprints repeated often enough to likely be
+N+1 patterns.
+
+`record_queries` works as a context manager or decorator and is applied to
+each request handled by an elco view by `QueryInstrumentationMiddleware`.
+Reports are logged as JSON to the `elco.queries` logger, at WARNING level
+where N+1 patterns are flagged.
+
+Cursors are wrapped only while a recorder is active, by overriding the
+cursor factories of the connection instance; Django 1.9 has no hook for
+wrapping query execution.
+"""
+import json
+import logging
+import re
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+from time import time
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.backends.utils import CursorWrapper
+from django.utils.decorators import ContextDecorator, available_attrs
+from django.utils.six import wraps
+
+
+logger = logging.getLogger('elco.queries')
+
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+Query = namedtuple('Query', 'sql fingerprint duration site')
+
+_local = threading.local()
+
+
+
+def fingerprint(sql):
+    """Returns sql with literal values and lists of placeholders collapsed,
+    thus queries differing only by the values used share a fingerprint.
+    """
+    sql = _LITERALS.sub('?', sql)
+    sql = _PLACEHOLDER_LISTS.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+def _get_call_site():
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__') or ''
+        if module.split('.')[0] != 'django' and module != __name__:
+            return '%s:%s in %s' % (frame.f_code.co_filename, frame.f_lineno,
+                                    frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+class _RecordingCursor(CursorWrapper):
+    """Wraps a cursor reporting queries to the active recorders."""
+
+    def execute(self, sql, params=None):
+        start = time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            _notify(self.db.alias, sql, time() - start)
+
+    def executemany(self, sql, param_list):
+        start = time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            _notify(self.db.alias, sql, time() - start)
+
+
+def _get_recorders():
+    if not hasattr(_local, 'recorders'):
+        _local.recorders = []
+    return _local.recorders
+
+
+def _notify(alias, sql, duration):
+    recorders = [r for r in _get_recorders() if r.using == alias]
+    if recorders:
+        query = Query(sql, fingerprint(sql), duration, _get_call_site())
+        for recorder in recorders:
+            recorder.queries.append(query)
+
+
+def _install(connection):
+    cls = type(connection)
+
+    def make_cursor(cursor):
+        return _RecordingCursor(cls.make_cursor(connection, cursor),
+                                connection)
+
+    def make_debug_cursor(cursor):
+        return _RecordingCursor(cls.make_debug_cursor(connection, cursor),
+                                connection)
+
+    connection.make_cursor = make_cursor
+    connection.make_debug_cursor = make_debug_cursor
+
+
+def _uninstall(connection):
+    for name in ('make_cursor', 'make_debug_cursor'):
+        connection.__dict__.pop(name, None)
+
+
+class record_queries(ContextDecorator):
+    """Records queries executed on a database connection within a block or
+    decorated function. Recorders can be nested; each call of a decorated
+    function is recorded by a fresh recorder.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, threshold=None, name=None,
+                 log=False):
+        self.using = using
+        self.threshold = (threshold if threshold is not None else
+                          getattr(settings, 'ELCO_N_PLUS_ONE_THRESHOLD',
+                                  DEFAULT_N_PLUS_ONE_THRESHOLD))
+        self.name = name
+        self.log = log
+        self.queries = []
+
+    def __call__(self, func):
+        @wraps(func, assigned=available_attrs(func))
+        def inner(*args, **kwargs):
+            with self._copy():
+                return func(*args, **kwargs)
+        return inner
+
+    def _copy(self):
+        return type(self)(self.using, self.threshold, self.name, self.log)
+
+    def __enter__(self):
+        self.queries = []
+        recorders = _get_recorders()
+        if not any(r.using == self.using for r in recorders):
+            _install(connections[self.using])
+        recorders.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        recorders = _get_recorders()
+        recorders.remove(self)
+        if not any(r.using == self.using for r in recorders):
+            _uninstall(connections[self.using])
+        if self.log:
+            log_report(self.get_report(), self.name)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(q.duration for q in self.queries)
+
+    def get_duplicates(self):
+        """Returns (fingerprint, count, call sites) for fingerprints executed
+        more than once, most frequent first.
+        """
+        groups = OrderedDict()
+        for query in self.queries:
+            groups.setdefault(query.fingerprint, []).append(query.site)
+        duplicates = [(fp, len(sites), sorted(set(s for s in sites if s)))
+                      for fp, sites in groups.items() if len(sites) > 1]
+        return sorted(duplicates, key=lambda d: -d[1])
+
+    def get_n_plus_one(self):
+        """Returns duplicates executed at least threshold times, which are
+        likely the result of a query issued per row.
+        """
+        return [d for d in self.get_duplicates() if d[1] >= self.threshold]
+
+    def get_report(self):
+        return {
+            'queries': self.count,
+            'time_ms': round(self.duration * 1000, 3),
+            'duplicates': [
+                {'fingerprint': fp, 'count': count, 'sites': sites}
+                for fp, count, sites in self.get_duplicates()],
+            'n_plus_one': [fp for fp, _, _ in self.get_n_plus_one()],
+        }
+
+
+def log_report(report, name=None):
+    """Logs a query report as JSON, as a warning where N+1 are flagged."""
+    if name:
+        report = dict(report, name=name)
+    level = logging.WARNING if report['n_plus_one'] else logging.INFO
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps(report, sort_keys=True),
+                   extra={'query_report': report})
+
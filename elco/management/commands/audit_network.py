@@ -0,0 +1,61 @@
+import io
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ... import audit
+
+
+
+class Command(BaseCommand):
+    help = ("Audits all network records for validation rule violations, "
+            "orphaned references, feeder cycles and mismatched paths, one "
+            "transmission station subtree at a time over a process pool.")
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            default=multiprocessing.cpu_count(),
+                            help="Number of worker processes; defaults to "
+                                 "the number of CPUs.")
+        parser.add_argument('--output',
+                            help="Path to write findings to; defaults to "
+                                 "stdout.")
+    
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes <= 0:
+            raise CommandError("Processes must be greater than zero.")
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db(
+                connection.settings_dict['NAME']):
+            # workers cannot share an in-memory database
+            processes = 1
+        
+        output = (io.open(options['output'], 'w', encoding='utf-8')
+                  if options['output'] else None)
+        try:
+            checked, count = self._report(processes, output or self.stdout,
+                                          options['verbosity'])
+        finally:
+            if output:
+                output.close()
+        
+        self.stderr.write("%s records audited, %s findings" % (
+            checked, count))
+        if count:
+            raise CommandError("%s findings." % count)
+    
+    def _report(self, processes, stream, verbosity):
+        checked, count = 0, 0
+        for partition, partition_checked, findings in audit.run(processes):
+            checked += partition_checked
+            count += len(findings)
+            for model_name, code, kind, message in findings:
+                stream.write(u"%s %s [%s]: %s\n" % (
+                    model_name, code, kind, message))
+            stream.flush()
+            if verbosity > 1:
+                self.stderr.write("%s %s: %s records, %s findings" % (
+                    partition[0], partition[1] or '', partition_checked,
+                    len(findings)))
+        return checked, count
@@ -0,0 +1,41 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...exporter import DEFAULT_CHUNK_SIZE, EXPORTS, iter_export
+
+
+
+class Command(BaseCommand):
+    help = ("Exports stations, power lines, transformer ratings or "
+            "transformers as CSV or JSON-lines, streaming rows in chunks.")
+    
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS),
+                            help="Kind of records to export.")
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            default='csv', help="Format of output file.")
+        parser.add_argument('--gzip', action='store_true', default=False,
+                            help="Compresses output with gzip.")
+        parser.add_argument('--chunk-size', type=int,
+                            default=DEFAULT_CHUNK_SIZE,
+                            help="Number of records fetched per query.")
+        parser.add_argument('--output',
+                            help="Path to output file; defaults to stdout.")
+    
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError("Chunk size must be greater than zero.")
+        
+        chunks = iter_export(options['kind'], options['format'],
+                             options['gzip'], options['chunk_size'])
+        if options['output']:
+            with io.open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        else:
+            stream = getattr(sys.stdout, 'buffer', sys.stdout)
+            for chunk in chunks:
+                stream.write(chunk)
+            stream.flush()
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...generator import DEFAULT_BATCH_SIZE, DEFAULT_BRANCHING, Branching,\
+        generate_network
+
+
+
+class Command(BaseCommand):
+    help = ("Generates a synthetic network of valid stations, power lines, "
+            "transformer ratings and transformers for load testing.")
+    
+    def add_arguments(self, parser):
+        parser.add_argument('stations', type=int,
+                            help="Number of stations to generate.")
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Seed for the random fan-out of the network.")
+        parser.add_argument('--batch-size', type=int,
+                            default=DEFAULT_BATCH_SIZE,
+                            help="Number of records written per insert.")
+        for level in Branching._fields:
+            parser.add_argument('--%s' % level.replace('_', '-'), nargs=2,
+                                type=int, metavar=('MIN', 'MAX'),
+                                help="Range of %s per parent; defaults to %s."
+                                     % (level, getattr(DEFAULT_BRANCHING,
+                                                       level)))
+    
+    def handle(self, *args, **options):
+        branching = DEFAULT_BRANCHING._replace(**dict(
+            (level, tuple(options[level])) for level in Branching._fields
+            if options[level]))
+        for level, (low, high) in zip(Branching._fields, branching):
+            if low < 0 or high < low:
+                raise CommandError("Invalid range for %s." % level)
+        
+        try:
+            created = generate_network(options['stations'], options['seed'],
+                                       branching, options['batch_size'])
+        except ValueError as ex:
+            raise CommandError(str(ex))
+        
+        for name, count in sorted(created.items()):
+            self.stdout.write("%s: %s created" % (name, count))
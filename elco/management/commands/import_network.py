@@ -0,0 +1,65 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...importer import DEFAULT_CHUNK_SIZE, NetworkImporter, ReportWriter,\
+        read_csv, read_jsonlines
+
+
+
+class Command(BaseCommand):
+    help = ("Imports stations, power lines, transformer ratings and "
+            "transformers from CSV or JSON-lines files.")
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--stations', help="Path to stations file.")
+        parser.add_argument('--powerlines', help="Path to power lines file.")
+        parser.add_argument('--ratings',
+                            help="Path to transformer ratings file.")
+        parser.add_argument('--transformers',
+                            help="Path to transformers file.")
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            default='csv', help="Format of input files.")
+        parser.add_argument('--chunk-size', type=int,
+                            default=DEFAULT_CHUNK_SIZE,
+                            help="Number of rows validated and written at once.")
+        parser.add_argument('--report',
+                            help="Path to write CSV report of rejected rows.")
+    
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError("Chunk size must be greater than zero.")
+        
+        reader = (read_csv if options['format'] == 'csv' else read_jsonlines)
+        # rejected rows are written out as found rather than held
+        report = (io.open(options['report'], 'w', newline='')
+                  if options['report'] else None)
+        try:
+            importer = NetworkImporter(
+                chunk_size=options['chunk_size'],
+                on_error=ReportWriter(report) if report else None)
+            
+            # order matters as later records reference earlier ones
+            steps = (
+                ('stations', importer.import_stations),
+                ('ratings', importer.import_ratings),
+                ('powerlines', importer.import_powerlines),
+                ('transformers', importer.import_transformers),
+            )
+            for key, import_rows in steps:
+                if options[key]:
+                    with io.open(options[key], encoding='utf-8',
+                                 newline='') as f:
+                        import_rows(reader(f))
+            importer.finish()
+        finally:
+            if report:
+                report.close()
+        
+        for name, count in sorted(importer.created.items()):
+            self.stdout.write("%s: %s created" % (name, count))
+        if importer.unlinked:
+            self.stdout.write("%s stations imported without their source "
+                              "feeder" % importer.unlinked)
+        self.stdout.write("%s rows rejected" % (
+            importer.error_count - importer.unlinked))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import rollups
+
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the power line and transformer counts and installed "
+            "capacity rollups of stations and power lines from scratch, then "
+            "verifies them.")
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--path',
+                            help="Limits the rebuild to the subtree rooted "
+                                 "at the node with this materialized path.")
+        parser.add_argument('--check', action='store_true', default=False,
+                            help="Only verifies rollups reporting mismatches.")
+    
+    def handle(self, *args, **options):
+        path = options['path']
+        if not options['check']:
+            updated = rollups.rebuild(path)
+            self.stdout.write("%s records updated" % updated)
+        
+        mismatches = rollups.verify(path)
+        for model_name, code, stored, expected in mismatches:
+            self.stdout.write("%s %s: stored %s, expected %s" % (
+                model_name, code, stored, expected))
+        if mismatches:
+            raise CommandError("%s records with mismatched rollups."
+                               % len(mismatches))
+        self.stdout.write("rollups verified")
@@ -0,0 +1,272 @@
+"""
+A metrics registry holding counters and latency histograms for the hot paths
+of the elco app, rendered in the Prometheus text exposition format.
+
+Values are aggregated per thread: each thread records into its own dict of
+values, which no other thread writes to, thus recording takes no lock and
+costs a dict lookup plus an addition. Collection sums the values of all
+threads, folding those of finished threads into a retired total.
+
+Cache hit ratios are derived from the `elco_cache_requests_total` counter,
+e.g. `rate(...{result="hit"}[5m]) / rate(...[5m])`.
+"""
+import threading
+from bisect import bisect_left
+from functools import wraps
+from timeit import default_timer
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# upper bounds in seconds; sub-millisecond buckets resolve validators
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+
+class Registry(object):
+    """Holds metrics by name for rendering."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError("Metric already registered: %s" % metric.name)
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def render(self):
+        """Returns the text exposition of all metrics ordered by name."""
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric(object):
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(),
+                 registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._stores = []       # (thread, values) for threads recording
+        self._retired = {}      # values of finished threads
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _get_values(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._stores.append((threading.current_thread(), values))
+            return values
+
+    def collect(self):
+        """Returns values summed over all threads keyed by label values."""
+        with self._lock:
+            live = []
+            for thread, values in self._stores:
+                if thread.is_alive():
+                    live.append((thread, values))
+                else:
+                    self._merge(self._retired, values)
+            self._stores = live
+            totals = {}
+            self._merge(totals, self._retired)
+            for _, values in live:
+                # a copy is taken in one step under the GIL
+                self._merge(totals, values.copy())
+        return totals
+
+    def reset(self):
+        """Discards all recorded values."""
+        with self._lock:
+            self._retired = {}
+            for _, values in self._stores:
+                values.clear()
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, _escape(self.documentation,
+                                                       False)),
+                 '# TYPE %s %s' % (self.name, self.kind)]
+        for labels, value in sorted(self.collect().items()):
+            lines.extend(self._render_value(labels, value))
+        return lines
+
+    def _format_labels(self, labels, extra=()):
+        pairs = list(zip(self.labelnames, labels)) + list(extra)
+        if not pairs:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (name, _escape(value))
+                                 for name, value in pairs)
+
+
+class Counter(_Metric):
+    """A cumulative count, optionally split by label values."""
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        values = self._get_values()
+        values[labels] = values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self.collect().get(labels, 0)
+
+    def _merge(self, totals, values):
+        for labels, value in values.items():
+            totals[labels] = totals.get(labels, 0) + value
+
+    def _render_value(self, labels, value):
+        yield '%s%s %s' % (self.name, self._format_labels(labels),
+                           _format_value(value))
+
+
+class Histogram(_Metric):
+    """Observations counted into buckets by upper bound, optionally split by
+    label values. Values recorded per label values are a list holding the
+    count of each bucket, the overflow bucket and the sum of observations.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super(Histogram, self).__init__(name, documentation, labelnames,
+                                        registry)
+
+    def observe(self, value, labels=()):
+        values = self._get_values()
+        counts = values.get(labels)
+        if counts is None:
+            counts = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def time(self, labels=()):
+        """Returns a context manager and decorator observing the time taken
+        by a block or function.
+        """
+        return _Timer(self, labels)
+
+    def count(self, labels=()):
+        counts = self.collect().get(labels)
+        return sum(counts[:-1]) if counts else 0
+
+    def _merge(self, totals, values):
+        for labels, counts in values.items():
+            current = totals.get(labels)
+            if current is None:
+                totals[labels] = list(counts)
+            else:
+                for i, value in enumerate(counts):
+                    current[i] += value
+
+    def _render_value(self, labels, counts):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            yield '%s_bucket%s %s' % (
+                self.name, self._format_labels(labels,
+                                               [('le', _format_value(bound))]),
+                cumulative)
+        suffix = self._format_labels(labels)
+        yield '%s_sum%s %s' % (self.name, suffix, _format_value(counts[-1]))
+        yield '%s_count%s %s' % (self.name, suffix, cumulative)
+
+
+class _Timer(object):
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self._start = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(default_timer() - self._start, self.labels)
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram, self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def _escape(value, quotes=True):
+    value = str(value).replace('\\', r'\\').replace('\n', r'\n')
+    return value.replace('"', r'\"') if quotes else value
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Returns the text exposition of all registered metrics."""
+    return REGISTRY.render()
+
+
+def time_form_view(view_name):
+    """Decorates a view managing a model form to observe its latency split by
+    request method and outcome: `unbound` for requests not submitting the
+    form, `valid` where the submission is accepted with a redirect,
+    `invalid` where the form is rendered again, and `error` on exceptions.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            start = default_timer()
+            outcome = 'error'
+            try:
+                response = view(request, *args, **kwargs)
+                if request.method != 'POST':
+                    outcome = 'unbound'
+                elif 300 <= response.status_code < 400:
+                    outcome = 'valid'
+                else:
+                    outcome = 'invalid'
+                return response
+            finally:
+                VIEW_LATENCY.observe(default_timer() - start,
+                                     (view_name, request.method, outcome))
+        return wrapper
+    return decorator
+
+
+VIEW_LATENCY = Histogram(
+    'elco_view_duration_seconds',
+    "Time taken by the Station and PowerLine management views.",
+    ('view', 'method', 'outcome'))
+
+FORM_INIT_LATENCY = Histogram(
+    'elco_form_init_duration_seconds',
+    "Time taken to construct Station and PowerLine forms.", ('form',))
+
+CLEAN_LATENCY = Histogram(
+    'elco_clean_validator_duration_seconds',
+    "Time taken by each validator run by model clean methods.",
+    ('model', 'validator'))
+
+CACHE_REQUESTS = Counter(
+    'elco_cache_requests_total',
+    "Lookups of cached records and choices by cache and result.",
+    ('cache', 'model', 'result'))
@@ -0,0 +1,62 @@
+"""
+Middleware classes provided by the elco app.
+"""
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import caching, instrumentation
+
+
+
+class IdentityMapMiddleware(object):
+    """Scopes the per-thread identity map of the record cache to a request,
+    thus a Station or PowerLine is fetched at most once per request.
+    """
+    
+    def process_request(self, request):
+        caching.activate_identity_map()
+    
+    def process_response(self, request, response):
+        caching.deactivate_identity_map()
+        return response
+    
+    def process_exception(self, request, exception):
+        caching.deactivate_identity_map()
+
+
+class QueryInstrumentationMiddleware(object):
+    """Records the queries issued while handling requests for elco views,
+    logging a report per request and exposing a summary in `X-Elco-*`
+    response headers when DEBUG is on.
+    
+    Enabled by the `ELCO_QUERY_INSTRUMENTATION` setting which defaults to
+    DEBUG; when disabled Django drops the middleware at start up, thus it
+    adds no overhead.
+    """
+    
+    def __init__(self):
+        if not getattr(settings, 'ELCO_QUERY_INSTRUMENTATION', settings.DEBUG):
+            raise MiddlewareNotUsed()
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        module = getattr(view_func, '__module__', None) or ''
+        if module.split('.')[0] == 'elco':
+            name = '%s.%s' % (module, getattr(view_func, '__name__', 'view'))
+            recorder = instrumentation.record_queries(name=name, log=True)
+            request._elco_query_recorder = recorder.__enter__()
+    
+    def process_response(self, request, response):
+        recorder = getattr(request, '_elco_query_recorder', None)
+        if recorder is None:
+            return response
+        
+        del request._elco_query_recorder
+        recorder.__exit__(None, None, None)
+        if settings.DEBUG:
+            report = recorder.get_report()
+            response['X-Elco-Queries'] = str(report['queries'])
+            response['X-Elco-Query-Time'] = '%.3f' % report['time_ms']
+            response['X-Elco-Duplicate-Queries'] = str(
+                sum(d['count'] - 1 for d in report['duplicates']))
+            response['X-Elco-N-Plus-One'] = str(len(report['n_plus_one']))
+        return response
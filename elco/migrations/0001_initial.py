@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 21:45
+from __future__ import unicode_literals
+
+import address.models
+from django.db import migrations, models
+import django.db.models.deletion
+import elco.models
+import elco.validators
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('address', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('seq', models.AutoField(primary_key=True, serialize=False, verbose_name='Sequence')),
+                ('model', models.CharField(db_index=True, max_length=30, verbose_name='Model')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Object Id')),
+                ('code', models.CharField(max_length=10, verbose_name='Code')),
+                ('action', models.CharField(choices=[('C', 'Create'), ('U', 'Update'), ('D', 'Delete')], max_length=1, verbose_name='Action')),
+                ('row_version', models.PositiveIntegerField(verbose_name='Row Version')),
+                ('data', models.TextField(blank=True, verbose_name='Data')),
+                ('timestamp', models.DateTimeField(auto_now_add=True, verbose_name='Timestamp')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PowerLine',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(db_index=True, default=True, verbose_name='Active')),
+                ('date_created', models.DateField(auto_now_add=True, verbose_name='Date Created')),
+                ('last_updated', models.DateField(auto_now=True, null=True, verbose_name='Last Updated')),
+                ('notes', models.TextField(blank=True, verbose_name='Notes')),
+                ('row_version', models.PositiveIntegerField(default=1, editable=False, verbose_name='Row Version')),
+                ('code', models.CharField(max_length=10, unique=True, validators=[elco.validators.validate_powerline_code_format], verbose_name='Code')),
+                ('alt_code', models.CharField(blank=True, max_length=10, verbose_name='Alternate Code')),
+                ('name', models.CharField(max_length=100, verbose_name='Name')),
+                ('type', models.CharField(choices=[('F', 'Feeder'), ('U', 'Upriser')], max_length=1, verbose_name='Type')),
+                ('voltage', models.PositiveSmallIntegerField(choices=[(3, '33KV'), (4, '11KV'), (5, '0.415KV')], verbose_name='Voltage')),
+                ('public', models.BooleanField(default=True, verbose_name='Public')),
+                ('path', models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='Path')),
+                ('depth', models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Depth')),
+                ('installed_capacity', models.IntegerField(default=0, editable=False, verbose_name='Installed Capacity')),
+                ('date_commissioned', models.DateField(blank=True, null=True, verbose_name='Date Commissioned')),
+            ],
+            bases=(elco.models.NetworkNodeMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='Station',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(db_index=True, default=True, verbose_name='Active')),
+                ('date_created', models.DateField(auto_now_add=True, verbose_name='Date Created')),
+                ('last_updated', models.DateField(auto_now=True, null=True, verbose_name='Last Updated')),
+                ('notes', models.TextField(blank=True, verbose_name='Notes')),
+                ('row_version', models.PositiveIntegerField(default=1, editable=False, verbose_name='Row Version')),
+                ('code', models.CharField(max_length=10, unique=True, validators=[elco.validators.validate_station_code_format], verbose_name='Code')),
+                ('alt_code', models.CharField(blank=True, max_length=10, verbose_name='Alternate Code')),
+                ('name', models.CharField(max_length=100, verbose_name='Name')),
+                ('category', models.CharField(choices=[('T', 'Transmission'), ('I', 'Injection'), ('D', 'Distribution')], max_length=1, verbose_name='Category')),
+                ('public', models.BooleanField(default=True, verbose_name='Public')),
+                ('voltage_ratio', models.PositiveSmallIntegerField(choices=[(1, '330/132KV'), (2, '132/33KV'), (3, '132/11KV'), (4, '33/11KV'), (5, '33/0.415KV'), (6, '11/0.415KV')], verbose_name='Voltage Ratio')),
+                ('path', models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='Path')),
+                ('depth', models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Depth')),
+                ('powerline_count', models.IntegerField(default=0, editable=False, verbose_name='Power Lines')),
+                ('transformer_count', models.IntegerField(default=0, editable=False, verbose_name='Transformers')),
+                ('installed_capacity', models.IntegerField(default=0, editable=False, verbose_name='Installed Capacity')),
+                ('date_commissioned', models.DateField(blank=True, null=True, verbose_name='Date Commissioned')),
+                ('address', address.models.AddressField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='address.Address', verbose_name='Address')),
+                ('source_feeder', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, to='elco.PowerLine', to_field='code', verbose_name='Source Feeder')),
+            ],
+            bases=(elco.models.NetworkNodeMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='Transformer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(db_index=True, default=True, verbose_name='Active')),
+                ('date_created', models.DateField(auto_now_add=True, verbose_name='Date Created')),
+                ('last_updated', models.DateField(auto_now=True, null=True, verbose_name='Last Updated')),
+                ('notes', models.TextField(blank=True, verbose_name='Notes')),
+                ('row_version', models.PositiveIntegerField(default=1, editable=False, verbose_name='Row Version')),
+                ('serialno', models.CharField(blank=True, max_length=50, unique=True, verbose_name='Serial #')),
+                ('model', models.CharField(blank=True, max_length=100, verbose_name='Model')),
+                ('manufacturer', models.CharField(blank=True, max_length=100, verbose_name='Manufacturer')),
+                ('condition', models.PositiveSmallIntegerField(choices=[(0, 'Unknown'), (1, 'OK'), (2, 'Burnt'), (3, 'Damaged'), (4, 'Faulty')], verbose_name='Condition')),
+                ('date_installed', models.DateField(blank=True, null=True, verbose_name='Date Installed')),
+                ('date_manufactured', models.DateField(blank=True, null=True, verbose_name='Date Manufactured')),
+                ('code', models.CharField(max_length=10, verbose_name='Code')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TransformerRating',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(db_index=True, default=True, verbose_name='Active')),
+                ('date_created', models.DateField(auto_now_add=True, verbose_name='Date Created')),
+                ('last_updated', models.DateField(auto_now=True, null=True, verbose_name='Last Updated')),
+                ('notes', models.TextField(blank=True, verbose_name='Notes')),
+                ('row_version', models.PositiveIntegerField(default=1, editable=False, verbose_name='Row Version')),
+                ('code', models.CharField(max_length=5, unique=True, validators=[elco.validators.validate_transformer_rating_code_format], verbose_name='Code')),
+                ('capacity', models.PositiveIntegerField(verbose_name='Capacity')),
+                ('voltage_ratio', models.PositiveSmallIntegerField(choices=[(1, '330/132KV'), (2, '132/33KV'), (3, '132/11KV'), (4, '33/11KV'), (5, '33/0.415KV'), (6, '11/0.415KV')], verbose_name='Voltage Ratio')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='transformerrating',
+            unique_together=set([('capacity', 'voltage_ratio')]),
+        ),
+        migrations.AddField(
+            model_name='transformer',
+            name='rating',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='elco.TransformerRating', to_field='code', verbose_name='Rating'),
+        ),
+        migrations.AddField(
+            model_name='transformer',
+            name='station',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='elco.Station', to_field='code', verbose_name='Station'),
+        ),
+        migrations.AddField(
+            model_name='powerline',
+            name='source_station',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='elco.Station', to_field='code', verbose_name='Source Station'),
+        ),
+        migrations.AlterIndexTogether(
+            name='change',
+            index_together=set([('model', 'object_id')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='transformer',
+            unique_together=set([('code', 'station')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='station',
+            unique_together=set([('name', 'category')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='powerline',
+            unique_together=set([('name', 'voltage')]),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 21:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.manager
+import elco.indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elco', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='powerline',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name='station',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name='transformer',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name='transformerrating',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='powerline',
+            name='is_active',
+            field=models.BooleanField(default=True, verbose_name='Active'),
+        ),
+        migrations.AlterField(
+            model_name='station',
+            name='is_active',
+            field=models.BooleanField(default=True, verbose_name='Active'),
+        ),
+        migrations.AlterField(
+            model_name='transformer',
+            name='is_active',
+            field=models.BooleanField(default=True, verbose_name='Active'),
+        ),
+        migrations.AlterField(
+            model_name='transformerrating',
+            name='is_active',
+            field=models.BooleanField(default=True, verbose_name='Active'),
+        ),
+        migrations.RunPython(
+            code=elco.indexes.create_indexes,
+            reverse_code=elco.indexes.drop_indexes,
+        ),
+    ]
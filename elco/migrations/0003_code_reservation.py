@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 22:09
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elco', '0002_active_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeReservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10, unique=True, verbose_name='Code')),
+                ('date_reserved', models.DateTimeField(auto_now_add=True, verbose_name='Date Reserved')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import elco.indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elco', '0003_code_reservation'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            code=elco.indexes.create_prefix_indexes,
+            reverse_code=elco.indexes.drop_prefix_indexes,
+        ),
+    ]
@@ -1,9 +1,14 @@
-from django.db import models
-from django.core.exceptions import ValidationError
+from timeit import default_timer
+
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Concat, Substr
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
 from django.utils.translation import ugettext_lazy as _
 
 from address.models import AddressField
 
+from . import metrics
 from .constants import Condition, Voltage
 from .validators import validate_powerline_code_format,\
         validate_station_code_format, validate_transformer_rating_code,\
@@ -24,22 +29,433 @@ MSG_POWERLINE_VOLTAGE_MISMATCH_SOURCE_FEEDER = _(
 MSG_FMT_INVALID_VOLTAGE_RATIO = \
     "Invalid voltage ratio provided for %s station category."
 
+# separator for codes within a materialized network path
+PATH_SEPARATOR = '/'
+
 
 
 class AbstractBaseModel(models.Model):
     """An abstract base model that provides an `is_active` field and other fields
     for tracking dates of creation and last update for a databas entity.
     """
-    is_active = models.BooleanField(_("Active"), default=True, db_index=True)
+    # indexed along with other columns over active rows, see `indexes`
+    is_active = models.BooleanField(_("Active"), default=True)
     date_created = models.DateField(_("Date Created"), auto_now_add=True)
     last_updated = models.DateField(_("Last Updated"), auto_now=True, null=True)
     notes = models.TextField(_("Notes"), blank=True)
+    # bumped on each change written to the change log
+    row_version = models.PositiveIntegerField(
+        _("Row Version"), default=1, editable=False)
     
     class Meta:
         abstract = True
+    
+    def _run_validators(self, *validators):
+        """Runs the provided clean validators in order, recording the time
+        taken by each.
+        """
+        model_name = self._meta.model_name
+        for validator in validators:
+            start = default_timer()
+            try:
+                validator()
+            finally:
+                metrics.CLEAN_LATENCY.observe(default_timer() - start,
+                                              (model_name, validator.__name__))
+
+
+class ActiveManager(models.Manager):
+    """A manager whose querysets hold only active records by default, with
+    `all_with_inactive` returning all records.
+    
+    Models declare an unfiltered manager ahead of this one to serve as their
+    default manager, which Django uses for uniqueness checks, related lookups
+    and serialization where inactive records must be seen.
+    """
+    
+    def get_queryset(self):
+        return self.all_with_inactive().filter(is_active=True)
+    
+    def all_with_inactive(self):
+        return super(ActiveManager, self).get_queryset()
+
+
+class BulkQuerySet(models.QuerySet):
+    """Provides validation of many model instances at once."""
+    # maximum number of values per lookup; keeps within SQLite variable limit
+    lookup_batch_size = 500
+    
+    def bulk_full_clean(self, instances, validate_unique=True):
+        """Validates instances as `full_clean` does using a fixed number of
+        queries for every `lookup_batch_size` instances. Records referenced
+        by foreign keys are fetched together and assigned to the instances
+        before the model `clean` rules run. As with `full_clean`, unique
+        checks are skipped where `validate_unique` is False.
+        
+        Returns a dict mapping the index of each invalid instance to the
+        ValidationError for it.
+        """
+        instances = list(instances)
+        messages = [{} for _ in instances]
+        
+        foreign_keys = [f for f in self.model._meta.concrete_fields
+                        if f.is_relation and f.many_to_one]
+        for field in foreign_keys:
+            self._assign_related(field, instances, messages)
+        
+        exclude = [f.name for f in foreign_keys]
+        for instance, errors in zip(instances, messages):
+            # clean rules need related records, thus skipped when those
+            # could not be resolved.
+            resolved = not any(name in errors for name in exclude)
+            try:
+                instance.clean_fields(exclude=exclude)
+            except ValidationError as ex:
+                ex.update_error_dict(errors)
+            try:
+                if resolved:
+                    instance.clean()
+            except ValidationError as ex:
+                ex.update_error_dict(errors)
+        
+        if validate_unique:
+            conflicts = self.find_unique_conflicts(instances)
+            for index, error in conflicts.items():
+                error.update_error_dict(messages[index])
+        
+        return dict((index, ValidationError(errors))
+                    for index, errors in enumerate(messages) if errors)
+    
+    def find_unique_conflicts(self, instances):
+        """Returns a dict mapping the index of each instance which violates a
+        unique constraint, either against existing records or an instance
+        earlier in the sequence, to a ValidationError describing it.
+        """
+        opts = self.model._meta
+        checks = [(f.name,) for f in opts.local_concrete_fields
+                  if f.unique and not f.primary_key]
+        checks.extend(opts.unique_together)
+        
+        conflicts = {}
+        for check in checks:
+            attnames = [opts.get_field(f).attname for f in check]
+            keys = [tuple(getattr(i, a) for a in attnames) for i in instances]
+            
+            # values which are empty are not checked, as with blank serialno
+            existing = self._fetch_values(
+                attnames[0], set(k[0] for k in keys if all(k)),
+                ['pk'] + attnames)
+            seen = dict((tuple(row[1:]), row[0]) for row in existing)
+            for index, (key, instance) in enumerate(zip(keys, instances)):
+                if not all(key):
+                    continue
+                if key in seen and seen[key] != instance.pk:
+                    # keyed as full_clean does for unique checks
+                    field_key = (check[0] if len(check) == 1
+                                 else NON_FIELD_ERRORS)
+                    error = instance.unique_error_message(self.model, check)
+                    conflicts.setdefault(index, {})\
+                             .setdefault(field_key, []).append(error)
+                    continue
+                seen[key] = (instance.pk if instance.pk is not None
+                             else (None, index))
+        
+        return dict((index, ValidationError(errors))
+                    for index, errors in conflicts.items())
+    
+    def _fetch_values(self, field_name, values, fields):
+        values, rows = list(values), []
+        for start in range(0, len(values), self.lookup_batch_size):
+            batch = values[start:start + self.lookup_batch_size]
+            lookup = {'%s__in' % field_name: batch}
+            rows.extend(self.model._default_manager.filter(**lookup)
+                                                   .values_list(*fields))
+        return rows
+    
+    def _assign_related(self, field, instances, messages):
+        target = field.remote_field.field_name
+        manager = field.related_model._default_manager
+        values = set(getattr(i, field.attname) for i in instances)
+        values.discard(None)
+        
+        values, related = list(values), {}
+        for start in range(0, len(values), self.lookup_batch_size):
+            batch = values[start:start + self.lookup_batch_size]
+            for record in manager.filter(**{'%s__in' % target: batch}):
+                related[getattr(record, target)] = record
+        
+        for instance, errors in zip(instances, messages):
+            value = getattr(instance, field.attname)
+            if value is None:
+                if not field.null:
+                    errors.setdefault(field.name, []).append(
+                        field.error_messages['null'])
+                continue
+            
+            record = related.get(value)
+            if record is None:
+                error = ValidationError(
+                    field.error_messages['invalid'], code='invalid',
+                    params={'model': field.related_model._meta.verbose_name,
+                            'pk': value, 'field': target, 'value': value})
+                errors.setdefault(field.name, []).extend(error.messages)
+            else:
+                setattr(instance, field.name, record)
+
+
+class CodeQuerySet(BulkQuerySet):
+    """Provides lookups for models identified by a unique code."""
+    
+    def in_bulk_by_code(self, codes):
+        """Returns a dict mapping each of the provided codes to the record
+        with that code; codes without a record are left out.
+        """
+        codes, result = list(set(codes)), {}
+        for start in range(0, len(codes), self.lookup_batch_size):
+            batch = codes[start:start + self.lookup_batch_size]
+            for record in self.filter(code__in=batch):
+                result[record.code] = record
+        return result
+
+
+class NetworkQuerySet(CodeQuerySet):
+    """Provides tree queries over the network formed by the links from a
+    Station to its source feeder and from a PowerLine to its source station.
+    
+    Each query runs as a single statement with the tree walked by a recursive
+    common table expression over both tables; the result remains chainable.
+    """
+    # field by which subtree statistics are grouped
+    stats_group_field = None
+    
+    def descendants_of(self, code):
+        """Returns records fed directly or indirectly from the node with the
+        provided code.
+        """
+        return self._filter_tree(code, downwards=True)
+    
+    def ancestors_of(self, code):
+        """Returns records feeding directly or indirectly the node with the
+        provided code.
+        """
+        return self._filter_tree(code, downwards=False)
+    
+    def subtree_stats(self, code):
+        """Returns counts of records fed from the node with provided code as
+        a dict with the total, active and per group counts.
+        """
+        group_field = self.stats_group_field
+        rows = (self.descendants_of(code)
+                    .values_list(group_field, 'is_active')
+                    .annotate(count=Count('pk'))
+                    .order_by())
+        
+        stats = {'total': 0, 'active': 0, 'by_%s' % group_field: {}}
+        for group, is_active, count in rows:
+            stats['total'] += count
+            if is_active:
+                stats['active'] += count
+            groups = stats['by_%s' % group_field]
+            groups[group] = groups.get(group, 0) + count
+        return stats
+    
+    def unreachable(self):
+        """Returns records not fed directly or indirectly from any root, a
+        node without a source, as with orphans and nodes within cycles.
+        """
+        return self.extra(where=[
+            self._tree_where('NOT IN', 'e.parent IS NULL', downwards=True)])
+    
+    def _filter_tree(self, code, downwards):
+        return self.extra(where=[self._tree_where('IN', 'e.{near} = %s',
+                                                  downwards)],
+                          params=[code])
+    
+    def _tree_where(self, operator, seed, downwards):
+        """Returns a where clause matching codes in, or not in as per
+        operator, the nodes walked from those edges matching seed.
+        """
+        qn = connection.ops.quote_name
+        station, powerline = Station._meta, PowerLine._meta
+        edges = ("SELECT {0} AS child, {1} AS parent FROM {2} "
+                 "UNION ALL SELECT {3}, {4} FROM {5}").format(
+                    qn(station.get_field('code').column),
+                    qn(station.get_field('source_feeder').column),
+                    qn(station.db_table),
+                    qn(powerline.get_field('code').column),
+                    qn(powerline.get_field('source_station').column),
+                    qn(powerline.db_table))
+        
+        # walk from parent to child when going down the tree else reverse
+        near, far = (('parent', 'child') if downwards else ('child', 'parent'))
+        where = ("{table}.{column} {operator} ("
+                 "WITH RECURSIVE tree(code) AS ("
+                 "SELECT e.{far} FROM ({edges}) e WHERE " + seed + " "
+                 "UNION "
+                 "SELECT e.{far} FROM ({edges}) e "
+                 "JOIN tree t ON e.{near} = t.code"
+                 ") SELECT code FROM tree)")
+        return where.format(
+                    table=qn(self.model._meta.db_table),
+                    column=qn(self.model._meta.get_field('code').column),
+                    operator=operator, edges=edges, near=near, far=far)
+    
+    def under_path(self, path):
+        """Returns records within the subtree rooted at the node with the
+        provided materialized path, excluding the node itself.
+        """
+        return self.filter(path__startswith=path + PATH_SEPARATOR)
+
+
+class StationQuerySet(NetworkQuerySet):
+    stats_group_field = 'category'
+
+
+class PowerLineQuerySet(NetworkQuerySet):
+    stats_group_field = 'voltage'
+
+
+class NetworkNodeMixin(object):
+    """Provides traversal of the network tree for models linked into it. The
+    traversals are answered from the in-memory topology index and return codes.
+    
+    Also maintains the materialized `path` and `depth` of a node on save, with
+    paths of all nodes within its subtree updated in bulk when it moves.
+    """
+    # name of the foreign key linking a node to its parent
+    parent_field = None
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old_path, old_depth = self._get_stored_path()
+            self.path, self.depth = self._build_path()
+            super(NetworkNodeMixin, self).save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                _rebase_subtree(old_path, self.path, self.depth - old_depth)
+    
+    def deactivate(self):
+        """Marks this node and all nodes within its subtree as inactive."""
+        with transaction.atomic():
+            self.is_active = False
+            self.save()
+            from .changelog import log_update
+            for model in (Station, PowerLine):
+                records = model._default_manager.under_path(self.path)\
+                               .filter(is_active=True)
+                log_update(model, records, is_active=False)
+            
+            # bulk updates send no signals, hence refresh derived data
+            from .rollups import rebuild
+            rebuild(self.path)
+        
+        from . import impact, spatial
+        from .caching import invalidate_model
+        invalidate_model(Station)
+        invalidate_model(PowerLine)
+        spatial.reset_index()
+        impact.reset_index()
+    
+    def get_parent(self):
+        """Returns the node feeding this, looked up through the record cache."""
+        from .caching import get_related
+        return get_related(self, self.parent_field)
+    
+    def downstream(self):
+        """Returns codes of all nodes fed directly or indirectly from this."""
+        from .topology import get_index
+        return get_index().downstream(self.code)
+    
+    def upstream(self):
+        """Returns codes of all nodes feeding this starting with the nearest."""
+        from .topology import get_index
+        return get_index().upstream(self.code)
+    
+    def path_to_root(self):
+        """Returns codes from this node up to the root of its tree."""
+        from .topology import get_index
+        return get_index().path_to_root(self.code)
+    
+    def subtree_size(self):
+        """Returns the number of nodes fed directly or indirectly from this."""
+        from .topology import get_index
+        return get_index().subtree_size(self.code)
+    
+    def _get_stored_path(self):
+        if not self.pk:
+            return ('', 0)
+        
+        manager = type(self)._default_manager
+        stored = manager.filter(pk=self.pk).values_list('path', 'depth')
+        return (stored[0] if stored else ('', 0))
+    
+    def _build_path(self):
+        field = self._meta.get_field(self.parent_field)
+        parent_code = getattr(self, field.attname)
+        if parent_code:
+            manager = field.related_model._default_manager
+            parent = manager.filter(code=parent_code)\
+                            .values_list('path', 'depth').first()
+            if parent and parent[0]:
+                path = PATH_SEPARATOR.join((parent[0], self.code))
+                return (path, parent[1] + 1)
+        return (self.code, 0)
+
+
+def _rebase_subtree(old_path, new_path, depth_delta):
+    """Moves paths of all nodes under old_path to new_path with a single bulk
+    update per table.
+    """
+    from .caching import invalidate_model
+    old_prefix = old_path + PATH_SEPARATOR
+    new_prefix = new_path + PATH_SEPARATOR
+    for model in (Station, PowerLine):
+        model._default_manager.under_path(old_path).update(
+            path=Concat(Value(new_prefix),
+                        Substr('path', len(old_prefix) + 1),
+                        output_field=models.CharField()),
+            depth=F('depth') + depth_delta)
+        invalidate_model(model)
 
 
-class Station(AbstractBaseModel):
+def rebuild_network_paths():
+    """Recomputes the materialized path and depth of every Station and
+    PowerLine from their links, one level of the network at a time. Intended
+    for use after records are written without going through `save`.
+    
+    Nodes which cannot be reached from a root, as with orphans or cycles, are
+    left with an empty path.
+    """
+    qn = connection.ops.quote_name
+    tables = (
+        (Station._meta, 'source_feeder', PowerLine._meta),
+        (PowerLine._meta, 'source_station', Station._meta))
+    
+    with transaction.atomic(), connection.cursor() as cursor:
+        for opts, parent_field, parent_opts in tables:
+            fk = qn(opts.get_field(parent_field).column)
+            cursor.execute(
+                "UPDATE {0} SET path = CASE WHEN {1} IS NULL THEN code "
+                "ELSE '' END, depth = 0".format(qn(opts.db_table), fk))
+        
+        level, updated = 0, True
+        while updated:
+            updated = False
+            for opts, parent_field, parent_opts in tables:
+                table, parent_table = (qn(opts.db_table),
+                                       qn(parent_opts.db_table))
+                fk = qn(opts.get_field(parent_field).column)
+                cursor.execute(
+                    "UPDATE {0} SET depth = %s, path = ("
+                    "SELECT p.path FROM {1} p WHERE p.code = {0}.{2}"
+                    ") || %s || code WHERE path = '' AND {2} IN ("
+                    "SELECT code FROM {1} WHERE depth = %s AND path <> '')"
+                    .format(table, parent_table, fk),
+                    [level + 1, PATH_SEPARATOR, level])
+                updated = updated or cursor.rowcount > 0
+            level += 1
+
+
+class Station(NetworkNodeMixin, AbstractBaseModel):
     """Represents a power station within an electric distribution power network."""
     TRANSMISSION = 'T'
     INJECTION    = 'I'
@@ -63,11 +479,25 @@ class Station(AbstractBaseModel):
     source_feeder = models.ForeignKey(
         'PowerLine', to_field='code', verbose_name=_("Source Feeder"),
         null=True, blank=True, default=None)
+    path = models.CharField(_("Path"), max_length=255, blank=True,
+                db_index=True, editable=False)
+    depth = models.PositiveSmallIntegerField(_("Depth"), default=0,
+                editable=False)
+    powerline_count = models.IntegerField(_("Power Lines"), default=0,
+                editable=False)
+    transformer_count = models.IntegerField(_("Transformers"), default=0,
+                editable=False)
+    installed_capacity = models.IntegerField(_("Installed Capacity"),
+                default=0, editable=False)
     address = AddressField(
         verbose_name=_("Address"), null=True, blank=True)
     date_commissioned = models.DateField(
         _("Date Commissioned"), null=True, blank=True)
     
+    all_objects = StationQuerySet.as_manager()
+    objects = ActiveManager.from_queryset(StationQuerySet)()
+    parent_field = 'source_feeder'
+    
     class Meta:
         unique_together = ('name', 'category')
     
@@ -76,9 +506,9 @@ class Station(AbstractBaseModel):
     
     def clean(self):
         # ensure valid voltage assigned based on category
-        self._validate_voltage_ratio()
-        self._validate_source_feeder()
-        self._validate_code()
+        self._run_validators(self._validate_voltage_ratio,
+                             self._validate_source_feeder,
+                             self._validate_code)
     
     def _validate_code(self):
         """Code format has been validated by field validator. Validation here
@@ -128,7 +558,8 @@ class Station(AbstractBaseModel):
             raise ValidationError(err_message)
     
     def _validate_source_feeder(self):
-        if not self.source_feeder:
+        source_feeder = self.get_parent()
+        if not source_feeder:
             return
         
         if self.category == Station.TRANSMISSION:
@@ -140,7 +571,7 @@ class Station(AbstractBaseModel):
             if self.voltage_ratio == Voltage.Ratio.MVOLTL_LVOLT:
                 expected_input_voltage = Voltage.MVOLTL
         
-        if self.source_feeder.voltage != expected_input_voltage:
+        if source_feeder.voltage != expected_input_voltage:
             raise ValidationError(MSG_XSTATION_INPUT_MISMATCH_FEEDER)
     
     @staticmethod
@@ -152,7 +583,7 @@ class Station(AbstractBaseModel):
         raise ValueError(_("Unknown station category text provided."))
 
 
-class PowerLine(AbstractBaseModel):
+class PowerLine(NetworkNodeMixin, AbstractBaseModel):
     """Represents a power line within an electric distribution power network."""
     FEEDER  = 'F'
     UPRISER = 'U'
@@ -180,9 +611,19 @@ class PowerLine(AbstractBaseModel):
     public = models.BooleanField(_("Public"), default=True)
     source_station = models.ForeignKey(
         'Station', to_field='code', verbose_name=_("Source Station"))
+    path = models.CharField(_("Path"), max_length=255, blank=True,
+                db_index=True, editable=False)
+    depth = models.PositiveSmallIntegerField(_("Depth"), default=0,
+                editable=False)
+    installed_capacity = models.IntegerField(_("Installed Capacity"),
+                default=0, editable=False)
     date_commissioned = models.DateField(
         _("Date Commissioned"), null=True, blank=True)
     
+    all_objects = PowerLineQuerySet.as_manager()
+    objects = ActiveManager.from_queryset(PowerLineQuerySet)()
+    parent_field = 'source_station'
+    
     class Meta:
         unique_together = ('name', 'voltage')
     
@@ -190,8 +631,8 @@ class PowerLine(AbstractBaseModel):
         return "%s %s" % (self.name, self.get_voltage_display())
     
     def clean(self):
-        self._validate_code()
-        self._validate_source_station()
+        self._run_validators(self._validate_code,
+                             self._validate_source_station)
     
     def _validate_code(self):
         # ensure fields required to perform validation are present
@@ -206,11 +647,12 @@ class PowerLine(AbstractBaseModel):
     
     def _validate_source_station(self):
         try:
-            if not self.voltage or not self.source_station:
+            source_station = self.get_parent()
+            if not self.voltage or not source_station:
                 return
             
             voltage_text = Voltage._text[self.voltage]
-            station_vr = self.source_station.get_voltage_ratio_display()
+            station_vr = source_station.get_voltage_ratio_display()
             station_out = station_vr.split('/')[1]
             
             if voltage_text.upper() == station_out.upper():
@@ -285,6 +727,9 @@ class TransformerRating(AbstractBaseModel):
     voltage_ratio = models.PositiveSmallIntegerField(
         _("Voltage Ratio"), choices=Voltage.Ratio.CHOICES)
     
+    all_objects = CodeQuerySet.as_manager()
+    objects = ActiveManager.from_queryset(CodeQuerySet)()
+    
     def __str__(self):
         return "%s, %s" % (self.capacity, self.get_voltage_ratio_display())
     
@@ -292,6 +737,9 @@ class TransformerRating(AbstractBaseModel):
         unique_together = ('capacity', 'voltage_ratio')
     
     def clean(self):
+        self._run_validators(self._validate_code)
+    
+    def _validate_code(self):
         # ensure coded rating & capacity match actual values
         validate_transformer_rating_code(
             self.code, self.capacity, self.voltage_ratio)
@@ -326,6 +774,53 @@ class Transformer(EquipmentBase):
     rating = models.ForeignKey(
         TransformerRating, to_field='code', verbose_name=_("Rating"))
     
+    all_objects = BulkQuerySet.as_manager()
+    objects = ActiveManager.from_queryset(BulkQuerySet)()
+    
     class Meta:
         unique_together = ('code', 'station')
 
+
+class Change(models.Model):
+    """Represents an entry in the append-only log of changes made to Station,
+    PowerLine, TransformerRating and Transformer records. Entries are ordered
+    by a sequence number which increases with each entry written.
+    """
+    CREATE = 'C'
+    UPDATE = 'U'
+    DELETE = 'D'
+    
+    ACTION_CHOICES = (
+        (CREATE, _("Create")),
+        (UPDATE, _("Update")),
+        (DELETE, _("Delete")),
+    )
+    
+    seq = models.AutoField(_("Sequence"), primary_key=True)
+    model = models.CharField(_("Model"), max_length=30, db_index=True)
+    object_id = models.PositiveIntegerField(_("Object Id"))
+    code = models.CharField(_("Code"), max_length=10)
+    action = models.CharField(_("Action"), max_length=1,
+                              choices=ACTION_CHOICES)
+    row_version = models.PositiveIntegerField(_("Row Version"))
+    data = models.TextField(_("Data"), blank=True)
+    timestamp = models.DateTimeField(_("Timestamp"), auto_now_add=True)
+    
+    class Meta:
+        index_together = ('model', 'object_id')
+    
+    def __str__(self):
+        return "%s %s %s v%s" % (self.seq, self.action, self.code,
+                                 self.row_version)
+
+
+class CodeReservation(models.Model):
+    """Represents a Station or PowerLine code handed out by the code allocator.
+    Reservations are kept once a record takes the code, thus a code is never
+    handed out twice unless released, see `allocation`.
+    """
+    code = models.CharField(_("Code"), max_length=10, unique=True)
+    date_reserved = models.DateTimeField(_("Date Reserved"), auto_now_add=True)
+    
+    def __str__(self):
+        return self.code
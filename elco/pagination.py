@@ -0,0 +1,73 @@
+"""
+Keyset pagination of querysets ordered by a unique field.
+
+A page is fetched by filtering for records after (or before) the key of the
+last (or first) record of the previous page rather than skipping records with
+an offset, thus with an index over the key each page costs a single index
+range scan of page size however deep into the list it lies.
+"""
+
+
+DEFAULT_PAGE_SIZE = 50
+
+
+
+class KeysetPage(object):
+    """A page of records with the cursors to the pages next to it."""
+
+    def __init__(self, records, key, has_next, has_previous):
+        self.records = records
+        self.key = key
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def next_cursor(self):
+        """The cursor for the page after this one, None if there is none."""
+        if self.has_next and self.records:
+            return getattr(self.records[-1], self.key)
+        return None
+
+    @property
+    def previous_cursor(self):
+        """The cursor for the page before this one, None if there is none."""
+        if self.has_previous and self.records:
+            return getattr(self.records[0], self.key)
+        return None
+
+
+def paginate(queryset, key='code', after=None, before=None,
+             page_size=DEFAULT_PAGE_SIZE):
+    """Returns the KeysetPage of records of queryset ordered by the unique
+    key field which follow the `after` cursor, or precede the `before`
+    cursor, or else the first page.
+
+    An extra record is fetched to tell whether a page follows in the
+    direction of travel; a page is assumed to lie behind a cursor, thus a
+    single query is issued per page.
+    """
+    field = queryset.model._meta.get_field(key)
+    if after is not None:
+        cursor = field.to_python(after)
+        records = queryset.filter(**{'%s__gt' % key: cursor}).order_by(key)
+    elif before is not None:
+        cursor = field.to_python(before)
+        records = queryset.filter(**{'%s__lt' % key: cursor})\
+                          .order_by('-%s' % key)
+    else:
+        records = queryset.order_by(key)
+
+    records = list(records[:page_size + 1])
+    more = len(records) > page_size
+    records = records[:page_size]
+    if before is not None:
+        records.reverse()
+        return KeysetPage(records, key, has_next=True, has_previous=more)
+    return KeysetPage(records, key, has_next=more,
+                      has_previous=after is not None)
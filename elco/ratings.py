@@ -0,0 +1,149 @@
+"""
+Codec for transformer rating codes as described under the TransformerRating
+model. The whole code space is small hence tables mapping codes to the rating
+values they encode, and rating values to their canonical code, are built once
+at import. Encoding, decoding and validation of rating codes are then simple
+lookups sharing the same tables.
+"""
+from collections import namedtuple
+
+from django.utils.translation import ugettext_lazy as _
+
+from .constants import Voltage
+
+
+MSG_INVALID_XFMR_CAPACITY = _("Invalid power transformer capacity")
+MSG_INVALID_VOLTAGE_RATIO = _("Invalid voltage ratio value or text")
+MSG_INVALID_RATING_CODE = _("Invalid transformer rating code")
+
+POWER = 'P'
+DISTRIBUTION = 'D'
+
+# capacity multipliers for the code suffix by transformer type; no suffix
+# means MVA for power and KVA for distribution transformers
+MULTIPLIERS = {
+    POWER: (('', 1000), ('m', 100), ('M', 1000)),
+    DISTRIBUTION: (('', 1), ('m', 100), ('M', 1000)),
+}
+
+# voltage ratios encoded by the first two characters of a code
+_VR = Voltage.Ratio
+RATIOS_BY_PREFIX = {
+    'P3': (_VR.HVOLTL_MVOLTH,),
+    'P1': (_VR.HVOLTL_MVOLTL, _VR.MVOLTH_MVOLTL),
+    'D3': (_VR.MVOLTH_LVOLT,),
+    'D1': (_VR.MVOLTL_LVOLT,),
+}
+
+
+Rating = namedtuple('Rating', 'code capacity voltage_ratios transformer_type')
+
+
+
+def _canonical_capacity_code(capacity, transformer_type):
+    """Returns the capacity portion of a code in its most natural form, or
+    None where capacity cannot be expressed. Power transformer codes carry a
+    multiplier whenever possible, those of 100MVA and above being left with
+    the bare MVA digits.
+    """
+    if capacity <= 0:
+        return None
+    if capacity < 1000 and transformer_type == DISTRIBUTION:
+        return '{:0>3}'.format(capacity)
+
+    quotient, remainder = divmod(capacity, 1000)
+    if remainder == 0 and quotient < 100:
+        return '{:0>2}M'.format(quotient)
+    if remainder == 0 and quotient < 1000 and transformer_type == POWER:
+        return '{}'.format(quotient)
+    if remainder % 100 == 0 and quotient < 10:
+        return '{}{}m'.format(quotient, remainder // 100)
+    return None
+
+
+def _build_tables():
+    decode_table, encode_table = {}, {}
+    for prefix, voltage_ratios in RATIOS_BY_PREFIX.items():
+        transformer_type = prefix[0]
+        for suffix, multiplier in MULTIPLIERS[transformer_type]:
+            width = 3 - len(suffix)
+            for number in range(10 ** width):
+                code = '{}{:0>{}}{}'.format(prefix, number, width, suffix)
+                capacity = number * multiplier
+                decode_table[code] = Rating(
+                    code, capacity, voltage_ratios, transformer_type)
+
+                canonical = _canonical_capacity_code(capacity,
+                                                     transformer_type)
+                if canonical and prefix + canonical == code:
+                    for voltage_ratio in voltage_ratios:
+                        encode_table[(capacity, voltage_ratio)] = code
+    return decode_table, encode_table
+
+
+DECODE_TABLE, ENCODE_TABLE = _build_tables()
+
+
+def get_voltage_ratio_value(voltage_ratio):
+    """Returns the numeric voltage ratio constant for the provided value which
+    can be the constant itself or its text in the proper format e.g. 33/11KV.
+    """
+    if isinstance(voltage_ratio, str):
+        try:
+            return Voltage.Ratio.get_value_from_text(voltage_ratio)
+        except ValueError:
+            try:
+                voltage_ratio = int(voltage_ratio)
+            except ValueError:
+                raise ValueError(MSG_INVALID_VOLTAGE_RATIO)
+
+    if voltage_ratio not in Voltage.Ratio._text:
+        raise ValueError(MSG_INVALID_VOLTAGE_RATIO)
+    return voltage_ratio
+
+
+def encode(capacity, voltage_ratio):
+    """Returns the rating code for the provided capacity in KVA and voltage
+    ratio constant or text.
+    """
+    voltage_ratio = get_voltage_ratio_value(voltage_ratio)
+    code = ENCODE_TABLE.get((capacity, voltage_ratio))
+    if code is None:
+        raise ValueError(MSG_INVALID_XFMR_CAPACITY)
+    return code
+
+
+def decode(code):
+    """Returns the Rating encoded by the provided code."""
+    rating = DECODE_TABLE.get(code)
+    if rating is None:
+        raise ValueError(MSG_INVALID_RATING_CODE)
+    return rating
+
+
+def encode_many(entries):
+    """Returns codes for (capacity, voltage_ratio) pairs with None in place of
+    pairs which cannot be encoded.
+    """
+    lookup = ENCODE_TABLE.get
+    codes = []
+    for capacity, voltage_ratio in entries:
+        try:
+            voltage_ratio = get_voltage_ratio_value(voltage_ratio)
+        except ValueError:
+            codes.append(None)
+            continue
+        codes.append(lookup((capacity, voltage_ratio)))
+    return codes
+
+
+def decode_many(codes):
+    """Returns a Rating for each code with None in place of invalid codes."""
+    return list(map(DECODE_TABLE.get, codes))
+
+
+def matches(code, capacity, voltage_ratio):
+    """Returns True if code encodes the provided capacity and voltage ratio."""
+    rating = DECODE_TABLE.get(code)
+    return (rating is not None and rating.capacity == capacity and
+            voltage_ratio in rating.voltage_ratios)
@@ -0,0 +1,399 @@
+"""
+Denormalized rollups kept on Station and PowerLine records:
+
+  - `Station.powerline_count`: active power lines sourced from the station.
+  - `Station.transformer_count`: active transformers at the station.
+  - `installed_capacity`: total capacity in KVA of active transformers within
+    the subtree of a station or power line.
+
+A node only contributes to its parent while active, thus an inactive node
+keeps its own rollups current but adds nothing to the nodes feeding it.
+
+Rollups are maintained incrementally from save and delete signals: the state
+of a record before the change is read, and the difference between its old and
+new contribution applied with `F()` arithmetic to its parent and on up the
+materialized path. A change to the capacity of a transformer rating applies
+the difference times the number of active transformers with that rating to
+each station holding them, and on up their paths, in bulk. Bulk writes,
+which send no signals, should be followed by `rebuild` over the affected
+subtree.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import post_save, pre_delete, pre_save
+
+from .models import PATH_SEPARATOR, PowerLine, Station, Transformer,\
+        TransformerRating
+
+
+DEFAULT_BATCH_SIZE = 500
+
+# rollup fields for each model
+STATION_FIELDS = ('powerline_count', 'transformer_count', 'installed_capacity')
+POWERLINE_FIELDS = ('installed_capacity',)
+
+
+
+def _apply(model, code, capacity=0, **counts):
+    """Adds counts to the named record and capacity to it and every active
+    node up its path, stopping after the first inactive node.
+    """
+    counts = dict((k, v) for k, v in counts.items() if v)
+    if not (capacity or counts):
+        return
+
+    path = model._default_manager.filter(code=code)\
+                .values_list('path', flat=True).first()
+    if path is None:
+        return
+    codes = path.split(PATH_SEPARATOR) if path else [code]
+
+    nodes = {}
+    for node_model in (Station, PowerLine):
+        records = node_model._default_manager.filter(code__in=codes)\
+                            .values_list('code', 'pk', 'is_active')
+        for node_code, pk, is_active in records:
+            nodes[node_code] = (node_model, pk, is_active)
+
+    targets = {Station: [], PowerLine: []}
+    for node_code in reversed(codes):
+        if node_code not in nodes:
+            break
+        node_model, pk, is_active = nodes[node_code]
+        targets[node_model].append((pk, node_code))
+        if not is_active:
+            break
+
+    from . import caching
+    node_pk = targets[model][0][0] if targets[model] else None
+    if counts and node_pk is not None:
+        values = dict((k, F(k) + v) for k, v in counts.items())
+        values['installed_capacity'] = F('installed_capacity') + capacity
+        model._default_manager.filter(pk=node_pk).update(**values)
+
+    for node_model, records in targets.items():
+        pks = [pk for pk, _ in records
+               if not (counts and node_model is model and pk == node_pk)]
+        if capacity and pks:
+            node_model._default_manager.filter(pk__in=pks).update(
+                installed_capacity=F('installed_capacity') + capacity)
+        if records:
+            caching.invalidate_many(node_model, records)
+
+
+def _batches(values, batch_size=DEFAULT_BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), batch_size):
+        yield values[start:start + batch_size]
+
+
+def _apply_capacities(capacities):
+    """Adds capacity to each station named in {code: capacity} and to every
+    active node up its path, as `_apply` does, with an update per batch of
+    nodes sharing the same total.
+    """
+    paths = {}
+    for batch in _batches(capacities):
+        paths.update(Station._default_manager.filter(code__in=batch)
+                                             .values_list('code', 'path'))
+    codes = dict((code, path.split(PATH_SEPARATOR) if path else [code])
+                 for code, path in paths.items())
+
+    nodes = {}
+    ancestors = set(c for path in codes.values() for c in path)
+    for node_model in (Station, PowerLine):
+        for batch in _batches(ancestors):
+            records = node_model._default_manager.filter(code__in=batch)\
+                                .values_list('code', 'pk', 'is_active')
+            for node_code, pk, is_active in records:
+                nodes[node_code] = (node_model, pk, is_active)
+
+    totals = {}
+    for code, path in codes.items():
+        for node_code in reversed(path):
+            if node_code not in nodes:
+                break
+            totals[node_code] = totals.get(node_code, 0) + capacities[code]
+            if not nodes[node_code][2]:
+                break
+
+    from . import caching
+    targets = {}
+    for node_code, total in totals.items():
+        if total:
+            node_model, pk, _ = nodes[node_code]
+            targets.setdefault((node_model, total), []).append((pk, node_code))
+    for (node_model, total), records in targets.items():
+        for batch in _batches(records):
+            node_model._default_manager.filter(
+                pk__in=[pk for pk, _ in batch]).update(
+                    installed_capacity=F('installed_capacity') + total)
+        caching.invalidate_many(node_model, records)
+
+
+def _apply_deltas(model, deltas, count_field=None):
+    """Applies {code: (count, capacity)} deltas to records of model."""
+    for code, (count, capacity) in deltas.items():
+        if code is None:
+            continue
+        counts = {count_field: count} if count_field else {}
+        _apply(model, code, capacity, **counts)
+
+
+def _collect_deltas(old, new):
+    """Returns {parent_code: (count, capacity)} given old and new states as
+    (parent_code, is_active, capacity) tuples; None where there is no state.
+    """
+    deltas = {}
+    for state, sign in ((old, -1), (new, 1)):
+        if state and state[1]:
+            count, capacity = deltas.get(state[0], (0, 0))
+            deltas[state[0]] = (count + sign, capacity + sign * state[2])
+    return deltas
+
+
+def _get_transformer_state(pk):
+    return Transformer.objects.all_with_inactive().filter(pk=pk)\
+                      .values_list('station', 'is_active', 'rating__capacity')\
+                      .first()
+
+
+def _get_node_state(model, pk):
+    field = model._meta.get_field(model.parent_field)
+    fields = (STATION_FIELDS if model is Station else POWERLINE_FIELDS)
+    return model._default_manager.filter(pk=pk)\
+                .values_list(field.attname, 'is_active', *fields).first()
+
+
+def _on_transformer_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._rollup_state = (_get_transformer_state(instance.pk)
+                                  if instance.pk else None)
+
+
+def _on_transformer_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    old = getattr(instance, '_rollup_state', None)
+    instance._rollup_state = None
+    capacity = TransformerRating.objects.all_with_inactive()\
+                                .filter(code=instance.rating_id)\
+                                .values_list('capacity', flat=True).first()
+    new = (instance.station_id, instance.is_active, capacity or 0)
+    if old != new:
+        with transaction.atomic():
+            _apply_deltas(Station, _collect_deltas(old, new),
+                          'transformer_count')
+
+
+def _on_transformer_deleting(sender, instance, **kwargs):
+    old = _get_transformer_state(instance.pk)
+    _apply_deltas(Station, _collect_deltas(old, None), 'transformer_count')
+
+
+def _on_rating_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._rollup_state = (
+            TransformerRating.objects.all_with_inactive()
+                             .filter(pk=instance.pk)
+                             .values_list('capacity', flat=True).first()
+            if instance.pk else None)
+
+
+def _on_rating_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    old = getattr(instance, '_rollup_state', None)
+    instance._rollup_state = None
+    delta = (instance.capacity or 0) - (old or 0)
+    if old is None or not delta:
+        return
+
+    counts = Transformer.objects.filter(rating=instance.code)\
+                                .values_list('station').order_by()\
+                                .annotate(Count('pk'))
+    with transaction.atomic():
+        _apply_capacities(dict((station, count * delta)
+                               for station, count in counts))
+
+
+def _on_node_saving(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    # rollups are owned by this module, hence stored values are kept over
+    # whatever a possibly stale instance carries.
+    fields = (STATION_FIELDS if sender is Station else POWERLINE_FIELDS)
+    old = _get_node_state(sender, instance.pk) if instance.pk else None
+    for index, name in enumerate(fields):
+        setattr(instance, name, old[2 + index] if old else 0)
+    instance._rollup_state = old
+
+
+def _on_node_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    old = getattr(instance, '_rollup_state', None)
+    instance._rollup_state = None
+    field = sender._meta.get_field(sender.parent_field)
+    new = (getattr(instance, field.attname), instance.is_active,
+           instance.installed_capacity)
+    old = old[:2] + (old[-1],) if old else None
+    if old != new:
+        _apply_node_deltas(sender, _collect_deltas(old, new))
+
+
+def _on_node_deleting(sender, instance, **kwargs):
+    old = _get_node_state(sender, instance.pk)
+    if not (old and old[1]):
+        return
+
+    _apply_node_deltas(sender, _collect_deltas(old[:2] + (old[-1],), None))
+    # nodes within the subtree are deleted along, possibly after this one;
+    # marking it inactive stops their removal from propagating beyond it.
+    sender._default_manager.filter(pk=instance.pk).update(is_active=False)
+
+
+def _apply_node_deltas(model, deltas):
+    if model is Station:
+        _apply_deltas(PowerLine, deltas)
+    else:
+        _apply_deltas(Station, deltas, 'powerline_count')
+
+
+def _node_queryset(model, path):
+    records = model._default_manager.all()
+    if path:
+        records = records.filter(
+            Q(path=path) | Q(path__startswith=path + PATH_SEPARATOR))
+    return records
+
+
+def compute(path=None):
+    """Computes rollups from scratch for all nodes or those within the
+    subtree rooted at the node with the provided path. Returns a dict mapping
+    each of Station and PowerLine to {code: tuple of rollup values}.
+    """
+    transformers = Transformer.objects.filter(is_active=True)
+    if path:
+        transformers = transformers.filter(
+            Q(station__path=path) |
+            Q(station__path__startswith=path + PATH_SEPARATOR))
+    own = dict((code, (count, capacity or 0)) for code, count, capacity in
+               transformers.values_list('station').order_by()
+                           .annotate(Count('pk'), Sum('rating__capacity')))
+
+    nodes, children = {}, {}
+    for model in (Station, PowerLine):
+        field = model._meta.get_field(model.parent_field)
+        records = _node_queryset(model, path)\
+                        .values_list('code', field.attname, 'is_active')
+        for code, parent_code, is_active in records.iterator():
+            nodes[code] = (model, is_active)
+            children.setdefault(parent_code, []).append(code)
+
+    # post-order traversal without recursion; nodes on a cycle are not
+    # counted by the node closing it.
+    capacities, visiting = {}, set()
+    for root in nodes:
+        stack = [root]
+        while stack:
+            code = stack[-1]
+            if code in capacities:
+                stack.pop()
+                continue
+            pending = [c for c in children.get(code, ())
+                       if c not in capacities and c not in visiting]
+            if code not in visiting and pending:
+                visiting.add(code)
+                stack.extend(pending)
+                continue
+            visiting.discard(code)
+            stack.pop()
+            capacities[code] = own.get(code, (0, 0))[1] + sum(
+                capacities.get(c, 0) for c in children.get(code, ())
+                if nodes[c][1])
+
+    results = {Station: {}, PowerLine: {}}
+    for code, (model, _) in nodes.items():
+        if model is Station:
+            powerline_count = sum(1 for c in children.get(code, ())
+                                  if nodes[c][1])
+            results[Station][code] = (powerline_count,
+                                      own.get(code, (0, 0))[0],
+                                      capacities[code])
+        else:
+            results[PowerLine][code] = (capacities[code],)
+    return results
+
+
+def _get_stored(model, path):
+    fields = (STATION_FIELDS if model is Station else POWERLINE_FIELDS)
+    records = _node_queryset(model, path).values_list('code', *fields)
+    return dict((r[0], tuple(r[1:])) for r in records.iterator())
+
+
+def verify(path=None):
+    """Returns (model_name, code, stored, expected) tuples for nodes whose
+    stored rollups differ from those computed from scratch.
+    """
+    mismatches = []
+    for model, expected in sorted(compute(path).items(),
+                                  key=lambda x: x[0]._meta.model_name):
+        stored = _get_stored(model, path)
+        for code in sorted(expected):
+            if stored.get(code) != expected[code]:
+                mismatches.append((model._meta.model_name, code,
+                                   stored.get(code), expected[code]))
+    return mismatches
+
+
+def rebuild(path=None):
+    """Recomputes rollups for all nodes or those within the subtree rooted at
+    the node with the provided path, writing only those which changed with a
+    bulk update per distinct set of values. Returns the number of records
+    updated.
+    """
+    from . import caching
+    updated = 0
+    with transaction.atomic():
+        for model, expected in compute(path).items():
+            fields = (STATION_FIELDS if model is Station else POWERLINE_FIELDS)
+            stored = _get_stored(model, path)
+            changes = {}
+            for code, values in expected.items():
+                if stored.get(code) != values:
+                    changes.setdefault(values, []).append(code)
+
+            for values, codes in changes.items():
+                model._default_manager.filter(code__in=codes)\
+                     .update(**dict(zip(fields, values)))
+                updated += len(codes)
+            if changes:
+                caching.invalidate_model(model)
+    return updated
+
+
+def connect_signals():
+    uid = 'elco.rollups.%s'
+    pre_save.connect(_on_transformer_saving, sender=Transformer,
+                     dispatch_uid=uid % 'transformer_saving')
+    post_save.connect(_on_transformer_saved, sender=Transformer,
+                      dispatch_uid=uid % 'transformer_saved')
+    pre_delete.connect(_on_transformer_deleting, sender=Transformer,
+                       dispatch_uid=uid % 'transformer_deleting')
+    pre_save.connect(_on_rating_saving, sender=TransformerRating,
+                     dispatch_uid=uid % 'rating_saving')
+    post_save.connect(_on_rating_saved, sender=TransformerRating,
+                      dispatch_uid=uid % 'rating_saved')
+    for model in (Station, PowerLine):
+        name = model._meta.model_name
+        pre_save.connect(_on_node_saving, sender=model,
+                         dispatch_uid=uid % (name + '_saving'))
+        post_save.connect(_on_node_saved, sender=model,
+                          dispatch_uid=uid % (name + '_saved'))
+        pre_delete.connect(_on_node_deleting, sender=model,
+                           dispatch_uid=uid % (name + '_deleting'))
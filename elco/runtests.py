@@ -22,6 +22,10 @@ SETTINGS_DICT = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': os.path.join(BASE_DIR, '..', 'db.sqlite3'),
+            # file backed so tests can share the database with forked workers
+            'TEST': {
+                'NAME': os.path.join(BASE_DIR, '..', 'test_db.sqlite3'),
+            },
         },
     },
 }
@@ -0,0 +1,292 @@
+"""
+An in-memory spatial index over the coordinates of station addresses
+(`Station.address` latitude and longitude) answering nearest-neighbour and
+radius queries without touching the database.
+
+Stations are bucketed into a uniform grid of cells a fixed number of degrees
+wide, with a separate grid per station category so that searches restricted
+to a sparse category only visit cells holding stations of that category. A
+nearest-neighbour search visits rings of cells around the query point, from
+the nearest outward, until no unvisited cell can hold a nearer station.
+
+Distances are great-circle distances in kilometres; longitudes are not wrapped
+at the antimeridian. Only active stations with both coordinates set are
+indexed.
+"""
+import heapq
+import math
+import threading
+
+from django.db.models.signals import post_delete, post_save
+
+from address.models import Address
+
+from .models import Station
+
+
+EARTH_RADIUS = 6371.0088        # mean radius in km
+DEFAULT_CELL_SIZE = 0.1         # in degrees, about 11km along a meridian
+
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """Returns the great-circle distance in km between two points."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    hav = (math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) *
+           math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(hav)))
+
+
+class SpatialIndex(object):
+    """Holds station coordinates bucketed into grid cells per category."""
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self._entries = {}      # pk -> (code, lat, lng, category, ratio)
+        self._grids = {}        # category -> {(row, col): set of pks}
+        self._bounds = None     # (min row, max row, min col, max col)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def build(cls, cell_size=DEFAULT_CELL_SIZE):
+        """Builds an index from all active stations with coordinates using a
+        single values query.
+        """
+        index = cls(cell_size)
+        records = Station.objects.filter(
+                is_active=True, address__latitude__isnull=False,
+                address__longitude__isnull=False)\
+            .values_list('pk', 'code', 'category', 'voltage_ratio',
+                         'address__latitude', 'address__longitude')
+        for pk, code, category, ratio, lat, lng in records.iterator():
+            index._add(pk, code, lat, lng, category, ratio)
+        return index
+
+    def __len__(self):
+        return len(self._entries)
+
+    def nearest(self, lat, lng, k=1, category=None, voltage_ratio=None):
+        """Returns up to k (code, distance) pairs for the stations nearest to
+        the provided point, nearest first, optionally restricted to those of
+        a category and voltage ratio.
+        """
+        with self._lock:
+            grids = self._get_grids(category)
+            if k <= 0 or not grids:
+                return []
+
+            row, col = self._get_cell(lat, lng)
+            best = []           # heap of (-distance, code)
+            ring = 0
+            while True:
+                for cell in self._ring_cells(row, col, ring):
+                    for dist, code in self._scan(grids, cell, lat, lng,
+                                                 voltage_ratio):
+                        if len(best) < k:
+                            heapq.heappush(best, (-dist, code))
+                        elif dist < -best[0][0]:
+                            heapq.heapreplace(best, (-dist, code))
+
+                if self._covers_bounds(row, col, ring):
+                    break
+                if len(best) == k and (-best[0][0] <=
+                        self._ring_distance(lat, lng, row, col, ring)):
+                    break
+                ring += 1
+            return [(code, -dist) for dist, code in sorted(best, reverse=True)]
+
+    def within_radius(self, lat, lng, radius, category=None,
+                      voltage_ratio=None):
+        """Returns (code, distance) pairs for stations within radius km of
+        the provided point, nearest first, optionally restricted to those of
+        a category and voltage ratio.
+        """
+        with self._lock:
+            grids = self._get_grids(category)
+            row, col = self._get_cell(lat, lng)
+            results, ring = [], 0
+            while True:
+                for cell in self._ring_cells(row, col, ring):
+                    results.extend(
+                        (dist, code) for dist, code in
+                        self._scan(grids, cell, lat, lng, voltage_ratio)
+                        if dist <= radius)
+                if (self._covers_bounds(row, col, ring) or
+                        self._ring_distance(lat, lng, row, col, ring) > radius):
+                    break
+                ring += 1
+            return [(code, dist) for dist, code in sorted(results)]
+
+    def update_station(self, pk, code, lat, lng, category, voltage_ratio,
+                       is_active=True):
+        """Adds or moves the indexed entry for a station, removing it where
+        it is inactive or lacks coordinates.
+        """
+        with self._lock:
+            self._remove(pk)
+            if is_active and lat is not None and lng is not None:
+                self._add(pk, code, lat, lng, category, voltage_ratio)
+
+    def remove_station(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def _get_cell(self, lat, lng):
+        return (int(math.floor(lat / self.cell_size)),
+                int(math.floor(lng / self.cell_size)))
+
+    def _get_grids(self, category):
+        if category is None:
+            return list(self._grids.values())
+        grid = self._grids.get(category)
+        return [grid] if grid else []
+
+    def _add(self, pk, code, lat, lng, category, voltage_ratio):
+        cell = self._get_cell(lat, lng)
+        self._entries[pk] = (code, lat, lng, category, voltage_ratio)
+        self._grids.setdefault(category, {}).setdefault(cell, set()).add(pk)
+
+        row, col = cell
+        if self._bounds is None:
+            self._bounds = (row, row, col, col)
+        else:
+            min_row, max_row, min_col, max_col = self._bounds
+            self._bounds = (min(min_row, row), max(max_row, row),
+                            min(min_col, col), max(max_col, col))
+
+    def _remove(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+
+        _, lat, lng, category, _ = entry
+        grid = self._grids[category]
+        cell = self._get_cell(lat, lng)
+        grid[cell].discard(pk)
+        if not grid[cell]:
+            del grid[cell]
+        if not grid:
+            del self._grids[category]
+        # bounds only ever grow; they merely limit how far searches go
+
+    def _scan(self, grids, cell, lat, lng, voltage_ratio):
+        entries = self._entries
+        for grid in grids:
+            for pk in grid.get(cell, ()):
+                code, slat, slng, _, ratio = entries[pk]
+                if voltage_ratio is None or ratio == voltage_ratio:
+                    yield distance(lat, lng, slat, slng), code
+
+    def _ring_cells(self, row, col, ring):
+        """Yields cells on the provided ring around a cell which lie within
+        the bounds of indexed cells.
+        """
+        if self._bounds is None:
+            return
+        min_row, max_row, min_col, max_col = self._bounds
+        first_col, last_col = max(col - ring, min_col), min(col + ring, max_col)
+        for r in (row - ring, row + ring) if ring else (row,):
+            if min_row <= r <= max_row:
+                for c in range(first_col, last_col + 1):
+                    yield (r, c)
+        first_row = max(row - ring + 1, min_row)
+        last_row = min(row + ring - 1, max_row)
+        for c in (col - ring, col + ring) if ring else ():
+            if min_col <= c <= max_col:
+                for r in range(first_row, last_row + 1):
+                    yield (r, c)
+
+    def _covers_bounds(self, row, col, ring):
+        if self._bounds is None:
+            return True
+        min_row, max_row, min_col, max_col = self._bounds
+        return (row - ring <= min_row and row + ring >= max_row and
+                col - ring <= min_col and col + ring >= max_col)
+
+    def _ring_distance(self, lat, lng, row, col, ring):
+        """Returns a lower bound on the distance from the point to any station
+        in cells beyond the provided ring.
+        """
+        size = self.cell_size
+        south, north = (row - ring) * size, (row + ring + 1) * size
+        west, east = (col - ring) * size, (col + ring + 1) * size
+
+        # beyond the ring along a meridian, distance is at least the
+        # latitude difference; along a parallel it shrinks with latitude.
+        lat_gap = math.radians(min(lat - south, north - lat))
+        lng_gap = math.radians(min(lng - west, east - lng))
+        max_lat = math.radians(min(90.0, max(abs(south), abs(north))))
+        lng_bound = 2 * math.asin(min(1.0, math.cos(max_lat) *
+                                      math.sin(min(lng_gap, math.pi) / 2)))
+        return EARTH_RADIUS * min(lat_gap, lng_bound)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the process-wide spatial index, building it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SpatialIndex.build()
+    return _index
+
+
+def reset_index():
+    """Discards the process-wide spatial index; it gets rebuilt on next use."""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def nearest(lat, lng, k=1, category=None, voltage_ratio=None):
+    """Returns (code, distance) pairs for the k stations nearest to a point."""
+    return get_index().nearest(lat, lng, k, category, voltage_ratio)
+
+
+def within_radius(lat, lng, radius, category=None, voltage_ratio=None):
+    """Returns (code, distance) pairs for stations within radius km."""
+    return get_index().within_radius(lat, lng, radius, category,
+                                     voltage_ratio)
+
+
+def _update_stations(records):
+    for pk, code, category, ratio, is_active, lat, lng in records:
+        _index.update_station(pk, code, lat, lng, category, ratio, is_active)
+
+
+def _station_values(records):
+    return records.values_list('pk', 'code', 'category', 'voltage_ratio',
+                               'is_active', 'address__latitude',
+                               'address__longitude')
+
+
+def _on_station_saved(sender, instance, raw=False, **kwargs):
+    if _index is not None:
+        _update_stations(_station_values(
+            Station.objects.all_with_inactive().filter(pk=instance.pk)))
+
+
+def _on_station_deleted(sender, instance, **kwargs):
+    if _index is not None:
+        _index.remove_station(instance.pk)
+
+
+def _on_address_saved(sender, instance, raw=False, **kwargs):
+    if _index is not None:
+        _update_stations(_station_values(
+            Station.objects.all_with_inactive().filter(
+                address=instance)))
+
+
+def connect_signals():
+    uid = 'elco.spatial.%s'
+    post_save.connect(_on_station_saved, sender=Station,
+                      dispatch_uid=uid % 'station_saved')
+    post_delete.connect(_on_station_deleted, sender=Station,
+                        dispatch_uid=uid % 'station_deleted')
+    post_save.connect(_on_address_saved, sender=Address,
+                      dispatch_uid=uid % 'address_saved')
@@ -0,0 +1,49 @@
+from ..constants import Voltage
+from ..models import PowerLine, Station, TransformerRating
+
+
+
+class NetworkFixtureMixin(object):
+    """Builds the sample network shared by tests of the network wide
+    modules, with a feeder and distribution station per n up to feeders:
+    
+        T101 -> F301 -> I301 -> F101 -> S10001
+                             -> F10n -> S1000n
+    """
+    
+    def build_network(self, feeders=1):
+        self.tstation = Station.objects.create(
+                code='T101', name='Sample TS', category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder33 = PowerLine.objects.create(
+                code='F301', name='Sample 33KV', type=PowerLine.FEEDER,
+                voltage=Voltage.MVOLTH, source_station=self.tstation)
+        self.istation = Station.objects.create(
+                code='I301', name='Sample IS', category=Station.INJECTION,
+                voltage_ratio=Voltage.Ratio.MVOLTH_MVOLTL,
+                source_feeder=self.feeder33)
+        self.feeders, self.dstations = [], []
+        for n in range(1, feeders + 1):
+            feeder = PowerLine.objects.create(
+                code='F10%s' % n, name='Sample 11KV %s' % n,
+                type=PowerLine.FEEDER, voltage=Voltage.MVOLTL,
+                source_station=self.istation)
+            self.feeders.append(feeder)
+            self.dstations.append(Station.objects.create(
+                code='S1000%s' % n, name='Sample DS %s' % n,
+                category=Station.DISTRIBUTION,
+                voltage_ratio=Voltage.Ratio.MVOLTL_LVOLT,
+                source_feeder=feeder))
+        self.feeder11, self.dstation = self.feeders[0], self.dstations[0]
+    
+    @staticmethod
+    def create_ratings(power_code='P375m', power_capacity=7500):
+        """Creates a power transformer rating for I301 and the D1500
+        distribution transformer rating.
+        """
+        TransformerRating.objects.create(
+                code=power_code, capacity=power_capacity,
+                voltage_ratio=Voltage.Ratio.MVOLTH_MVOLTL)
+        TransformerRating.objects.create(
+                code='D1500', capacity=500,
+                voltage_ratio=Voltage.Ratio.MVOLTL_LVOLT)
@@ -0,0 +1,116 @@
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from .. import allocation
+from ..constants import Voltage
+from ..models import CodeReservation, PowerLine, Station
+from ..validators import validate_powerline_code_format,\
+        validate_station_code_format
+
+
+
+class CodeAllocationTestCase(TestCase):
+    
+    def setUp(self):
+        allocation.reset_allocator()
+        for code in ('T101', 'T103'):
+            Station.objects.create(
+                code=code, name='Sample TS %s' % code,
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+    
+    def tearDown(self):
+        allocation.reset_allocator()
+    
+    def test_keyspaces(self):
+        self.assertEqual('S1', allocation.get_station_keyspace(
+            Station.DISTRIBUTION, Voltage.Ratio.MVOLTL_LVOLT))
+        self.assertEqual('T3', allocation.get_station_keyspace(
+            Station.TRANSMISSION, Voltage.Ratio.HVOLTH_HVOLTL))
+        self.assertEqual('I3', allocation.get_station_keyspace(
+            Station.INJECTION, Voltage.Ratio.MVOLTH_MVOLTL))
+        self.assertEqual('F3', allocation.get_feeder_keyspace(Voltage.MVOLTH))
+        with self.assertRaises(KeyError):
+            allocation.get_feeder_keyspace(Voltage.LVOLT)
+        
+        self.assertEqual(('S1', 0xFFFF), allocation.parse_code('s1ffff'))
+        for code in ('S10000', 'S1001', 'T1XY', 'U1', ''):
+            self.assertIsNone(allocation.parse_code(code))
+    
+    def test_reserve_skips_taken_codes(self):
+        self.assertEqual(253, allocation.available('T1'))
+        self.assertEqual('T102', allocation.reserve('T1'))
+        self.assertEqual(['T104', 'T105'], allocation.reserve_many('T1', 2))
+        self.assertEqual(['T102', 'T104', 'T105'], sorted(
+            CodeReservation.objects.values_list('code', flat=True)))
+        
+        # codes reserved remain taken for a newly loaded keyspace
+        allocation.reset_allocator()
+        self.assertEqual('T106', allocation.reserve('T1'))
+    
+    def test_whole_keyspace_is_valid(self):
+        codes = allocation.reserve_many('F1', 0xFF)
+        self.assertEqual(0xFF, len(set(codes)))
+        for code in codes:
+            validate_powerline_code_format(code)
+        for code in allocation.reserve_many('T3', 0xFF):
+            validate_station_code_format(code)
+        
+        with self.assertRaises(ValueError):
+            allocation.reserve('F1')
+        self.assertEqual(0, allocation.available('F1'))
+    
+    def test_nothing_reserved_when_out_of_codes(self):
+        with self.assertRaises(ValueError):
+            allocation.reserve_many('I3', 0x100)
+        self.assertFalse(CodeReservation.objects.exists())
+    
+    def test_concurrent_allocators(self):
+        # stands for another process holding its own bitmap
+        other = allocation.CodeAllocator()
+        self.assertEqual('T102', other.reserve('T1'))
+        self.assertEqual(['T104', 'T105'], allocation.reserve_many('T1', 2))
+        
+        # other reloads the keyspace on conflict
+        self.assertEqual('T106', other.reserve('T1'))
+        
+        # codes picked by hand since load are skipped
+        Station.objects.create(
+            code='T107', name='Sample TS T107',
+            category=Station.TRANSMISSION,
+            voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.assertEqual('T108', allocation.reserve('T1'))
+    
+    def test_release(self):
+        codes = allocation.reserve_many('S1', 3)
+        self.assertEqual(['S10001', 'S10002', 'S10003'], codes)
+        PowerLine.objects.create(
+            code='F301', name='Sample 33KV', type=PowerLine.FEEDER,
+            voltage=Voltage.MVOLTH, source_station_id='T101')
+        Station.objects.create(
+            code='S10002', name='Sample DS', category=Station.DISTRIBUTION,
+            voltage_ratio=Voltage.Ratio.MVOLTH_LVOLT,
+            source_feeder_id='F301')
+        
+        # codes taken by records are not released
+        self.assertEqual(['S10001', 'S10003'], allocation.release(codes))
+        self.assertEqual(['S10002'], list(
+            CodeReservation.objects.values_list('code', flat=True)))
+        self.assertEqual(['S10001', 'S10003', 'S10004'],
+                         allocation.reserve_many('S1', 3))
+    
+    @override_settings(ROOT_URLCONF='elco.urls')
+    def test_view(self):
+        url = reverse('reserve_codes')
+        response = self.client.post(url, {'keyspace': 't1', 'count': 2})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'keyspace': 'T1', 'codes': ['T102', 'T104']},
+                         response.json())
+        
+        self.assertEqual(405, self.client.get(url).status_code)
+        for data in ({'keyspace': 'X1'}, {'keyspace': 'T1', 'count': 0},
+                     {'keyspace': 'T1', 'count': 'many'}):
+            self.assertEqual(400, self.client.post(url, data).status_code)
+        
+        response = self.client.post(url, {'keyspace': 'T1', 'count': 0xFF})
+        self.assertEqual(409, response.status_code)
@@ -0,0 +1,113 @@
+from unittest import skipIf, skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils.six import StringIO
+
+from .. import audit
+from ..constants import Condition, Voltage
+from ..models import PowerLine, Station, Transformer, TransformerRating
+from . import NetworkFixtureMixin
+
+
+
+class AuditMixin(NetworkFixtureMixin):
+    
+    def setUp(self):
+        # P115M as validation requires codes matching the capacity
+        self.build_network()
+        self.create_ratings('P115M', 15000)
+        Transformer.objects.create(
+                code='TX1', rating_id='P115M', station=self.istation,
+                condition=Condition.OK, serialno='SN001')
+        Transformer.objects.create(
+                code='TX2', rating_id='D1500', station=self.dstation,
+                condition=Condition.OK, serialno='SN002')
+    
+    def _findings(self, processes=1):
+        findings = []
+        for partition, checked, partition_findings in audit.run(processes):
+            findings.extend(partition_findings)
+        return sorted(findings)
+
+
+class AuditTestCase(AuditMixin, TestCase):
+    
+    def test_partitions(self):
+        self.assertEqual([(audit.SUBTREE, 'T101'), (audit.UNREACHABLE, None),
+                          (audit.RATINGS, None)], audit.get_partitions())
+        partition, checked, findings = audit.audit_partition(
+            (audit.SUBTREE, 'T101'))
+        self.assertEqual((7, []), (checked, findings))
+    
+    def test_rule_violations_and_paths(self):
+        # written as raw SQL would, bypassing validation
+        PowerLine.objects.filter(code='F101').update(voltage=Voltage.MVOLTH)
+        Station.objects.filter(code='S10001').update(path='T101/S10001')
+        Transformer.objects.filter(code='TX2').update(rating='P115M')
+        
+        findings = self._findings()
+        kinds = set((code, kind) for _, code, kind, _ in findings)
+        self.assertEqual(set([
+            ('F101', 'invalid'), ('S10001', 'invalid'), ('S10001', 'path'),
+            ('S10001/TX2', 'rating')]), kinds)
+    
+    def test_cycles(self):
+        station = Station.objects.create(
+                code='I302', name='Other IS', category=Station.INJECTION,
+                voltage_ratio=Voltage.Ratio.MVOLTH_MVOLTL,
+                source_feeder=self.feeder33)
+        feeder = PowerLine.objects.create(
+                code='F102', name='Other 11KV', type=PowerLine.FEEDER,
+                voltage=Voltage.MVOLTL, source_station=station)
+        Station.objects.create(
+                code='S10002', name='Other DS', category=Station.DISTRIBUTION,
+                voltage_ratio=Voltage.Ratio.MVOLTL_LVOLT,
+                source_feeder=feeder)
+        Station.objects.filter(code='I302').update(source_feeder='F102')
+        
+        findings = [(code, kind, message) for _, code, kind, message
+                    in self._findings() if kind in ('cycle', 'unreachable')]
+        self.assertEqual([('F102', 'cycle'), ('I302', 'cycle'),
+                          ('S10002', 'unreachable')],
+                         [(code, kind) for code, kind, _ in findings])
+        self.assertIn('fed from itself through', findings[0][2])
+    
+    @skipUnless(connection.vendor == 'sqlite',
+                "Foreign keys are enforced by other databases.")
+    def test_orphans(self):
+        Station.objects.filter(code='S10001').update(source_feeder='F199')
+        Transformer.objects.filter(code='TX1').update(station='I399')
+        
+        findings = self._findings()
+        self.assertEqual([('S10001', 'orphan'), ('I399/TX1', 'orphan')],
+                         [(code, kind) for _, code, kind, _ in findings])
+    
+    def test_command(self):
+        out, err = StringIO(), StringIO()
+        call_command('audit_network', processes=1, stdout=out, stderr=err)
+        self.assertEqual('', out.getvalue())
+        self.assertIn('9 records audited, 0 findings', err.getvalue())
+        
+        TransformerRating.objects.filter(code='D1500').update(capacity=600)
+        with self.assertRaises(CommandError):
+            call_command('audit_network', processes=1, stdout=out,
+                         stderr=err)
+        self.assertIn('transformerrating D1500 [invalid]', out.getvalue())
+
+
+
+@skipIf(connection.vendor == 'sqlite' and connection.is_in_memory_db(
+            connection.settings_dict['NAME']),
+        "Forked workers cannot share an in-memory database.")
+class AuditProcessesTestCase(AuditMixin, TransactionTestCase):
+    
+    def test_processes(self):
+        Station.objects.filter(code='S10001').update(path='T101/S10001')
+        PowerLine.objects.filter(code='F301').update(source_station='F101')
+        
+        findings = self._findings()
+        self.assertTrue(findings)
+        self.assertEqual(findings, self._findings(processes=2))
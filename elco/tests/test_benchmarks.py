@@ -0,0 +1,31 @@
+from django.test import TestCase, override_settings
+
+from .. import benchmarks
+from ..generator import MAX_STATIONS, generate_network
+
+
+
+@override_settings(MIDDLEWARE_CLASSES=(
+    'elco.middleware.IdentityMapMiddleware',), **benchmarks.SETTINGS)
+class BenchmarkTestCase(TestCase):
+    
+    def test_oversized_network_rejected(self):
+        with self.assertRaises(ValueError):
+            generate_network(MAX_STATIONS + 1)
+    
+    def test_run_reports_all_cases(self):
+        report = benchmarks.run(sizes=(20, MAX_STATIONS + 1), repeat=1)
+        small, large = report['results']
+        self.assertIn('exceeds', large['skipped'])
+        for name, result in small['cases'].items():
+            self.assertEqual(set(['queries', 'wall_time', 'peak_memory']),
+                             set(result))
+        self.assertIn('manage_station_post', small['cases'])
+        
+        self.assertEqual([], benchmarks.compare(report, report))
+        slower = dict(small['cases']['station_clean'],
+                      wall_time={'min': 100.0})
+        baseline = {'results': [dict(small, cases={'station_clean': slower})]}
+        self.assertEqual([], benchmarks.compare(report, baseline))
+        self.assertEqual('station_clean',
+                         benchmarks.compare(baseline, report)[0][1])
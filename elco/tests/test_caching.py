@@ -0,0 +1,113 @@
+from django.core.cache import cache
+from django.http import Http404
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from .. import caching
+from ..constants import Voltage
+from ..models import PowerLine, Station
+
+
+
+class RecordCacheMixin(object):
+    
+    def setUp(self):
+        cache.clear()
+        self.tstation = Station.objects.create(
+                code='T101', name='Alpha TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder = PowerLine.objects.create(
+                code='F301', name='Alpha 33KV', type=PowerLine.FEEDER,
+                voltage=Voltage.MVOLTH, source_station=self.tstation)
+    
+    def tearDown(self):
+        caching.deactivate_identity_map()
+
+
+class RecordCacheTestCase(RecordCacheMixin, TestCase):
+    
+    def test_lookup_by_code_and_pk_read_through(self):
+        with self.assertNumQueries(1):
+            station = caching.get_object(Station, code='T101')
+        with self.assertNumQueries(0):
+            self.assertEqual(station, caching.get_object(Station, code='T101'))
+            self.assertEqual(station,
+                             caching.get_object(Station, pk=station.pk))
+    
+    def test_identity_map_returns_same_instance(self):
+        with caching.identity_map():
+            first = caching.get_object(PowerLine, code='F301')
+            with self.assertNumQueries(0):
+                self.assertIs(first,
+                              caching.get_object(PowerLine, pk=first.pk))
+        self.assertIsNot(first, caching.get_object(PowerLine, code='F301'))
+    
+    def test_bulk_deactivate_invalidates(self):
+        caching.get_object(PowerLine, code='F301')
+        self.tstation.deactivate()
+        feeder = caching.get_object(PowerLine, code='F301')
+        self.assertFalse(feeder.is_active)
+    
+    def test_related_access_goes_through_cache(self):
+        caching.get_object(Station, code='T101')
+        feeder = PowerLine.objects.get(code='F301')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tstation, feeder.get_parent())
+            feeder.clean()
+    
+    def test_get_object_or_404(self):
+        with self.assertRaises(Http404):
+            caching.get_object_or_404(Station, code='T999')
+    
+    def test_fill_does_not_replace_newer_entry(self):
+        newer = PowerLine.objects.get(code='F301')
+        newer.name = 'Beta 33KV'
+        cache.set(caching._make_key('powerline', 'pk', newer.pk), newer)
+        
+        # looked up by code, thus fetched as the code entry is missing
+        self.assertEqual('Alpha 33KV',
+                         caching.get_object(PowerLine, code='F301').name)
+        self.assertEqual('Beta 33KV',
+                         caching.get_object(PowerLine, pk=newer.pk).name)
+
+
+class RecordInvalidationTestCase(RecordCacheMixin, TransactionTestCase):
+    
+    def test_save_and_delete_invalidate(self):
+        caching.get_object(PowerLine, code='F301')
+        self.feeder.name = 'Beta 33KV'
+        self.feeder.save()
+        self.assertEqual(
+            'Beta 33KV', caching.get_object(PowerLine, code='F301').name)
+        
+        self.feeder.delete()
+        with self.assertRaises(PowerLine.DoesNotExist):
+            caching.get_object(PowerLine, code='F301')
+    
+    def test_code_change_discards_stale_pointer(self):
+        caching.get_object(PowerLine, code='F301')
+        self.feeder.code = 'F302'
+        self.feeder.save()
+        with self.assertRaises(PowerLine.DoesNotExist):
+            caching.get_object(PowerLine, code='F301')
+    
+    def test_invalidated_once_committed(self):
+        caching.get_object(PowerLine, code='F301')
+        with transaction.atomic():
+            self.feeder.name = 'Beta 33KV'
+            self.feeder.save()
+            self.assertEqual(
+                'Alpha 33KV', caching.get_object(PowerLine, code='F301').name)
+        self.assertEqual(
+            'Beta 33KV', caching.get_object(PowerLine, code='F301').name)
+        
+        # changes rolled back leave cached entries in place
+        try:
+            with transaction.atomic():
+                self.feeder.delete()
+                raise ValueError
+        except ValueError:
+            pass
+        with self.assertNumQueries(0):
+            caching.get_object(PowerLine, code='F301')
@@ -0,0 +1,96 @@
+import json
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from .. import changelog
+from ..constants import Condition, Voltage
+from ..models import Change, PowerLine, Station, Transformer,\
+        TransformerRating
+
+
+
+class ChangeLogTestCase(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+        self.tstation = Station.objects.create(
+                code='T101', name='Alpha TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder = PowerLine.objects.create(
+                code='F301', name='Alpha 33KV', type=PowerLine.FEEDER,
+                voltage=Voltage.MVOLTH, source_station=self.tstation)
+        self.dstation = Station.objects.create(
+                code='S3001', name='Alpha DS',
+                category=Station.DISTRIBUTION,
+                voltage_ratio=Voltage.Ratio.MVOLTH_LVOLT,
+                source_feeder=self.feeder)
+    
+    def _changes(self, since=0, **kwargs):
+        return changelog.changes_since(since, **kwargs)['changes']
+    
+    def test_create_update_delete_logged_in_order(self):
+        self.dstation.name = 'Beta DS'
+        self.dstation.save()
+        self.dstation.save()            # nothing changed, nothing logged
+        self.dstation.delete()
+        
+        changes = self._changes(models=['station'])
+        self.assertEqual([('T101', 'C', 1), ('S3001', 'C', 1),
+                          ('S3001', 'U', 2), ('S3001', 'D', 3)],
+                         [(c['code'], c['action'], c['version'])
+                          for c in changes])
+        self.assertEqual('F301', changes[1]['data']['source_feeder'])
+        self.assertEqual({'name': 'Beta DS'}, changes[2]['data'])
+        self.assertEqual({}, changes[3]['data'])
+        self.assertEqual(sorted(c['seq'] for c in changes),
+                         [c['seq'] for c in changes])
+    
+    def test_changes_returned_in_batches(self):
+        batch = changelog.changes_since(0, limit=2)
+        self.assertEqual(['T101', 'F301'],
+                         [c['code'] for c in batch['changes']])
+        self.assertTrue(batch['more'])
+        
+        batch = changelog.changes_since(batch['last_seq'], limit=2)
+        self.assertEqual(['S3001'], [c['code'] for c in batch['changes']])
+        self.assertFalse(batch['more'])
+        
+        last_seq = batch['last_seq']
+        self.assertEqual(last_seq,
+                         changelog.changes_since(last_seq)['last_seq'])
+    
+    def test_deactivate_logs_subtree_updates(self):
+        since = Change.objects.order_by('-seq').first().seq
+        self.feeder.deactivate()
+        changes = self._changes(since)
+        self.assertEqual(['F301', 'S3001'], [c['code'] for c in changes])
+        self.assertEqual([{'is_active': False}] * 2,
+                         [c['data'] for c in changes])
+        station = Station.objects.all_with_inactive().get(code='S3001')
+        self.assertEqual(2, station.row_version)
+    
+    def test_cascaded_deletes_logged(self):
+        rating = TransformerRating.objects.create(
+            code='C2E2C', capacity=300, voltage_ratio=Voltage.Ratio.MVOLTH_LVOLT)
+        Transformer.objects.create(
+            code='TX1', rating=rating, station=self.dstation,
+            condition=Condition.OK, serialno='SN1')
+        since = Change.objects.order_by('-seq').first().seq
+        self.dstation.delete()
+        self.assertEqual([('transformer', 'D'), ('station', 'D')],
+                         [(c['model'], c['action'])
+                          for c in self._changes(since)])
+    
+    @override_settings(ROOT_URLCONF='elco.urls')
+    def test_changes_endpoint(self):
+        response = self.client.get(reverse('list_changes'),
+                                   {'since': 1, 'models': 'station'})
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(['S3001'], [c['code'] for c in data['changes']])
+        
+        response = self.client.get(reverse('list_changes'),
+                                   {'models': 'address'})
+        self.assertEqual(404, response.status_code)
@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from .. import benchmarks
+from ..constants import Voltage
+from ..models import PowerLine, Station
+
+
+
+@override_settings(**benchmarks.SETTINGS)
+class ConditionalGetTestCase(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+        self.tstation = Station.objects.create(
+                code='T101', name='Alpha TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder = PowerLine.objects.create(
+                code='F301', name='Alpha 33KV', type=PowerLine.FEEDER,
+                voltage=Voltage.MVOLTH, source_station=self.tstation)
+    
+    def _get(self, url, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, params, **headers)
+    
+    def test_list_not_modified_reads_change_log_only(self):
+        url = reverse('list_stations')
+        etag = self._get(url)['ETag']
+        self.assertTrue(etag.startswith('"') and not etag.startswith('W/'))
+        with self.assertNumQueries(1):
+            response = self._get(url, etag)
+        self.assertEqual(304, response.status_code)
+        
+        self.feeder.name = 'Beta 33KV'
+        self.feeder.save()
+        response = self._get(url, etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+    
+    def test_form_not_modified_without_building_form(self):
+        url = reverse('manage_station',
+                      kwargs={'station_id': self.tstation.pk})
+        response = self._get(url)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(2):
+            response = self._get(url, response['ETag'])
+        self.assertEqual(304, response.status_code)
+    
+    def test_form_stamp_follows_record_and_choices(self):
+        url = reverse('manage_station',
+                      kwargs={'station_id': self.tstation.pk})
+        etag = self._get(url)['ETag']
+        
+        # unrelated station changes leave the form stamp as is
+        Station.objects.create(
+            code='T102', name='Beta TS', category=Station.TRANSMISSION,
+            voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.assertEqual(304, self._get(url, etag).status_code)
+        
+        PowerLine.objects.create(
+            code='F302', name='Beta 33KV', type=PowerLine.FEEDER,
+            voltage=Voltage.MVOLTH, source_station=self.tstation)
+        self.assertEqual(200, self._get(url, etag).status_code)
+    
+    def test_form_stamp_follows_csrf_token(self):
+        url = reverse('manage_station',
+                      kwargs={'station_id': self.tstation.pk})
+        etag = self._get(url)['ETag']
+        self.assertEqual(304, self._get(url, etag).status_code)
+        
+        # another client, thus another token, gets a page of its own
+        self.client.cookies.clear()
+        response = self._get(url, etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+    
+    def test_unlogged_record_served_without_etag(self):
+        Station.objects.bulk_create([Station(
+            code='T103', name='Gamma TS', category=Station.TRANSMISSION,
+            voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)])
+        station = Station.objects.get(code='T103')
+        response = self._get(reverse('manage_station',
+                                     kwargs={'station_id': station.pk}))
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('ETag', response)
+    
+    def test_post_passed_through(self):
+        url = reverse('manage_station',
+                      kwargs={'station_id': self.tstation.pk})
+        etag = self._get(url)['ETag']
+        response = self.client.post(url, {}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('ETag', response)
+    
+    def test_export_not_modified(self):
+        url = reverse('export_network', kwargs={'kind': 'stations',
+                                                'fmt': 'csv'})
+        etag = self._get(url)['ETag']
+        self.assertEqual(304, self._get(url, etag).status_code)
@@ -0,0 +1,94 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from ..constants import Voltage
+from ..exporter import iter_export, iter_records
+from ..importer import NetworkImporter, read_csv
+from ..models import PowerLine, Station
+
+
+
+class ExporterTestCase(TestCase):
+    
+    def setUp(self):
+        self.tstation = Station.objects.create(
+                code='T101', name='Sample TS', category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder = PowerLine.objects.create(
+                code='F301', name='Sample 33KV', type=PowerLine.FEEDER,
+                voltage=Voltage.MVOLTH, source_station=self.tstation)
+        Station.objects.create(
+                code='I301', name='Sample IS', category=Station.INJECTION,
+                voltage_ratio=Voltage.Ratio.MVOLTH_MVOLTL,
+                source_feeder=self.feeder)
+    
+    def _export(self, kind, fmt='csv', compress=False, chunk_size=2000):
+        data = b''.join(iter_export(kind, fmt, compress, chunk_size))
+        if compress:
+            data = gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+        return data.decode('utf-8')
+    
+    def test_records_fetched_in_chunks(self):
+        # two full chunks followed by an empty one
+        with self.assertNumQueries(3):
+            records = list(iter_records(Station, ('code',), chunk_size=1))
+        self.assertEqual(['T101', 'I301'], [r['code'] for r in records])
+    
+    def test_csv_uses_display_text(self):
+        lines = self._export('stations').splitlines()
+        self.assertTrue(lines[0].startswith('code,alt_code,name,category'))
+        self.assertIn('T101,,Sample TS,Transmission,132/33KV', lines[1])
+        self.assertTrue(lines[2].endswith(',F301'))
+    
+    def test_jsonlines(self):
+        rows = [json.loads(line)
+                for line in self._export('powerlines', 'jsonl').splitlines()]
+        self.assertEqual(
+            [{'alt_code': '', 'code': 'F301', 'date_commissioned': None,
+              'is_active': True, 'name': 'Sample 33KV', 'notes': '',
+              'public': True, 'source_station': 'T101', 'type': 'Feeder',
+              'voltage': '33KV'}], rows)
+    
+    def test_gzip_compression(self):
+        self.assertEqual(self._export('stations'),
+                         self._export('stations', compress=True))
+    
+    def test_export_can_be_imported(self):
+        data = self._export('stations')
+        Station.objects.filter(code='I301').delete()
+        importer = NetworkImporter()
+        importer.import_stations(
+            row for row in read_csv(io.StringIO(data)) if row['code'] == 'I301')
+        importer.finish()
+        self.assertEqual(0, importer.error_count)
+        self.assertEqual('T101/F301/I301',
+                         Station.objects.get(code='I301').path)
+    
+    def test_management_command(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, 'powerlines.jsonl.gz')
+        call_command('export_network', 'powerlines', format='jsonl',
+                     gzip=True, output=path)
+        with gzip.open(path) as f:
+            self.assertEqual('F301', json.loads(f.read().decode())['code'])
+    
+    @override_settings(ROOT_URLCONF='elco.urls')
+    def test_export_view_streams(self):
+        url = reverse('export_network', kwargs={
+            'kind': 'stations', 'fmt': 'csv', 'compress': '.gz'})
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertEqual('application/gzip', response['Content-Type'])
+        self.assertIn('stations.csv.gz', response['Content-Disposition'])
+        data = b''.join(response.streaming_content)
+        self.assertEqual(self._export('stations').encode('utf-8'),
+                         gzip.GzipFile(fileobj=io.BytesIO(data)).read())
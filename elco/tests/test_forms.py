@@ -1,4 +1,6 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
 from ..forms import PowerLineForm, StationForm
 from ..models import PowerLine, Station
 from ..constants import Voltage
@@ -96,3 +98,115 @@ class PowerLineFormTestCase(BaseFormTestCase):
             self.assertTrue('11KV' not in names and '33KV' not in names and
                             '132KV' not in names and '330KV' not in names)
 
+
+
+class SourceChoicesCacheMixin(object):
+    
+    def setUp(self):
+        cache.clear()
+        self.station = Station.objects.create(
+                            code='T101', name='Sample TS',
+                            category=Station.TRANSMISSION,
+                            voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder = PowerLine.objects.create(
+                            code='F301', name='Sample Feeder',
+                            type=PowerLine.FEEDER, voltage=Voltage.MVOLTH,
+                            source_station=self.station)
+    
+    def _choices(self, form, field_name):
+        return list(form.fields[field_name].choices)[1:]
+
+
+class SourceChoicesCacheTestCase(SourceChoicesCacheMixin, BaseFormTestCase):
+    
+    def test_source_feeder_choices_are_code_label_pairs(self):
+        choices = self._choices(StationForm(), 'source_feeder')
+        self.assertEqual([('F301', str(self.feeder))], choices)
+    
+    def test_source_station_choices_are_code_label_pairs(self):
+        choices = self._choices(PowerLineForm(PowerLine.FEEDER),
+                                'source_station')
+        self.assertEqual([('T101', str(self.station))], choices)
+    
+    def test_cached_choices_need_no_queries(self):
+        self._choices(StationForm(Station.INJECTION), 'source_feeder')
+        with self.assertNumQueries(0):
+            self._choices(StationForm(Station.INJECTION), 'source_feeder')
+    
+    def test_choices_filtered_by_station_input_voltage(self):
+        PowerLine.objects.create(
+            code='F101', name='Another Feeder',
+            type=PowerLine.FEEDER, voltage=Voltage.MVOLTL,
+            source_station=self.station)
+        
+        form = StationForm(Station.INJECTION)
+        codes = [c[0] for c in self._choices(form, 'source_feeder')]
+        self.assertEqual(['F301'], codes)
+
+
+class SourceChoicesInvalidationTestCase(SourceChoicesCacheMixin,
+                                        TransactionTestCase):
+    
+    def test_choices_invalidated_on_save_and_delete(self):
+        self._choices(StationForm(), 'source_feeder')
+        feeder = PowerLine.objects.create(
+                    code='F101', name='Another Feeder',
+                    type=PowerLine.FEEDER, voltage=Voltage.MVOLTL,
+                    source_station=self.station)
+        
+        codes = [c[0] for c in self._choices(StationForm(), 'source_feeder')]
+        self.assertEqual(['F301', 'F101'], codes)
+        
+        feeder.delete()
+        codes = [c[0] for c in self._choices(StationForm(), 'source_feeder')]
+        self.assertEqual(['F301'], codes)
+    
+    def test_choices_invalidated_only_on_commit(self):
+        self._choices(StationForm(), 'source_feeder')
+        with transaction.atomic():
+            PowerLine.objects.create(
+                code='F101', name='Another Feeder',
+                type=PowerLine.FEEDER, voltage=Voltage.MVOLTL,
+                source_station=self.station)
+            with self.assertNumQueries(0):
+                self._choices(StationForm(), 'source_feeder')
+        
+        codes = [c[0] for c in self._choices(StationForm(), 'source_feeder')]
+        self.assertEqual(['F301', 'F101'], codes)
+
+
+@override_settings(ROOT_URLCONF='elco.urls')
+class AutocompleteFormTestCase(BaseFormTestCase):
+    
+    def setUp(self):
+        self.station = Station.objects.create(
+                            code='T101', name='Sample TS',
+                            category=Station.TRANSMISSION,
+                            voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder = PowerLine.objects.create(
+                            code='F101', name='Sample Feeder',
+                            type=PowerLine.FEEDER, voltage=Voltage.MVOLTL,
+                            source_station=self.station)
+    
+    def test_source_feeder_rendered_without_options(self):
+        form = StationForm(Station.INJECTION, autocomplete=True)
+        with self.assertNumQueries(0):
+            html = str(form['source_feeder'])
+        self.assertNotIn('<option', html)
+        self.assertIn('data-autocomplete-url="/autocomplete/feeders/'
+                      '?category=I"', html)
+    
+    def test_source_station_rendered_without_options(self):
+        form = PowerLineForm(PowerLine.FEEDER, autocomplete=True)
+        html = str(form['source_station'])
+        self.assertNotIn('<option', html)
+        self.assertIn('/autocomplete/stations/?line_type=F', html)
+    
+    def test_source_feeder_constrained_by_category(self):
+        # 11KV feeder cannot source an injection substation
+        data = {'code': 'I301', 'name': 'Sample IS', 'category': 'I',
+                'voltage_ratio': Voltage.Ratio.MVOLTH_MVOLTL,
+                'source_feeder': 'F101', 'public': True}
+        form = StationForm(Station.INJECTION, autocomplete=True, data=data)
+        self.assertFalse(form.is_valid())
+        self.assertIn('source_feeder', form.errors)
@@ -0,0 +1,54 @@
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from .. import rollups
+from ..generator import DEFAULT_BRANCHING, generate_network
+from ..models import PowerLine, Station, Transformer, TransformerRating
+from ..ratings import decode
+
+
+
+class NetworkGeneratorTestCase(TestCase):
+    
+    def test_generated_records_are_valid(self):
+        created = generate_network(120, seed=3)
+        self.assertEqual(120, created['station'])
+        self.assertEqual(120, Station.objects.count())
+        for model in (Station, PowerLine, TransformerRating, Transformer):
+            for record in model.objects.all():
+                record.full_clean()
+        
+        for code, capacity in TransformerRating.objects.values_list(
+                'code', 'capacity'):
+            self.assertEqual(capacity, decode(code).capacity)
+        self.assertFalse(Station.objects.filter(path='').exists())
+        self.assertFalse(PowerLine.objects.filter(path='').exists())
+        self.assertEqual([], rollups.verify())
+    
+    def test_same_seed_same_network(self):
+        generate_network(60, seed=5)
+        first = list(Station.objects.order_by('code')
+                     .values_list('code', 'source_feeder'))
+        Transformer.objects.all().delete()
+        PowerLine.objects.all().delete()
+        Station.objects.all().delete()
+        generate_network(60, seed=5)
+        self.assertEqual(first, list(Station.objects.order_by('code')
+                                     .values_list('code', 'source_feeder')))
+    
+    def test_distribution_spread_once_feeder_codes_run_out(self):
+        branching = DEFAULT_BRANCHING._replace(
+            feeders33=(1, 1), injection=(0, 0), distribution33=(0, 0))
+        generate_network(300, branching=branching)
+        self.assertEqual(255, PowerLine.objects.filter(
+            type=PowerLine.FEEDER).count())
+        self.assertEqual(45, Station.objects.filter(
+            category=Station.DISTRIBUTION).count())
+    
+    def test_management_command(self):
+        out = StringIO()
+        call_command('generate_network', '30', '--transformers', '0', '0',
+                     stdout=out)
+        self.assertIn('station: 30 created', out.getvalue())
+        self.assertEqual(0, Transformer.objects.count())
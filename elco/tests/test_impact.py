@@ -0,0 +1,146 @@
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from .. import impact, topology
+from ..constants import Condition, Voltage
+from ..models import Station, Transformer, TransformerRating
+from . import NetworkFixtureMixin
+
+
+
+class ImpactTestCase(NetworkFixtureMixin, TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_ratings()
+    
+    def setUp(self):
+        # T101 -> F301 -> I301 -> F101 -> S10001
+        #                      -> F102 -> S10002
+        topology.reset_index()
+        impact.reset_index()
+        self.build_network(feeders=2)
+        for n, station in enumerate(self.dstations, 1):
+            Transformer.objects.create(
+                code='TX%s' % n, rating_id='D1500', station=station,
+                condition=Condition.OK, serialno='SN00%s' % n)
+    
+    def tearDown(self):
+        topology.reset_index()
+        impact.reset_index()
+    
+    def test_feeder_fault(self):
+        index = impact.get_index()
+        with self.assertNumQueries(0):
+            result = index.analyze(['F301'])
+        self.assertEqual(['I301', 'S10001', 'S10002'], result.stations)
+        self.assertEqual(['F301', 'F101', 'F102'], result.powerlines)
+        self.assertEqual([('S10001', 'TX1'), ('S10002', 'TX2')],
+                         result.transformers)
+        self.assertEqual((2, 1000),
+                         (result.transformer_count, result.capacity))
+        self.assertEqual({Station.INJECTION: 1, Station.DISTRIBUTION: 2},
+                         result.count_by_category())
+    
+    def test_simultaneous_faults(self):
+        result = impact.analyze(['F102', 'F101'])
+        self.assertEqual(['S10001', 'S10002'], result.stations)
+        self.assertEqual(1000, result.capacity)
+        
+        # faults within the subtree of another add nothing
+        result = impact.analyze(['S10001', 'I301', 'F102'])
+        self.assertEqual(['I301', 'S10001', 'S10002'], result.stations)
+        self.assertEqual(2, result.transformer_count)
+    
+    def test_unknown_and_deenergized_nodes(self):
+        with self.assertRaises(KeyError):
+            impact.analyze(['F999'])
+        
+        index = impact.get_index()
+        self.feeders[1].is_active = False
+        self.feeders[1].save()
+        self.assertIs(index, impact.get_index())
+        self.assertEqual([], impact.analyze(['S10002']).stations)
+        result = impact.analyze(['F301'])
+        self.assertEqual(['I301', 'S10001'], result.stations)
+        self.assertEqual((1, 500),
+                         (result.transformer_count, result.capacity))
+        self.assertEqual({Station.INJECTION: 1, Station.DISTRIBUTION: 1},
+                         result.count_by_category())
+        
+        self.feeders[1].is_active = True
+        self.feeders[1].save()
+        self.assertEqual(1000, impact.analyze(['F301']).capacity)
+    
+    def test_nodes_updated_in_place(self):
+        index = impact.get_index()
+        station = Station.objects.create(
+                code='S10003', name='Sample DS 3',
+                category=Station.DISTRIBUTION,
+                voltage_ratio=Voltage.Ratio.MVOLTL_LVOLT,
+                source_feeder=self.feeders[0])
+        Transformer.objects.create(
+                code='TX3', rating_id='D1500', station=station,
+                condition=Condition.OK, serialno='SN003')
+        self.assertIs(index, impact.get_index())
+        with self.assertNumQueries(0):
+            result = index.analyze(['F101'])
+            self.assertEqual(['S10001', 'S10003'], result.stations)
+            self.assertEqual((2, 1000),
+                             (result.transformer_count, result.capacity))
+            self.assertEqual(1500, index.analyze(['T101']).capacity)
+        
+        # re-parented along with its subtree, then deleted
+        station.source_feeder = self.feeders[1]
+        station.save()
+        self.assertEqual(500, index.analyze(['F101']).capacity)
+        self.assertEqual(['S10002', 'S10003'],
+                         index.analyze(['F102']).stations)
+        station.delete()
+        result = index.analyze(['I301'])
+        self.assertEqual((2, 1000),
+                         (result.transformer_count, result.capacity))
+        with self.assertRaises(KeyError):
+            index.analyze(['S10003'])
+        
+        # rating capacity changes apply to every transformer rated
+        rating = TransformerRating.objects.get(code='D1500')
+        rating.capacity = 300
+        rating.save()
+        self.assertEqual(600, index.analyze(['T101']).capacity)
+        self.assertIs(index, impact.get_index())
+    
+    def test_transformers_updated_in_place(self):
+        index = impact.get_index()
+        xfmr = Transformer.objects.create(
+                code='TX3', rating_id='P375m', station=self.istation,
+                condition=Condition.OK, serialno='SN003')
+        result = index.analyze(['I301'])
+        self.assertEqual((3, 8500),
+                         (result.transformer_count, result.capacity))
+        
+        xfmr.is_active = False
+        xfmr.save()
+        Transformer.objects.get(code='TX1').delete()
+        result = index.analyze(['I301'])
+        self.assertEqual([('S10002', 'TX2')], result.transformers)
+        self.assertEqual(500, result.capacity)
+        
+        self.tstation.name = 'Renamed TS'
+        self.tstation.save()
+        self.assertIs(index, impact.get_index())
+    
+    @override_settings(ROOT_URLCONF='elco.urls')
+    def test_view(self):
+        response = self.client.get(reverse('outage_impact'),
+                                   {'codes': 'f101,f102'})
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual(['S10001', 'S10002'], data['stations'])
+        self.assertEqual({Station.DISTRIBUTION: 2},
+                         data['stations_by_category'])
+        self.assertEqual(1000, data['capacity'])
+        
+        response = self.client.get(reverse('outage_impact'),
+                                   {'codes': 'F999'})
+        self.assertEqual(404, response.status_code)
@@ -0,0 +1,112 @@
+import io
+
+from django.test import TestCase
+
+from ..constants import Voltage
+from ..importer import NetworkImporter, ReportWriter, read_csv,\
+        read_jsonlines
+from ..models import PowerLine, Station, Transformer, TransformerRating
+
+
+STATIONS_CSV = """code,name,category,voltage_ratio,source_feeder
+T101,Sample TS,Transmission,132/33KV,
+I301,Sample IS,I,33/11KV,F301
+S10001,Sample DS,D,11/0.415KV,F101
+S30001,Mismatched DS,D,33/0.415KV,F101
+I102,Bad Code IS,I,33/11KV,
+"""
+
+POWERLINES_JSONL = """
+{"code": "F301", "name": "Sample 33KV", "type": "F", "voltage": 3, "source_station": "T101"}
+{"code": "F101", "name": "Sample 11KV", "type": "F", "voltage": "11KV", "source_station": "I301"}
+{"code": "F102", "name": "Orphan 11KV", "type": "F", "voltage": 4, "source_station": "I3FF"}
+"""
+
+RATINGS_CSV = """code,capacity,voltage_ratio
+P375m,7500,132/33KV
+D1500,500,11/0.415KV
+"""
+
+TRANSFORMERS_CSV = """code,rating,station,condition,serialno
+TX1,P375m,T101,OK,SN001
+TX2,D1500,S10001,1,SN002
+TX3,D1500,S1FFFF,1,SN003
+"""
+
+
+
+class NetworkImporterTestCase(TestCase):
+
+    def setUp(self):
+        self.errors = []
+        self.importer = NetworkImporter(chunk_size=2,
+                                        on_error=self.errors.append)
+        self.importer.import_stations(read_csv(io.StringIO(STATIONS_CSV)))
+        self.importer.import_ratings(read_csv(io.StringIO(RATINGS_CSV)))
+        self.importer.import_powerlines(
+            read_jsonlines(io.StringIO(POWERLINES_JSONL)))
+        self.importer.import_transformers(
+            read_csv(io.StringIO(TRANSFORMERS_CSV)))
+        self.importer.finish()
+
+    def _error_codes(self, model_name):
+        return sorted(e.code for e in self.errors
+                      if e.model == model_name)
+
+    def test_valid_rows_are_created(self):
+        self.assertEqual(
+            {'station': 4, 'powerline': 2,
+             'transformerrating': 2, 'transformer': 2},
+            self.importer.created)
+
+    def test_display_text_mapped_to_choice_values(self):
+        station = Station.objects.get(code='T101')
+        self.assertEqual(Station.TRANSMISSION, station.category)
+        self.assertEqual(Voltage.Ratio.HVOLTL_MVOLTH, station.voltage_ratio)
+        self.assertEqual(Voltage.MVOLTL,
+                         PowerLine.objects.get(code='F101').voltage)
+
+    def test_invalid_rows_reported_without_aborting(self):
+        # I102 fails code format check; F102 & TX3 have unknown references
+        self.assertEqual(['I102'], self._error_codes('station')[:1])
+        self.assertEqual(['F102'], self._error_codes('powerline'))
+        self.assertEqual(['TX3'], self._error_codes('transformer'))
+        self.assertFalse(Station.objects.filter(code='I102').exists())
+
+    def test_deferred_source_feeders_linked(self):
+        station = Station.objects.get(code='S10001')
+        self.assertEqual('F101', station.source_feeder_id)
+        self.assertEqual('T101/F301/I301/F101/S10001', station.path)
+
+    def test_mismatched_source_feeder_reported(self):
+        self.assertIn('S30001', self._error_codes('station'))
+        station = Station.objects.get(code='S30001')
+        self.assertIsNone(station.source_feeder_id)
+
+        # kept, thus reported as imported without its link
+        self.assertEqual(1, self.importer.unlinked)
+        error = [e for e in self.errors if e.code == 'S30001'][0]
+        self.assertTrue(error.messages[0].startswith(
+            'imported without its source feeder; '))
+        self.assertEqual(len(self.errors), self.importer.error_count)
+
+    def test_duplicate_rows_reported(self):
+        report = io.StringIO()
+        importer = NetworkImporter(on_error=ReportWriter(report))
+        importer.import_ratings(read_csv(io.StringIO(RATINGS_CSV)))
+        self.assertEqual(2, importer.error_count)
+        rows = list(read_csv(io.StringIO(report.getvalue())))
+        self.assertEqual(set(['D1500', 'P375m']),
+                         set(row['code'] for row in rows))
+        self.assertEqual(2, TransformerRating.objects.count())
+        self.assertEqual(2, Transformer.objects.count())
+
+    def test_chunk_validated_with_fixed_queries(self):
+        rows = [{'code': 'S1%04X' % n, 'name': 'DS %s' % n, 'category': 'D',
+                 'voltage_ratio': '11/0.415KV'} for n in range(0x100, 0x128)]
+        importer = NetworkImporter(chunk_size=40)
+        # uniqueness check (code, name+category), the insert itself and
+        # logging created records (last pk, read back, insert changes)
+        with self.assertNumQueries(3 + 2 + 3):
+            importer.import_stations(rows)
+        self.assertEqual({'station': 40}, importer.created)
@@ -0,0 +1,81 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from .. import choices, indexes
+from ..benchmarks import plans
+from ..constants import Voltage
+from ..generator import generate_network
+from ..models import PowerLine, Station
+
+
+
+class ActiveManagerTestCase(TestCase):
+    
+    def setUp(self):
+        self.tstation = Station.objects.create(
+                code='T101', name='Alpha TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder = PowerLine.objects.create(
+                code='F301', name='Alpha 33KV', type=PowerLine.FEEDER,
+                voltage=Voltage.MVOLTH, source_station=self.tstation,
+                is_active=False)
+    
+    def test_inactive_records_left_out_by_default(self):
+        self.assertEqual([], list(PowerLine.objects.all()))
+        self.assertFalse(PowerLine.objects.filter(code='F301').exists())
+        self.assertEqual(['F301'], list(
+            PowerLine.objects.all_with_inactive()
+                             .values_list('code', flat=True)))
+        self.assertEqual(1, PowerLine.all_objects.count())
+    
+    def test_default_manager_sees_inactive_records(self):
+        self.assertIs(PowerLine.all_objects, PowerLine._default_manager)
+        station = Station.objects.create(
+                code='S3001', name='Alpha DS', category=Station.DISTRIBUTION,
+                voltage_ratio=Voltage.Ratio.MVOLTH_LVOLT,
+                source_feeder=self.feeder)
+        station = Station.objects.get(pk=station.pk)
+        self.assertEqual('F301', station.source_feeder.code)
+    
+    def test_queryset_methods_available(self):
+        self.assertEqual({}, PowerLine.objects.in_bulk_by_code(['F301']))
+        self.assertEqual(['F301'], list(
+            PowerLine.objects.all_with_inactive().in_bulk_by_code(['F301'])))
+
+
+class ActiveIndexesTestCase(TestCase):
+    
+    def test_indexes_created(self):
+        for model_name, suffix, _ in indexes.ACTIVE_INDEXES:
+            model = Station if model_name == 'station' else PowerLine
+            with connection.cursor() as cursor:
+                names = connection.introspection.get_constraints(
+                    cursor, model._meta.db_table)
+            self.assertIn(indexes.get_index_name(model, suffix), names)
+    
+    @skipUnless(connection.vendor == 'sqlite', "Plans differ by database.")
+    def test_active_queries_use_indexes(self):
+        generate_network(20)
+        queries = plans.get_queries()
+        self.assertIn('elco_station_active_category',
+                      plans.explain(queries['stations_by_category'])[0])
+        self.assertIn('elco_powerline_active_voltage',
+                      plans.explain(queries['powerlines_by_source'])[0])
+    
+    def test_plans_compare_against_latest_migration(self):
+        self.assertEqual('0004_prefix_indexes', plans.get_leaf_migration())
+
+
+class PrefixIndexesTestCase(TestCase):
+    
+    @skipUnless(connection.vendor == 'sqlite', "Plans differ by database.")
+    def test_prefix_searches_use_indexes(self):
+        generate_network(20)
+        queryset = Station.objects.all_with_inactive().filter(
+            choices._prefix_filter('al')).order_by('code')
+        plan = ' '.join(plans.explain(queryset))
+        for field in ('code', 'alt_code', 'name'):
+            self.assertIn('elco_station_prefix_%s' % field, plan)
@@ -0,0 +1,112 @@
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from .. import instrumentation
+from ..constants import Voltage
+from ..middleware import QueryInstrumentationMiddleware
+from ..models import PowerLine, Station
+
+
+
+class RecordQueriesTestCase(TestCase):
+    
+    def setUp(self):
+        self.tstation = Station.objects.create(
+                code='T101', name='Alpha TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        for n in range(1, 7):
+            PowerLine.objects.create(
+                code='F30%s' % n, name='Alpha 33KV %s' % n,
+                type=PowerLine.FEEDER, voltage=Voltage.MVOLTH,
+                source_station=self.tstation)
+    
+    def test_fingerprint_collapses_literals(self):
+        self.assertEqual(
+            instrumentation.fingerprint(
+                "SELECT * FROM t WHERE a = 'x' AND b IN (%s, %s, %s)"),
+            instrumentation.fingerprint(
+                "SELECT  * FROM t WHERE a = 'y''z' AND b IN (%s, %s)"))
+        self.assertEqual('SELECT ? FROM t LIMIT ?',
+                         instrumentation.fingerprint('SELECT 1 FROM t LIMIT 21'))
+    
+    def test_per_row_queries_flagged(self):
+        with instrumentation.record_queries() as recorder:
+            for line in PowerLine.objects.all():
+                Station.objects.get(code=line.source_station_id)
+        report = recorder.get_report()
+        self.assertEqual(7, report['queries'])
+        self.assertEqual(1, len(report['duplicates']))
+        self.assertEqual(6, report['duplicates'][0]['count'])
+        self.assertIn('test_instrumentation.py',
+                      report['duplicates'][0]['sites'][0])
+        self.assertEqual(1, len(report['n_plus_one']))
+    
+    def test_joined_queries_not_flagged(self):
+        @instrumentation.record_queries(threshold=2)
+        def lookup():
+            for line in PowerLine.objects.select_related('source_station'):
+                line.source_station.name
+        
+        with instrumentation.record_queries() as recorder:
+            lookup()
+        self.assertEqual(1, recorder.count)
+        self.assertEqual([], recorder.get_n_plus_one())
+    
+    def test_nested_recorders_restore_cursor(self):
+        with instrumentation.record_queries() as outer:
+            with instrumentation.record_queries() as inner:
+                Station.objects.count()
+            PowerLine.objects.count()
+        with instrumentation.record_queries() as other:
+            pass
+        Station.objects.count()
+        self.assertEqual((1, 2, 0), (inner.count, outer.count, other.count))
+    
+    def test_decorated_calls_recorded_apart(self):
+        @instrumentation.record_queries(name='count', log=True)
+        def count(depth):
+            Station.objects.count()
+            if depth:
+                count(depth - 1)
+        
+        with self.assertLogs('elco.queries', 'INFO') as logs:
+            count(1)
+            count(0)
+        self.assertEqual([1, 2, 1], [record.query_report['queries']
+                                     for record in logs.records])
+        self.assertNotIn('make_cursor', connection.__dict__)
+
+
+@override_settings(ROOT_URLCONF='elco.urls', MIDDLEWARE_CLASSES=(
+    'elco.middleware.QueryInstrumentationMiddleware',))
+class QueryInstrumentationMiddlewareTestCase(TestCase):
+    
+    def setUp(self):
+        Station.objects.create(
+            code='T101', name='Alpha TS', category=Station.TRANSMISSION,
+            voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.url = reverse('autocomplete_source', kwargs={'kind': 'stations'})
+    
+    @override_settings(DEBUG=True)
+    def test_headers_in_debug_mode(self):
+        with self.assertLogs('elco.queries', 'INFO') as logs:
+            response = self.client.get(self.url, {'q': 'alpha'})
+        self.assertEqual(200, response.status_code)
+        self.assertGreater(int(response['X-Elco-Queries']), 0)
+        self.assertEqual('0', response['X-Elco-N-Plus-One'])
+        self.assertIn('elco.views.autocomplete_source', logs.output[0])
+    
+    @override_settings(ELCO_QUERY_INSTRUMENTATION=True)
+    def test_logged_without_headers_in_production(self):
+        with self.assertLogs('elco.queries', 'INFO') as logs:
+            response = self.client.get(self.url, {'q': 'alpha'})
+        self.assertNotIn('X-Elco-Queries', response)
+        self.assertEqual(1, len(logs.records))
+        self.assertIn('"queries": ', logs.output[0])
+    
+    def test_unused_when_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryInstrumentationMiddleware()
@@ -0,0 +1,102 @@
+import threading
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from .. import benchmarks, caching, metrics
+from ..constants import Voltage
+from ..models import PowerLine, Station
+
+
+
+class MetricTestCase(TestCase):
+    
+    def test_counter_sums_values_of_all_threads(self):
+        counter = metrics.Counter('test_total', 'Test.', ('kind',),
+                                  registry=None)
+        counter.inc(('a',))
+        threads = [threading.Thread(target=counter.inc, args=(('a',), 2))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        self.assertEqual(7, counter.value(('a',)))
+        # values of finished threads are retained once folded
+        self.assertEqual(7, counter.value(('a',)))
+        self.assertEqual(1, len(counter._stores))
+    
+    def test_histogram_rendered_with_cumulative_buckets(self):
+        registry = metrics.Registry()
+        histogram = metrics.Histogram('test_seconds', 'Test "latency".',
+                                      ('view',), buckets=(0.1, 1.0),
+                                      registry=registry)
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, ('a"b',))
+        self.assertEqual(4, histogram.count(('a"b',)))
+        self.assertEqual([
+            '# HELP test_seconds Test "latency".',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="a\\"b",le="0.1"} 1',
+            'test_seconds_bucket{view="a\\"b",le="1.0"} 3',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+            'test_seconds_sum{view="a\\"b"} 4.05',
+            'test_seconds_count{view="a\\"b"} 4',
+        ], registry.render().splitlines())
+    
+    def test_timer_observes_decorated_function(self):
+        histogram = metrics.Histogram('test_seconds', 'Test.', registry=None)
+        timed = histogram.time()(lambda: None)
+        timed()
+        with histogram.time():
+            pass
+        self.assertEqual(2, histogram.count())
+
+
+@override_settings(**benchmarks.SETTINGS)
+class HotPathMetricsTestCase(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+        for metric in (metrics.VIEW_LATENCY, metrics.CLEAN_LATENCY,
+                       metrics.FORM_INIT_LATENCY, metrics.CACHE_REQUESTS):
+            metric.reset()
+        self.tstation = Station.objects.create(
+                code='T101', name='Alpha TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+    
+    def test_view_latency_split_by_method_and_outcome(self):
+        url = reverse('manage_station',
+                      kwargs={'station_id': self.tstation.pk})
+        self.client.get(url)
+        self.client.post(url, {'code': 'T101'})
+        self.client.post(url, {
+            'code': 'T101', 'name': 'Beta TS', 'public': True,
+            'category': Station.TRANSMISSION,
+            'voltage_ratio': Voltage.Ratio.HVOLTL_MVOLTH})
+        
+        for outcome, method in (('unbound', 'GET'), ('invalid', 'POST'),
+                                ('valid', 'POST')):
+            self.assertEqual(1, metrics.VIEW_LATENCY.count(
+                ('manage_station', method, outcome)))
+        self.assertEqual(3, metrics.FORM_INIT_LATENCY.count(('StationForm',)))
+        self.assertEqual(2, metrics.CLEAN_LATENCY.count(
+            ('station', '_validate_source_feeder')))
+    
+    def test_cache_hits_and_misses_counted(self):
+        caching.get_object(Station, code='T101')
+        caching.get_object(Station, code='T101')
+        self.assertEqual(1, metrics.CACHE_REQUESTS.value(
+            ('record', 'station', 'miss')))
+        self.assertEqual(1, metrics.CACHE_REQUESTS.value(
+            ('record', 'station', 'hit')))
+    
+    def test_metrics_endpoint(self):
+        PowerLine(code='F301', voltage=Voltage.MVOLTH).clean()
+        response = self.client.get(reverse('export_metrics'))
+        self.assertEqual(metrics.CONTENT_TYPE, response['Content-Type'])
+        self.assertIn(
+            'elco_clean_validator_duration_seconds_count'
+            '{model="powerline",validator="_validate_code"} 1',
+            response.content.decode('utf-8'))
@@ -455,3 +455,97 @@ class TransformerRatingTest(TestCase):
     def test_builds_without_mult_for_3digit_dist_xfmr(self):
         code = build_transformer_rating_code(500, '33/0.415KV')
         self.assertEqual('D3500', code)
+    
+    def test_power_xfmr_rating_valid_for_either_11KV_voltage_ratio(self):
+        for voltage_ratio in (Voltage.Ratio.HVOLTL_MVOLTL,
+                              Voltage.Ratio.MVOLTH_MVOLTL):
+            rating = TransformerRating(code='P115m', capacity=1500,
+                        voltage_ratio=voltage_ratio)
+            rating.full_clean()
+    
+    def test_code_with_mismatched_voltage_ratio_are_invalid(self):
+        rating = TransformerRating(code='D3500', capacity=500,
+                    voltage_ratio=Voltage.Ratio.MVOLTL_LVOLT)
+        
+        with self.assertRaises(ValidationError):
+            # D3 encodes 33/0.415KV
+            rating.full_clean()
+
+
+class BulkFullCleanTestCase(TestCase):
+    
+    def setUp(self):
+        self.station = Station.objects.create(
+                code='T101', name='Sample TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder = PowerLine.objects.create(
+                code='F301', name='Sample Feeder',
+                type=PowerLine.FEEDER, voltage=Voltage.MVOLTH,
+                source_station=self.station)
+    
+    def _make_stations(self, count):
+        return [Station(code='S3%04X' % n, name='Sample DS %s' % n,
+                        category=Station.DISTRIBUTION,
+                        voltage_ratio=Voltage.Ratio.MVOLTH_LVOLT,
+                        source_feeder_id='F301')
+                for n in range(1, count + 1)]
+    
+    def test_valid_instances_have_no_errors(self):
+        stations = self._make_stations(10)
+        self.assertEqual({}, Station.objects.bulk_full_clean(stations))
+        self.assertEqual(self.feeder, stations[0].source_feeder)
+    
+    def test_queries_independent_of_instance_count(self):
+        for count in (5, 50):
+            stations = self._make_stations(count)
+            # source feeders, address & two unique checks
+            with self.assertNumQueries(3):
+                Station.objects.bulk_full_clean(stations)
+    
+    def test_errors_match_full_clean(self):
+        stations = [
+            Station(code='T102', name='Sample TS',
+                    category=Station.TRANSMISSION,
+                    voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH),
+            Station(code='I301', name='Sample IS',
+                    category=Station.INJECTION,
+                    voltage_ratio=Voltage.Ratio.MVOLTH_MVOLTL,
+                    source_feeder_id='F3FF'),
+            Station(code='S10001', name='Sample DS',
+                    category=Station.DISTRIBUTION,
+                    voltage_ratio=Voltage.Ratio.MVOLTL_LVOLT,
+                    source_feeder_id='F301'),
+            Station(code='S30001', name='Fine DS',
+                    category=Station.DISTRIBUTION,
+                    voltage_ratio=Voltage.Ratio.MVOLTH_LVOLT,
+                    source_feeder_id='F301'),
+        ]
+        errors = Station.objects.bulk_full_clean(stations)
+        self.assertEqual([0, 1, 2], sorted(errors.keys()))
+        
+        for index in (0, 2):
+            with self.assertRaises(ValidationError) as ex:
+                stations[index].full_clean()
+            self.assertEqual(ex.exception.message_dict,
+                             errors[index].message_dict)
+        self.assertIn('source_feeder', errors[1].message_dict)
+    
+    def test_duplicates_within_instances_reported(self):
+        stations = self._make_stations(2)
+        stations[1].code = stations[0].code
+        errors = Station.objects.bulk_full_clean(stations)
+        self.assertEqual([1], list(errors.keys()))
+        self.assertIn('code', errors[1].message_dict)
+    
+    def test_powerline_source_station_validated(self):
+        powerlines = [
+            PowerLine(code='F101', name='Sample 11KV', type=PowerLine.FEEDER,
+                      voltage=Voltage.MVOLTL, source_station_id='T101'),
+            PowerLine(code='F302', name='Sample 33KV', type=PowerLine.FEEDER,
+                      voltage=Voltage.MVOLTH),
+        ]
+        errors = PowerLine.objects.bulk_full_clean(powerlines)
+        self.assertIn(str(MSG_POWERLINE_VOLTAGE_MISMATCH_SOURCE_FEEDER),
+                      str(errors[0]))
+        self.assertIn(str(MSG_REQUIRED_FIELD), str(errors[1]))
@@ -0,0 +1,66 @@
+from django.test import SimpleTestCase
+
+from .. import ratings
+from ..constants import Voltage
+
+
+
+class RatingCodecTestCase(SimpleTestCase):
+
+    def test_encoded_codes_decode_to_same_values(self):
+        for (capacity, voltage_ratio), code in ratings.ENCODE_TABLE.items():
+            rating = ratings.decode(code)
+            self.assertEqual(capacity, rating.capacity)
+            self.assertIn(voltage_ratio, rating.voltage_ratios)
+
+    def test_decode(self):
+        rating = ratings.decode('P375m')
+        self.assertEqual(7500, rating.capacity)
+        self.assertEqual((Voltage.Ratio.HVOLTL_MVOLTH,), rating.voltage_ratios)
+        self.assertEqual(ratings.POWER, rating.transformer_type)
+
+        # bare digits are MVA for power transformers, KVA otherwise
+        self.assertEqual(60000, ratings.decode('P3060').capacity)
+        self.assertTrue(ratings.matches('P3060', 60000,
+                                        Voltage.Ratio.HVOLTL_MVOLTH))
+        self.assertFalse(ratings.matches('P3060', 60,
+                                         Voltage.Ratio.HVOLTL_MVOLTH))
+
+        rating = ratings.decode('D1050')
+        self.assertEqual(50, rating.capacity)
+        self.assertEqual(ratings.DISTRIBUTION, rating.transformer_type)
+
+    def test_decode_rejects_invalid_codes(self):
+        for code in ('p3060', '3060', 'D350K', 'P2060', 'P30600'):
+            with self.assertRaises(ValueError):
+                ratings.decode(code)
+
+    def test_encode_uses_most_natural_form(self):
+        self.assertEqual('P306M', ratings.encode(6000, '132/33KV'))
+        self.assertEqual('D301M', ratings.encode(1000, '33/0.415KV'))
+        self.assertEqual('D315m', ratings.encode(1500, '33/0.415KV'))
+        self.assertEqual('P115m',
+                         ratings.encode(1500, Voltage.Ratio.MVOLTH_MVOLTL))
+        self.assertEqual('P360M', ratings.encode(60000, '132/33KV'))
+        self.assertEqual('P3100', ratings.encode(100000, '132/33KV'))
+        self.assertEqual('P305m', ratings.encode(500, '132/33KV'))
+
+    def test_encode_rejects_inexpressible_capacity(self):
+        for capacity, voltage_ratio in ((550, '132/33KV'),
+                                        (1050, '33/0.415KV'),
+                                        (1000000, '132/33KV')):
+            with self.assertRaises(ValueError):
+                ratings.encode(capacity, voltage_ratio)
+
+    def test_encode_rejects_unknown_voltage_ratio(self):
+        with self.assertRaises(ValueError):
+            ratings.encode(500, '11/33KV')
+
+    def test_batch_apis(self):
+        codes = ratings.encode_many(
+            [(500, '33/0.415KV'), (1050, '33/0.415KV'), (500, 'bad')])
+        self.assertEqual(['D3500', None, None], codes)
+
+        decoded = ratings.decode_many(['D3500', 'D350K'])
+        self.assertEqual(500, decoded[0].capacity)
+        self.assertIsNone(decoded[1])
@@ -0,0 +1,114 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from .. import rollups
+from ..constants import Condition, Voltage
+from ..models import PowerLine, Station, Transformer, TransformerRating
+from . import NetworkFixtureMixin
+
+
+
+class RollupsTestCase(NetworkFixtureMixin, TestCase):
+    
+    def setUp(self):
+        self.build_network()
+        self.create_ratings()
+        self.xfmr = Transformer.objects.create(
+                code='TX1', rating_id='P375m', station=self.istation,
+                condition=Condition.OK, serialno='SN001')
+        Transformer.objects.create(
+                code='TX2', rating_id='D1500', station=self.dstation,
+                condition=Condition.OK, serialno='SN002')
+    
+    def _get(self, model, code, *fields):
+        return model.objects.all_with_inactive().filter(code=code)\
+                    .values_list(*fields).get()
+    
+    def _capacity(self, model, code):
+        return self._get(model, code, 'installed_capacity')[0]
+    
+    def test_counts_and_capacity_rolled_up(self):
+        self.assertEqual((1, 0, 8000), self._get(
+            Station, 'T101', *rollups.STATION_FIELDS))
+        self.assertEqual((1, 1, 8000), self._get(
+            Station, 'I301', *rollups.STATION_FIELDS))
+        self.assertEqual(500, self._capacity(PowerLine, 'F101'))
+        self.assertEqual([], rollups.verify())
+    
+    def test_deactivated_transformer_removed(self):
+        self.xfmr.is_active = False
+        self.xfmr.save()
+        self.assertEqual(500, self._capacity(Station, 'T101'))
+        self.assertEqual((0,), self._get(
+            Station, 'I301', 'transformer_count'))
+    
+    def test_moved_powerline_updates_both_stations(self):
+        other = Station.objects.create(
+                code='I302', name='Other IS', category=Station.INJECTION,
+                voltage_ratio=Voltage.Ratio.MVOLTH_MVOLTL)
+        self.feeder11.source_station = other
+        self.feeder11.save()
+        self.assertEqual((0, 1, 7500), self._get(
+            Station, 'I301', *rollups.STATION_FIELDS))
+        self.assertEqual((1, 0, 500), self._get(
+            Station, 'I302', *rollups.STATION_FIELDS))
+        self.assertEqual(7500, self._capacity(Station, 'T101'))
+        self.assertEqual([], rollups.verify())
+    
+    def test_stale_instance_keeps_stored_rollups(self):
+        self.tstation.name = 'Renamed TS'
+        self.tstation.save()
+        self.assertEqual(8000, self._capacity(Station, 'T101'))
+    
+    def test_deactivated_subtree(self):
+        Station.objects.get(code='I301').deactivate()
+        self.assertEqual((1, 0, 0), self._get(
+            Station, 'T101', *rollups.STATION_FIELDS))
+        self.assertEqual((0, 1, 7500), self._get(
+            Station, 'I301', *rollups.STATION_FIELDS))
+        self.assertEqual([], rollups.verify())
+    
+    def test_deleted_subtree(self):
+        PowerLine.objects.get(code='F301').delete()
+        self.assertEqual((0, 0, 0), self._get(
+            Station, 'T101', *rollups.STATION_FIELDS))
+        self.assertEqual([], rollups.verify())
+    
+    def test_rating_capacity_change(self):
+        Transformer.objects.create(
+                code='TX3', rating_id='D1500', station=self.dstation,
+                condition=Condition.OK, serialno='SN003')
+        Transformer.objects.create(
+                code='TX4', rating_id='D1500', station=self.dstation,
+                condition=Condition.OK, serialno='SN004', is_active=False)
+        self.assertEqual(1000, self._capacity(PowerLine, 'F101'))
+        
+        rating = TransformerRating.objects.get(code='D1500')
+        rating.capacity = 300
+        rating.save()
+        self.assertEqual((0, 2, 600), self._get(
+            Station, 'S10001', *rollups.STATION_FIELDS))
+        self.assertEqual(8100, self._capacity(Station, 'T101'))
+        self.assertEqual([], rollups.verify())
+        
+        # stations beyond an inactive node only update up to it
+        self.feeder11.is_active = False
+        self.feeder11.save()
+        rating.capacity = 500
+        rating.save()
+        self.assertEqual(1000, self._capacity(PowerLine, 'F101'))
+        self.assertEqual(7500, self._capacity(Station, 'T101'))
+        self.assertEqual([], rollups.verify())
+    
+    def test_rebuild_command_repairs_drift(self):
+        Station.objects.filter(code='T101').update(installed_capacity=1)
+        self.assertEqual(1, len(rollups.verify()))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', check=True, stdout=StringIO())
+        
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('1 records updated', out.getvalue())
+        self.assertEqual(8000, self._capacity(Station, 'T101'))
@@ -0,0 +1,102 @@
+from unittest import skipIf
+
+from django.test import TestCase
+
+from .. import snapshot
+from ..constants import Condition, Voltage
+from ..models import PowerLine, Station, Transformer
+from . import NetworkFixtureMixin
+
+
+
+@skipIf(snapshot.np is None, "NumPy is not installed.")
+class SnapshotTestCase(NetworkFixtureMixin, TestCase):
+    
+    def setUp(self):
+        # T101 -> F301 -> I301 -> F101 -> S10001
+        #                      -> F102 -> S10002 (inactive)
+        self.build_network(feeders=2)
+        self.dstations[1].is_active = False
+        self.dstations[1].save()
+        self.create_ratings()
+        Transformer.objects.create(
+                code='TX1', rating_id='P375m', station=self.istation,
+                condition=Condition.OK, serialno='SN001')
+        for n, station in enumerate(self.dstations, 1):
+            Transformer.objects.create(
+                code='TX1', rating_id='D1500', station=station,
+                condition=Condition.OK if n == 1 else Condition.FAULTY,
+                serialno='SN10%s' % n)
+        self.snapshot = snapshot.build()
+    
+    def test_build(self):
+        with self.assertNumQueries(4):
+            data = snapshot.build()
+        stations, powerlines = data.stations, data.powerlines
+        self.assertEqual([b'I301', b'S10001', b'S10002', b'T101'],
+                         stations.code.tolist())
+        self.assertEqual([Station.INJECTION, Station.DISTRIBUTION,
+                          Station.TRANSMISSION],
+                         [snapshot.CATEGORIES[i] for i in
+                          stations.category[[0, 1, 3]]])
+        self.assertEqual(snapshot.NO_ID,
+                         stations.source_feeder[stations.id('T101')])
+        self.assertEqual(powerlines.id('F101'),
+                         stations.source_feeder[stations.id('S10001')])
+        self.assertEqual([stations.id('T101')] + [stations.id('I301')] * 2,
+                         powerlines.source_station[
+                             powerlines.ids(['F301', 'F101', 'F102'])]
+                         .tolist())
+        self.assertEqual([stations.id('I301'), stations.id('S10001'),
+                          stations.id('S10002')],
+                         data.transformers.station.tolist())
+        with self.assertRaises(KeyError):
+            stations.ids(['S10001', 'S100011'])
+        
+        # columns take a few bytes per record
+        self.assertLess(stations.nbytes + powerlines.nbytes,
+                        20 * (len(stations) + len(powerlines)))
+    
+    def test_counts(self):
+        data = self.snapshot
+        self.assertEqual({Station.TRANSMISSION: 1, Station.INJECTION: 1,
+                          Station.DISTRIBUTION: 1}, data.count_stations())
+        self.assertEqual({Voltage.Ratio.HVOLTL_MVOLTH: 1,
+                          Voltage.Ratio.MVOLTH_MVOLTL: 1,
+                          Voltage.Ratio.MVOLTL_LVOLT: 2},
+                         data.count_stations('voltage_ratio', active=False))
+        self.assertEqual({Voltage.MVOLTH: 1, Voltage.MVOLTL: 2},
+                         data.count_powerlines())
+        self.assertEqual({PowerLine.FEEDER: 3}, data.count_powerlines('type'))
+        self.assertEqual({Condition.OK: 2, Condition.FAULTY: 1},
+                         data.count_transformers(active=False))
+        self.assertEqual({Voltage.Ratio.MVOLTH_MVOLTL: 1,
+                          Voltage.Ratio.MVOLTL_LVOLT: 2},
+                         data.count_transformers('voltage_ratio'))
+    
+    def test_capacities(self):
+        data = self.snapshot
+        stations, powerlines = data.stations, data.powerlines
+        self.assertEqual([7500, 500, 500, 0],
+                         data.capacity_by_station().tolist())
+        by_feeder = data.capacity_by_feeder()
+        self.assertEqual([500, 0, 7500], by_feeder[
+            powerlines.ids(['F101', 'F102', 'F301'])].tolist())
+        self.assertEqual({Station.INJECTION: 7500, Station.DISTRIBUTION: 500},
+                         data.capacity_by())
+        self.assertEqual({Voltage.Ratio.MVOLTH_MVOLTL: 7500,
+                          Voltage.Ratio.MVOLTL_LVOLT: 1000},
+                         data.capacity_by('voltage_ratio', active=False))
+    
+    def test_voltage_slices(self):
+        data = self.snapshot
+        stations, powerlines = data.stations, data.powerlines
+        self.assertEqual(stations.ids(['S10001']).tolist(),
+                         data.stations_at(Voltage.MVOLTL).tolist())
+        self.assertEqual(stations.ids(['I301', 'T101']).tolist(),
+                         data.stations_at(Voltage.MVOLTH).tolist() +
+                         data.stations_at(Voltage.MVOLTH,
+                                          snapshot.OUTPUT).tolist())
+        self.assertEqual(powerlines.ids(['F101', 'F102']).tolist(),
+                         data.powerlines_at(Voltage.MVOLTL,
+                                            active=False).tolist())
@@ -0,0 +1,91 @@
+import random
+
+from address.models import Address
+from django.test import SimpleTestCase, TestCase
+
+from .. import spatial
+from ..constants import Voltage
+from ..models import Station
+
+
+
+class SpatialIndexTestCase(SimpleTestCase):
+    
+    def setUp(self):
+        rand = random.Random(7)
+        self.points = []
+        self.index = spatial.SpatialIndex(cell_size=0.5)
+        for pk in range(1, 501):
+            lat, lng = rand.uniform(4, 14), rand.uniform(3, 15)
+            category = rand.choice('TIDD')
+            ratio = (Voltage.Ratio.MVOLTL_LVOLT if pk % 2
+                     else Voltage.Ratio.MVOLTH_LVOLT)
+            self.points.append(('S%s' % pk, lat, lng, category, ratio))
+            self.index.update_station(pk, 'S%s' % pk, lat, lng, category,
+                                      ratio)
+    
+    def _brute_force(self, lat, lng, category=None, voltage_ratio=None):
+        return sorted(
+            (spatial.distance(lat, lng, plat, plng), code)
+            for code, plat, plng, pcategory, ratio in self.points
+            if category in (None, pcategory)
+            and voltage_ratio in (None, ratio))
+    
+    def test_nearest_matches_brute_force(self):
+        rand = random.Random(11)
+        for _ in range(50):
+            lat, lng = rand.uniform(0, 18), rand.uniform(0, 18)
+            expected = self._brute_force(lat, lng, 'I')[:3]
+            self.assertEqual([code for _, code in expected],
+                             [code for code, _ in self.index.nearest(
+                                 lat, lng, 3, category='I')])
+    
+    def test_within_radius_matches_brute_force(self):
+        ratio = Voltage.Ratio.MVOLTL_LVOLT
+        expected = [code for dist, code in
+                    self._brute_force(9, 9, voltage_ratio=ratio)
+                    if dist <= 120]
+        found = self.index.within_radius(9, 9, 120, voltage_ratio=ratio)
+        self.assertEqual(expected, [code for code, _ in found])
+    
+    def test_update_and_remove(self):
+        self.index.update_station(1, 'S1', 50.0, 50.0, 'T', None)
+        self.assertEqual('S1', self.index.nearest(50.1, 50.1)[0][0])
+        self.index.update_station(1, 'S1', 50.0, 50.0, 'T', None,
+                                  is_active=False)
+        self.index.remove_station(2)
+        self.assertEqual(498, len(self.index))
+        self.assertEqual([], self.index.nearest(1, 1, category='X'))
+
+
+class SpatialSignalsTestCase(TestCase):
+    
+    def setUp(self):
+        spatial.reset_index()
+        self.address = Address.objects.create(
+                raw='Sample Address', latitude=9.05, longitude=7.49)
+        Station.objects.create(
+                code='T101', name='Sample TS', category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH,
+                address=self.address)
+    
+    def tearDown(self):
+        spatial.reset_index()
+    
+    def test_index_follows_saves(self):
+        self.assertEqual(['T101'],
+                         [c for c, _ in spatial.nearest(9.0, 7.5)])
+        station = Station.objects.create(
+                code='T102', name='Other TS', category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH,
+                address=Address.objects.create(
+                    raw='Other Address', latitude=6.45, longitude=3.39))
+        self.assertEqual('T102', spatial.nearest(6.5, 3.4)[0][0])
+        
+        self.address.latitude, self.address.longitude = (6.44, 3.38)
+        self.address.save()
+        self.assertEqual(['T102', 'T101'],
+                         [c for c, _ in spatial.within_radius(6.5, 3.4, 50)])
+        
+        station.delete()
+        self.assertEqual(1, len(spatial.get_index()))
@@ -0,0 +1,209 @@
+from django.test import TestCase
+
+from ..constants import Voltage
+from ..models import PowerLine, Station, rebuild_network_paths
+from ..topology import get_index, reset_index
+
+
+
+class BaseNetworkTestCase(TestCase):
+
+    def setUp(self):
+        reset_index()
+        self.tstation = Station.objects.create(
+                code='T101', name='Sample TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder33 = PowerLine.objects.create(
+                code='F301', name='Sample 33KV Feeder',
+                type=PowerLine.FEEDER, voltage=Voltage.MVOLTH,
+                source_station=self.tstation)
+        self.istation = Station.objects.create(
+                code='I301', name='Sample IS',
+                category=Station.INJECTION,
+                voltage_ratio=Voltage.Ratio.MVOLTH_MVOLTL,
+                source_feeder=self.feeder33)
+        self.feeder11 = PowerLine.objects.create(
+                code='F101', name='Sample 11KV Feeder',
+                type=PowerLine.FEEDER, voltage=Voltage.MVOLTL,
+                source_station=self.istation)
+        self.dstation = Station.objects.create(
+                code='S10001', name='Sample DS',
+                category=Station.DISTRIBUTION,
+                voltage_ratio=Voltage.Ratio.MVOLTL_LVOLT,
+                source_feeder=self.feeder11)
+
+    def tearDown(self):
+        reset_index()
+
+
+class TopologyIndexTestCase(BaseNetworkTestCase):
+
+    def test_downstream_lists_fed_nodes_breadth_first(self):
+        self.assertEqual(['I301', 'F101', 'S10001'],
+                         get_index().downstream('F301'))
+
+    def test_upstream_lists_feeding_nodes_nearest_first(self):
+        self.assertEqual(['F101', 'I301', 'F301', 'T101'],
+                         get_index().upstream('S10001'))
+
+    def test_path_to_root_includes_node(self):
+        self.assertEqual(['I301', 'F301', 'T101'],
+                         get_index().path_to_root('I301'))
+
+    def test_subtree_size(self):
+        index = get_index()
+        self.assertEqual(4, index.subtree_size('T101'))
+        self.assertEqual(0, index.subtree_size('S10001'))
+
+    def test_unknown_code_raises_key_error(self):
+        with self.assertRaises(KeyError):
+            get_index().downstream('T1FF')
+
+    def test_traversal_needs_no_queries_once_built(self):
+        get_index()
+        with self.assertNumQueries(0):
+            self.dstation.upstream()
+            self.tstation.downstream()
+
+    def test_index_updated_on_create(self):
+        index = get_index()
+        PowerLine.objects.create(
+            code='U1', name='Sample Upriser',
+            type=PowerLine.UPRISER, voltage=Voltage.LVOLT,
+            source_station=self.dstation)
+
+        self.assertIs(index, get_index())
+        self.assertIn('U1', index.downstream('T101'))
+        self.assertEqual(5, index.subtree_size('T101'))
+
+    def test_index_updated_on_reparent(self):
+        index = get_index()
+        feeder = PowerLine.objects.create(
+            code='F302', name='Another 33KV Feeder',
+            type=PowerLine.FEEDER, voltage=Voltage.MVOLTH,
+            source_station=self.tstation)
+
+        self.istation.source_feeder = feeder
+        self.istation.save()
+        self.assertEqual(0, index.subtree_size('F301'))
+        self.assertEqual(3, index.subtree_size('F302'))
+        self.assertEqual(['F302', 'T101'], self.istation.upstream())
+
+    def test_index_updated_on_delete(self):
+        index = get_index()
+        self.dstation.delete()
+        self.assertNotIn('S10001', index)
+        self.assertEqual(['I301', 'F101'], index.downstream('F301'))
+        self.assertEqual(3, index.subtree_size('T101'))
+
+
+class TreeQueryTestCase(BaseNetworkTestCase):
+
+    def _codes(self, queryset):
+        return sorted(queryset.values_list('code', flat=True))
+
+    def test_station_descendants_of(self):
+        qs = Station.objects.descendants_of('T101')
+        self.assertEqual(['I301', 'S10001'], self._codes(qs))
+
+    def test_powerline_descendants_of(self):
+        qs = PowerLine.objects.descendants_of('T101')
+        self.assertEqual(['F101', 'F301'], self._codes(qs))
+
+    def test_ancestors_of(self):
+        self.assertEqual(['I301', 'T101'], self._codes(
+            Station.objects.ancestors_of('S10001')))
+        self.assertEqual(['F101', 'F301'], self._codes(
+            PowerLine.objects.ancestors_of('S10001')))
+
+    def test_tree_query_is_single_statement(self):
+        with self.assertNumQueries(1):
+            list(Station.objects.descendants_of('T101'))
+
+    def test_tree_query_remains_chainable(self):
+        self.istation.is_active = False
+        self.istation.save()
+
+        qs = Station.objects.descendants_of('F301').filter(
+                is_active=True, category=Station.DISTRIBUTION)
+        self.assertEqual(['S10001'], self._codes(qs))
+
+        qs = PowerLine.objects.filter(voltage=Voltage.MVOLTL)
+        self.assertEqual(['F101'], self._codes(qs.descendants_of('T101')))
+
+    def test_subtree_stats(self):
+        self.dstation.is_active = False
+        self.dstation.save()
+
+        with self.assertNumQueries(1):
+            stats = Station.objects.all_with_inactive()\
+                                   .subtree_stats('T101')
+        self.assertEqual(2, stats['total'])
+        self.assertEqual(1, stats['active'])
+        self.assertEqual({Station.INJECTION: 1, Station.DISTRIBUTION: 1},
+                         stats['by_category'])
+
+        stats = PowerLine.objects.subtree_stats('I301')
+        self.assertEqual({Voltage.MVOLTL: 1}, stats['by_voltage'])
+
+
+class MaterializedPathTestCase(BaseNetworkTestCase):
+
+    def _path(self, model, code):
+        return model.objects.values_list('path', 'depth').get(code=code)
+
+    def test_path_and_depth_set_on_save(self):
+        self.assertEqual(('T101', 0), self._path(Station, 'T101'))
+        self.assertEqual(('T101/F301/I301/F101/S10001', 4),
+                         self._path(Station, 'S10001'))
+        self.assertEqual(('T101/F301/I301/F101', 3),
+                         self._path(PowerLine, 'F101'))
+
+    def test_under_path_selects_subtree(self):
+        qs = Station.objects.under_path(self.feeder33.path)
+        self.assertEqual(['I301', 'S10001'],
+                         sorted(qs.values_list('code', flat=True)))
+
+    def test_subtree_rebased_on_reparent(self):
+        tstation = Station.objects.create(
+            code='T102', name='Another TS',
+            category=Station.TRANSMISSION,
+            voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        feeder = PowerLine.objects.create(
+            code='F302', name='Another 33KV Feeder',
+            type=PowerLine.FEEDER, voltage=Voltage.MVOLTH,
+            source_station=tstation)
+
+        self.istation.source_feeder = feeder
+        self.istation.save()
+        self.assertEqual(('T102/F302/I301/F101/S10001', 4),
+                         self._path(Station, 'S10001'))
+        self.assertEqual(('T102/F302/I301/F101', 3),
+                         self._path(PowerLine, 'F101'))
+
+    def test_subtree_rebased_on_move_to_root(self):
+        self.istation.source_feeder = None
+        self.istation.save()
+        self.assertEqual(('I301/F101/S10001', 2),
+                         self._path(Station, 'S10001'))
+
+    def test_deactivate_marks_subtree_inactive(self):
+        self.istation.deactivate()
+        self.assertEqual(
+            ['T101'],
+            list(Station.objects.filter(is_active=True)
+                                .values_list('code', flat=True)))
+        self.assertEqual(
+            ['F301'],
+            list(PowerLine.objects.filter(is_active=True)
+                                  .values_list('code', flat=True)))
+
+    def test_rebuild_network_paths(self):
+        Station.objects.update(path='', depth=0)
+        PowerLine.objects.update(path='', depth=0)
+
+        rebuild_network_paths()
+        self.assertEqual(('T101/F301/I301/F101/S10001', 4),
+                         self._path(Station, 'S10001'))
+        self.assertEqual(('T101/F301', 1), self._path(PowerLine, 'F301'))
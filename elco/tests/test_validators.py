@@ -0,0 +1,79 @@
+import random
+from django.test import SimpleTestCase
+from django.core.exceptions import ValidationError
+
+from ..validators import validate_powerline_code_format,\
+        validate_station_code_format,\
+        validate_transformer_rating_code_format,\
+        validate_powerline_codes, validate_station_codes,\
+        validate_transformer_rating_codes,\
+        REASON_LENGTH, REASON_NUMBER, REASON_PREFIX, REASON_VOLTAGE
+
+
+
+def _random_codes(count, templates, seed=0):
+    """Generates codes around valid formats including the odd characters and
+    spacing which the scalar validators handle.
+    """
+    rand = random.Random(seed)
+    alphabet = '0123456789abcdefABCDEFGMmx +_-'
+    codes = []
+    for _ in range(count):
+        template = rand.choice(templates)
+        code = ''.join(
+            (rand.choice(alphabet) if char == '?' else char)
+            for char in template)
+        if rand.random() < 0.1:
+            code = ' %s\t' % code.lower()
+        codes.append(code)
+    return codes + [None, '', ' ', 'T1\n01', '\x00']
+
+
+class BatchValidatorTestCase(SimpleTestCase):
+
+    def _assert_matches_scalar(self, codes, validate, validate_batch):
+        result = validate_batch(codes)
+        self.assertEqual(len(codes), len(result.mask))
+        for code, ok, reason in zip(codes, result.mask, result.reasons):
+            try:
+                validate(code)
+                expected = True
+            except ValidationError:
+                expected = False
+            self.assertEqual(expected, ok, repr(code))
+            self.assertEqual(ok, reason is None, repr(code))
+
+    def test_station_codes_match_scalar_validator(self):
+        codes = _random_codes(5000, [
+            'T1??', 'T3??', 'I3??', 'I1??', 'S1????', 'S3????', 'S?????',
+            'T???', '?1??', 'T1?', 'S1?????', 'X'])
+        self._assert_matches_scalar(
+            codes, validate_station_code_format, validate_station_codes)
+
+    def test_powerline_codes_match_scalar_validator(self):
+        codes = _random_codes(5000, [
+            'F1??', 'F3??', 'F???', 'U?', 'U??', '?1??', 'F1?'])
+        self._assert_matches_scalar(
+            codes, validate_powerline_code_format, validate_powerline_codes)
+
+    def test_rating_codes_match_scalar_validator(self):
+        codes = _random_codes(5000, [
+            'P3???', 'P1??M', 'D3??m', 'D1???', 'P????', '?3???', 'D3??'])
+        self._assert_matches_scalar(
+            codes, validate_transformer_rating_code_format,
+            validate_transformer_rating_codes)
+
+    def test_valid_codes_normalized(self):
+        result = validate_station_codes([' t1ff ', 'S1000a', 'T100'])
+        self.assertEqual([True, True, False], result.mask)
+        self.assertEqual(['T1FF', 'S1000A', None], result.codes)
+
+    def test_rating_codes_keep_multiplier_case(self):
+        result = validate_transformer_rating_codes(['P375m', ' D1500 '])
+        self.assertEqual(['P375m', 'D1500'], result.codes)
+
+    def test_rejected_codes_carry_reason(self):
+        result = validate_station_codes(['X101', 'T1001', 'I101', 'T1GG'])
+        self.assertEqual(
+            [REASON_PREFIX, REASON_LENGTH, REASON_VOLTAGE, REASON_NUMBER],
+            result.reasons)
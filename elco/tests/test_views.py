@@ -0,0 +1,172 @@
+import json
+
+from django.test import TestCase, override_settings
+from django.core.urlresolvers import reverse
+
+from .. import benchmarks
+from ..constants import Voltage
+from ..models import PowerLine, Station
+
+
+
+@override_settings(ROOT_URLCONF='elco.urls')
+class AutocompleteSourceTestCase(TestCase):
+    
+    def setUp(self):
+        self.tstation = Station.objects.create(
+                code='T101', name='Alpha TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.istation = Station.objects.create(
+                code='I301', name='Alpha IS', alt_code='AIS',
+                category=Station.INJECTION,
+                voltage_ratio=Voltage.Ratio.MVOLTH_MVOLTL)
+        for n in range(1, 4):
+            PowerLine.objects.create(
+                code='F30%s' % n, name='Alpha 33KV %s' % n,
+                type=PowerLine.FEEDER, voltage=Voltage.MVOLTH,
+                source_station=self.tstation)
+        PowerLine.objects.create(
+            code='F101', name='Alpha 11KV', type=PowerLine.FEEDER,
+            voltage=Voltage.MVOLTL, source_station=self.istation)
+    
+    def _get(self, kind, **params):
+        url = reverse('autocomplete_source', kwargs={'kind': kind})
+        response = self.client.get(url, params)
+        self.assertEqual(200, response.status_code)
+        return json.loads(response.content.decode('utf-8'))
+    
+    def _ids(self, data):
+        return [entry['id'] for entry in data['results']]
+    
+    def test_feeders_matched_by_name_prefix(self):
+        data = self._get('feeders', q='alpha')
+        self.assertEqual(['F101', 'F301', 'F302', 'F303'], self._ids(data))
+        self.assertEqual('Alpha 11KV 11KV', data['results'][0]['text'])
+    
+    def test_feeders_matched_by_code_prefix(self):
+        self.assertEqual(['F101'], self._ids(self._get('feeders', q='f1')))
+    
+    def test_feeders_constrained_by_station_category(self):
+        data = self._get('feeders', q='F', category=Station.INJECTION)
+        self.assertEqual(['F301', 'F302', 'F303'], self._ids(data))
+        
+        data = self._get('feeders', q='F', category=Station.TRANSMISSION)
+        self.assertEqual([], self._ids(data))
+    
+    def test_feeders_paged(self):
+        data = self._get('feeders', q='F', limit=3)
+        self.assertEqual(['F101', 'F301', 'F302'], self._ids(data))
+        self.assertTrue(data['more'])
+        
+        data = self._get('feeders', q='F', limit=3, page=2)
+        self.assertEqual(['F303'], self._ids(data))
+        self.assertFalse(data['more'])
+    
+    def test_stations_constrained_by_line_type(self):
+        data = self._get('stations', q='a')
+        self.assertEqual(['I301', 'T101'], self._ids(data))
+        
+        data = self._get('stations', q='a', line_type=PowerLine.UPRISER)
+        self.assertEqual([], self._ids(data))
+    
+    def test_stations_matched_by_alt_code_prefix(self):
+        self.assertEqual(['I301'], self._ids(self._get('stations', q='ai')))
+
+
+@override_settings(**benchmarks.SETTINGS)
+class ManageViewsTestCase(TestCase):
+    
+    def setUp(self):
+        self.tstation = Station.objects.create(
+                code='T101', name='Alpha TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder = PowerLine.objects.create(
+                code='F301', name='Alpha 33KV', type=PowerLine.FEEDER,
+                voltage=Voltage.MVOLTH, source_station=self.tstation)
+        self.istation = Station.objects.create(
+                code='I301', name='Alpha IS', category=Station.INJECTION,
+                voltage_ratio=Voltage.Ratio.MVOLTH_MVOLTL,
+                source_feeder=self.feeder)
+    
+    def test_source_fields_use_autocomplete(self):
+        for name, pk in (('manage_station', self.istation.pk),
+                         ('manage_powerline', self.feeder.pk)):
+            kwargs = {name.split('_')[1] + '_id': pk}
+            response = self.client.get(reverse(name, kwargs=kwargs))
+            self.assertContains(response, 'data-autocomplete-url')
+            self.assertNotContains(response, '<option value="T101"')
+            self.assertNotContains(response, '<option value="F301"')
+
+
+@override_settings(**benchmarks.SETTINGS)
+class ListViewsTestCase(TestCase):
+    
+    def setUp(self):
+        self.tstation = Station.objects.create(
+                code='T101', name='Alpha TS',
+                category=Station.TRANSMISSION,
+                voltage_ratio=Voltage.Ratio.HVOLTL_MVOLTH)
+        self.feeder = PowerLine.objects.create(
+                code='F301', name='Alpha 33KV', type=PowerLine.FEEDER,
+                voltage=Voltage.MVOLTH, source_station=self.tstation)
+        for n in range(1, 6):
+            Station.objects.create(
+                code='S300%s' % n, name='Alpha DS %s' % n,
+                category=Station.DISTRIBUTION,
+                voltage_ratio=Voltage.Ratio.MVOLTH_LVOLT,
+                source_feeder=self.feeder, is_active=n != 5)
+    
+    def _get(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(200, response.status_code)
+        return response.context['page']
+    
+    def _codes(self, page):
+        return [record.code for record in page]
+    
+    def test_stations_paged_by_code_cursor(self):
+        page = self._get('list_stations', limit=2)
+        self.assertEqual(['S3001', 'S3002'], self._codes(page))
+        self.assertEqual((True, False), (page.has_next, page.has_previous))
+        
+        page = self._get('list_stations', limit=2, after=page.next_cursor)
+        self.assertEqual(['S3003', 'S3004'], self._codes(page))
+        
+        page = self._get('list_stations', limit=2, after='S3004')
+        self.assertEqual(['T101'], self._codes(page))
+        self.assertIsNone(page.next_cursor)
+        
+        page = self._get('list_stations', limit=2,
+                         before=page.previous_cursor)
+        self.assertEqual(['S3003', 'S3004'], self._codes(page))
+        self.assertEqual('S3003', page.previous_cursor)
+    
+    def test_stations_filtered(self):
+        page = self._get('list_stations', category='distribution',
+                         is_active='yes', source_feeder='f301')
+        self.assertEqual(['S3001', 'S3002', 'S3003', 'S3004'],
+                         self._codes(page))
+        self.assertEqual('Alpha 33KV 33KV', page.records[0].source_label)
+        
+        page = self._get('list_stations', is_active='no')
+        self.assertEqual(['S3005'], self._codes(page))
+        
+        for params in ({'category': 'Substation'}, {'is_active': 'maybe'},
+                       {'limit': 'all'}):
+            response = self.client.get(reverse('list_stations'), params)
+            self.assertEqual(400, response.status_code)
+    
+    def test_page_costs_single_query(self):
+        # besides the version stamp read from the change log
+        with self.assertNumQueries(1 + 1):
+            self.client.get(reverse('list_stations'), {'after': 'S3002'})
+        with self.assertNumQueries(1 + 1):
+            self.client.get(reverse('list_powerlines'), {
+                'voltage': '33kv', 'type': PowerLine.FEEDER})
+    
+    def test_powerlines_listed_with_source_label(self):
+        page = self._get('list_powerlines', source_station='T101')
+        self.assertEqual(['F301'], self._codes(page))
+        self.assertEqual('Alpha TS 132/33KV', page.records[0].source_label)
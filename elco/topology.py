@@ -0,0 +1,311 @@
+"""
+An in-memory index of the network topology as captured by the links from a
+Station to its source feeder (`Station.source_feeder`) and from a PowerLine to
+its source station (`PowerLine.source_station`).
+
+Station and PowerLine codes do not overlap (station codes start with T, I or S
+while power line codes start with F or U) hence both are kept within a single
+tree where each node is identified by its code. Codes are interned into small
+integer ids and the adjacency is held in plain lists indexed by those ids so
+that traversals never touch the database.
+"""
+import threading
+from collections import deque
+from itertools import chain
+
+from django.db.models.signals import post_delete, post_save
+
+from .models import PowerLine, Station
+
+
+NO_PARENT = -1
+
+
+
+class TopologyIndex(object):
+    """Holds the parent/child adjacency of all network nodes keyed by code."""
+
+    def __init__(self):
+        self._ids = {}          # code -> node id
+        self._codes = []        # node id -> code
+        self._parents = []      # node id -> parent node id
+        self._children = []     # node id -> [child node id, ...]
+        self._present = []      # node id -> True if a record exists for node
+        self._sizes = []        # node id -> present nodes within subtree
+        self._keys = {}         # (model name, pk) -> code
+        self._lock = threading.RLock()
+
+    @classmethod
+    def build(cls):
+        """Builds an index from all Station and PowerLine records using two
+        queries which fetch no more than the codes and links needed.
+        """
+        index = cls()
+        stations = Station.objects.all_with_inactive().values_list(
+            'pk', 'code', 'source_feeder')
+        powerlines = PowerLine.objects.all_with_inactive().values_list(
+            'pk', 'code', 'source_station')
+
+        entries = chain(
+            (('station', x) for x in stations.iterator()),
+            (('powerline', x) for x in powerlines.iterator()))
+
+        for model_name, (pk, code, parent_code) in entries:
+            index._keys[(model_name, pk)] = code
+            node_id = index._intern(code)
+            index._present[node_id] = True
+            if parent_code:
+                parent_id = index._intern(parent_code)
+                index._parents[node_id] = parent_id
+                index._children[parent_id].append(node_id)
+
+        index._compute_sizes()
+        return index
+
+    def __len__(self):
+        return self._present.count(True)
+
+    def __contains__(self, code):
+        node_id = self._ids.get(code)
+        return node_id is not None and self._present[node_id]
+
+    def downstream(self, code):
+        """Returns codes for all nodes fed directly or indirectly from the
+        node with the provided code, in breadth-first order.
+        """
+        node_id = self._get_id(code)
+        codes, present = self._codes, self._present
+        return [codes[x] for x in self._walk_down(node_id) if present[x]]
+
+    def upstream(self, code):
+        """Returns codes for all nodes feeding the node with the provided code
+        starting with the nearest.
+        """
+        node_id = self._get_id(code)
+        return [self._codes[x] for x in self._walk_up(node_id)]
+
+    def path_to_root(self, code):
+        """Returns codes from the node with provided code up to the root of
+        its tree, both inclusive.
+        """
+        return [code] + self.upstream(code)
+
+    def subtree_size(self, code):
+        """Returns the number of nodes fed directly or indirectly from the
+        node with the provided code.
+        """
+        node_id = self._get_id(code)
+        return self._sizes[node_id] - 1
+
+    def node_id(self, code):
+        """Returns the id of the node with provided code, which may be that of
+        a placeholder, or None for unknown codes.
+        """
+        return self._ids.get(code)
+
+    def code_of(self, node_id):
+        return self._codes[node_id]
+
+    def parent_of(self, node_id):
+        return self._parents[node_id]
+
+    def children_of(self, node_id):
+        return self._children[node_id]
+
+    def is_present(self, node_id):
+        return self._present[node_id]
+
+    def preorder(self, node_id, included):
+        """Returns ids of the node and nodes within its subtree in pre-order,
+        children in the order they were linked, skipping the subtree of any
+        node whose id is not true within the included sequence.
+        """
+        children, result = self._children, []
+        stack = [node_id]
+        while stack:
+            node_id = stack.pop()
+            result.append(node_id)
+            ids = children[node_id]
+            if ids:
+                stack.extend([x for x in reversed(ids) if included[x]])
+        return result
+
+    def codes_of(self, node_ids):
+        codes = self._codes
+        return [codes[x] for x in node_ids]
+
+    def walk_from_roots(self):
+        """Yields ids of all nodes reached from roots, roots included, with
+        parents preceding their children.
+        """
+        for root_id, parent_id in enumerate(self._parents):
+            if parent_id == NO_PARENT:
+                yield root_id
+                for node_id in self._walk_down(root_id):
+                    yield node_id
+
+    def update_node(self, model_name, pk, code, parent_code):
+        """Updates the index to reflect the current state of a single record,
+        thus handling creation, code change and re-parenting of a node.
+        """
+        with self._lock:
+            old_code = self._keys.get((model_name, pk))
+            if old_code is not None and old_code != code:
+                self._rename(old_code, code)
+            self._keys[(model_name, pk)] = code
+
+            node_id = self._intern(code)
+            if not self._present[node_id]:
+                self._present[node_id] = True
+                self._adjust_sizes(node_id, 1)
+
+            parent_id = (NO_PARENT if not parent_code
+                         else self._intern(parent_code))
+            if parent_id != self._parents[node_id]:
+                self._detach(node_id)
+                self._attach(node_id, parent_id)
+
+    def remove_node(self, model_name, pk):
+        """Removes the node for the record identified by model name and pk.
+        Nodes still referenced by children are kept as placeholders.
+        """
+        with self._lock:
+            code = self._keys.pop((model_name, pk), None)
+            node_id = self._ids.get(code)
+            if node_id is None or not self._present[node_id]:
+                return
+
+            self._present[node_id] = False
+            self._adjust_sizes(node_id, -1)
+            self._detach(node_id)
+
+    def _get_id(self, code):
+        node_id = self._ids.get(code)
+        if node_id is None or not self._present[node_id]:
+            raise KeyError(code)
+        return node_id
+
+    def _intern(self, code):
+        node_id = self._ids.get(code)
+        if node_id is None:
+            node_id = len(self._codes)
+            self._ids[code] = node_id
+            self._codes.append(code)
+            self._parents.append(NO_PARENT)
+            self._children.append([])
+            self._present.append(False)
+            self._sizes.append(0)
+        return node_id
+
+    def _rename(self, old_code, new_code):
+        node_id = self._ids.pop(old_code)
+        self._ids[new_code] = node_id
+        self._codes[node_id] = new_code
+
+    def _walk_down(self, node_id):
+        children, seen = self._children, set([node_id])
+        queue = deque(children[node_id])
+        while queue:
+            child_id = queue.popleft()
+            if child_id in seen:
+                continue
+            seen.add(child_id)
+            yield child_id
+            queue.extend(children[child_id])
+
+    def _walk_up(self, node_id):
+        # guard against cycles which may exist in data loaded outside of
+        # model validation.
+        parents, seen = self._parents, set([node_id])
+        parent_id = parents[node_id]
+        while parent_id != NO_PARENT and parent_id not in seen:
+            seen.add(parent_id)
+            yield parent_id
+            parent_id = parents[parent_id]
+
+    def _attach(self, node_id, parent_id):
+        self._parents[node_id] = parent_id
+        if parent_id != NO_PARENT:
+            self._children[parent_id].append(node_id)
+            size = self._sizes[node_id]
+            for ancestor_id in chain((parent_id,), self._walk_up(parent_id)):
+                self._sizes[ancestor_id] += size
+
+    def _detach(self, node_id):
+        parent_id = self._parents[node_id]
+        if parent_id != NO_PARENT:
+            size = self._sizes[node_id]
+            for ancestor_id in chain((parent_id,), self._walk_up(parent_id)):
+                self._sizes[ancestor_id] -= size
+            self._children[parent_id].remove(node_id)
+        self._parents[node_id] = NO_PARENT
+
+    def _adjust_sizes(self, node_id, delta):
+        self._sizes[node_id] += delta
+        for ancestor_id in self._walk_up(node_id):
+            self._sizes[ancestor_id] += delta
+
+    def _compute_sizes(self):
+        # accumulate sizes bottom-up by visiting nodes in reverse order of
+        # a breadth-first walk from all roots.
+        sizes = [1 if x else 0 for x in self._present]
+        for node_id in reversed(list(self.walk_from_roots())):
+            parent_id = self._parents[node_id]
+            if parent_id != NO_PARENT:
+                sizes[parent_id] += sizes[node_id]
+        self._sizes = sizes
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the process-wide topology index, building it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = TopologyIndex.build()
+    return _index
+
+
+def reset_index():
+    """Discards the process-wide topology index; it gets rebuilt on next use."""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def _on_station_saved(sender, instance, raw=False, **kwargs):
+    if _index is not None:
+        _index.update_node('station', instance.pk, instance.code,
+                           instance.source_feeder_id)
+
+
+def _on_powerline_saved(sender, instance, raw=False, **kwargs):
+    if _index is not None:
+        _index.update_node('powerline', instance.pk, instance.code,
+                           instance.source_station_id)
+
+
+def _on_station_deleted(sender, instance, **kwargs):
+    if _index is not None:
+        _index.remove_node('station', instance.pk)
+
+
+def _on_powerline_deleted(sender, instance, **kwargs):
+    if _index is not None:
+        _index.remove_node('powerline', instance.pk)
+
+
+def connect_signals():
+    uid = 'elco.topology.%s'
+    post_save.connect(_on_station_saved, sender=Station,
+                      dispatch_uid=uid % 'station_saved')
+    post_save.connect(_on_powerline_saved, sender=PowerLine,
+                      dispatch_uid=uid % 'powerline_saved')
+    post_delete.connect(_on_station_deleted, sender=Station,
+                        dispatch_uid=uid % 'station_deleted')
+    post_delete.connect(_on_powerline_deleted, sender=PowerLine,
+                        dispatch_uid=uid % 'powerline_deleted')
@@ -0,0 +1,19 @@
+from django.conf.urls import url
+
+from . import views
+
+
+
+urlpatterns = [
+    url(r'^stations/$', views.list_stations, name='list_stations'),
+    url(r'^powerlines/$', views.list_powerlines, name='list_powerlines'),
+    url(r'^autocomplete/(?P<kind>feeders|stations)/$',
+        views.autocomplete_source, name='autocomplete_source'),
+    url(r'^export/(?P<kind>stations|powerlines|ratings|transformers)'
+        r'\.(?P<fmt>csv|jsonl)(?P<compress>\.gz)?$',
+        views.export_network, name='export_network'),
+    url(r'^changes/$', views.list_changes, name='list_changes'),
+    url(r'^codes/reserve/$', views.reserve_codes, name='reserve_codes'),
+    url(r'^impact/$', views.outage_impact, name='outage_impact'),
+    url(r'^metrics/$', views.export_metrics, name='export_metrics'),
+]
@@ -1,13 +1,27 @@
+import re
+from collections import namedtuple
+from itertools import compress
+from operator import not_
+
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 
-from .constants import Voltage
+from . import ratings
 
 MSG_REQUIRED_FIELD = _("This field cannot be null.")
 MSG_INVALID_FORMAT = _("The format of provided code is invalid.")
 MSG_MISMATCH_RATING_CODE_VALUE = _(
     "There is a mismatch between Transformer Rating code and values")
 
+# reasons reported by batch validators for rejected codes
+REASON_LENGTH = 'length'
+REASON_PREFIX = 'prefix'
+REASON_VOLTAGE = 'voltage'
+REASON_NUMBER = 'number'
+
+
+BatchResult = namedtuple('BatchResult', 'mask codes reasons')
+
 
 
 def validate_station_code_format(value):
@@ -59,7 +73,7 @@ def validate_transformer_rating_code_format(value):
             return int(digits)
         except:
             pass
-    return ValidationError(MSG_INVALID_FORMAT)
+    raise ValidationError(MSG_INVALID_FORMAT)
 
 
 def validate_transformer_rating_code(code, capacity, voltage_ratio):
@@ -68,34 +82,130 @@ def validate_transformer_rating_code(code, capacity, voltage_ratio):
     if not code:
         raise ValidationError(MSG_REQUIRED_FIELD)
     
-    # validate coded capacity
-    coded_capacity = (code[2:] if code[-1] not in ('M','m') else code[2:-1])
-    multiplier = (1 if code[-1] not in ('M','m') else 
-                    100 if code[-1] == 'm' else 1000)
-    
-    try:
-        coded_value = int(coded_capacity) * multiplier
-    except:
+    # coded capacity and voltage ratio must match the actual values
+    if not ratings.matches(code, capacity, voltage_ratio):
         raise ValidationError(MSG_MISMATCH_RATING_CODE_VALUE)
+
+
+# patterns matching, line by line, uppercased codes which are accepted by the
+# scalar validators
+STATION_CODE_PATTERN = re.compile(
+    r'^(?:T[13](?!00)[0-9A-F]{2}|I3(?!00)[0-9A-F]{2}|S[13](?!0000)[0-9A-F]{4})$',
+    re.MULTILINE)
+POWERLINE_CODE_PATTERN = re.compile(
+    r'^(?:F[13](?!00)[0-9A-F]{2}|U[1-4])$', re.MULTILINE)
+TRANSFORMER_RATING_CODE_PATTERN = re.compile(
+    r'^[PD][31](?:[0-9]{3}|[0-9]{2}M)$', re.MULTILINE)
+
+# marker replacing matched codes within joined text
+_MATCHED = '\x00'
+
+
+def _normalize(value):
+    if value is None or hasattr(value, 'strip'):
+        return (value or '').strip().upper()
+    return ''
+
+
+def _validate_batch(values, pattern, validate, get_reason):
+    """Validates values by joining them into a single text which is then
+    uppercased and matched against pattern in one pass. Values which do not
+    match, including those needing more normalization or not joinable, are
+    re-checked with the scalar validator which remains the reference.
+    """
+    values = list(values)
+    try:
+        text = '\n'.join(values)
+        joined = (text.count('\n') == len(values) - 1
+                  and _MATCHED not in text)
+    except TypeError:
+        joined = False
     
-    if coded_value != capacity:
-        raise ValidationError(MSG_MISMATCH_RATING_CODE_VALUE)
+    if joined:
+        upper_text = text.upper()
+        matched = pattern.sub(_MATCHED, upper_text).split('\n')
+        mask = list(map(_MATCHED.__eq__, matched))
+        codes = (list(values) if upper_text == text
+                 else upper_text.split('\n'))
+    else:
+        mask = [False] * len(values)
+        codes = [None] * len(values)
     
-    # validate coded voltage ratio
-    expected_values, VR = None, Voltage.Ratio
-    if code[0] == 'P':
-        # VR code comes from low-voltage side of VR text value
-        if code[1] == 3:
-            expected_values = (VR.HVOLTL_MVOLTH,)
-        elif code[1] == '1':
-            expected_values = (VR.HVOLTL_MVOLTL, VR.MVOLTH_MVOLTL)
-    elif code[1] == 'D':
-        # VR code comes from high-voltage side of VR text value
-        if code[1] == 3:
-            expected_values = (VR.MVOLTH_LVOLT,)
-        else:
-            expected_values =(VR.MVOLTL_LVOLT,)
+    reasons = [None] * len(values)
+    rejected = compress(range(len(mask)), map(not_, mask))
+    for index in rejected:
+        try:
+            codes[index] = validate(values[index])
+            mask[index] = True
+        except (ValidationError, AttributeError):
+            codes[index] = None
+            reasons[index] = get_reason(_normalize(values[index]))
+    return BatchResult(mask, codes, reasons)
+
+
+def _get_station_code_reason(value):
+    if not value or value[0] not in ('T', 'I', 'S'):
+        return REASON_PREFIX
+    if len(value) != (6 if value[0] == 'S' else 4):
+        return REASON_LENGTH
+    if value[1] not in ('1', '3') or (value[0] == 'I' and value[1] != '3'):
+        return REASON_VOLTAGE
+    return REASON_NUMBER
+
+
+def _get_powerline_code_reason(value):
+    if not value or value[0] not in ('F', 'U'):
+        return REASON_PREFIX
+    if len(value) != (4 if value[0] == 'F' else 2):
+        return REASON_LENGTH
+    if value[0] == 'F' and value[1] not in ('1', '3'):
+        return REASON_VOLTAGE
+    return REASON_NUMBER
+
+
+def _get_transformer_rating_code_reason(value):
+    if len(value) != 5:
+        return REASON_LENGTH
+    if value[0] not in ('P', 'D'):
+        return REASON_PREFIX
+    if value[1] not in ('3', '1'):
+        return REASON_VOLTAGE
+    return REASON_NUMBER
+
+
+def validate_station_codes(values):
+    """Validates a sequence of station codes at once with the same outcome as
+    `validate_station_code_format` applied to each.
     
-    if voltage_ratio in (expected_values or []):
-        raise ValidationError(MSG_MISMATCH_RATING_CODE_VALUE)
+    Returns a BatchResult where `mask` flags valid codes, `codes` holds the
+    normalized code for each valid value and `reasons` the cause for each
+    rejected value.
+    """
+    return _validate_batch(values, STATION_CODE_PATTERN,
+                           validate_station_code_format,
+                           _get_station_code_reason)
+
 
+def validate_powerline_codes(values):
+    """Validates a sequence of power line codes at once with the same outcome
+    as `validate_powerline_code_format` applied to each.
+    """
+    return _validate_batch(values, POWERLINE_CODE_PATTERN,
+                           validate_powerline_code_format,
+                           _get_powerline_code_reason)
+
+
+def validate_transformer_rating_codes(values):
+    """Validates a sequence of transformer rating codes at once with the same
+    outcome as `validate_transformer_rating_code_format` applied to each.
+    
+    Unlike the other batch validators, the returned codes are only stripped as
+    case is significant for the multiplier of a rating code.
+    """
+    values = list(values)
+    result = _validate_batch(values, TRANSFORMER_RATING_CODE_PATTERN,
+                             validate_transformer_rating_code_format,
+                             _get_transformer_rating_code_reason)
+    codes = [(v.strip() if ok else None)
+             for v, ok in zip(values, result.mask)]
+    return BatchResult(result.mask, codes, result.reasons)
@@ -1,25 +1,60 @@
-from django.shortcuts import get_object_or_404, redirect, render, resolve_url
+from django.http import Http404, HttpResponse, HttpResponseBadRequest,\
+        JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render, resolve_url
 from django.template.response import TemplateResponse
+from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
+from django.views.decorators.http import require_POST
 
+from . import allocation, caching, changelog, exporter, impact, metrics
+from .conditional import conditional, get_form_stamp, get_stamp
+from .choices import get_feeder_label, get_feeder_voltages,\
+        get_station_categories, get_station_label, search_feeders,\
+        search_stations
 from .forms import StationForm, PowerLineForm
+from .pagination import DEFAULT_PAGE_SIZE, paginate
 from .models import Station, PowerLine
 from .constants import Voltage
-from _testcapi import the_number_three
 
 
 
+def _station_form_stamp(request, station_id=None, **kwargs):
+    # source feeder choices are rendered from the power line collection
+    records = [('station', station_id)] if station_id else []
+    return get_form_stamp(request, ('powerline',), records)
+
+
+def _powerline_form_stamp(request, powerline_id=None, **kwargs):
+    # source station choices are rendered from the station collection
+    records = [('powerline', powerline_id)] if powerline_id else []
+    return get_form_stamp(request, ('station',), records)
+
+
+def _list_stamp(request, *args, **kwargs):
+    return get_stamp(('station', 'powerline'))
+
+
+def _export_stamp(request, kind, *args, **kwargs):
+    return get_stamp((exporter.EXPORTS[kind][0]._meta.model_name,))
+
+
+@metrics.time_form_view('manage_station')
+@conditional(_station_form_stamp)
 def manage_station(request, category=None,
                    powerline_id=None,
                    station_id=None,
                    template_name='elco/station_form.html',
                    model_form = StationForm,
                    redirect_url=None,
-                   extra_context=None):
+                   extra_context=None,
+                   autocomplete=True):
     """Use to create new and modify existion Station objects. 
     
     NOTE: The fields category and powerline_id are mutually exclusive with
     the later selected over the former if both are provided.
+    
+    The source feeder is picked through the autocomplete view unless
+    autocomplete is False, in which case every option is rendered.
     """
     station = Station()
     source_feeder = None
@@ -29,7 +64,8 @@ def manage_station(request, category=None,
         if powerline_id:
             # constraint some other fields based no provided source feeder
             # here a station is being managed in relation to a feeder...
-            source_feeder = get_object_or_404(PowerLine, pk=powerline_id)
+            source_feeder = caching.get_object_or_404(PowerLine,
+                                                    pk=powerline_id)
             station.source_feeder = source_feeder
             
             post_extra['source_feeder'] = source_feeder.code
@@ -49,7 +85,7 @@ def manage_station(request, category=None,
                 station.category = category
             post_extra['category'] = category
     else:
-        station = get_object_or_404(Station, pk=station_id)
+        station = caching.get_object_or_404(Station, pk=station_id)
     
     # ensure a redirect can be performed
     if not redirect_url:
@@ -62,12 +98,13 @@ def manage_station(request, category=None,
         post_dict.update(post_extra)
         
         form = model_form(category, source_feeder, instance=station, 
-                          data=post_dict)
+                          data=post_dict, autocomplete=autocomplete)
         if form.is_valid():
             form.save()
             return redirect(redirect_url)
     else:
-        form = model_form(category, source_feeder, instance=station)
+        form = model_form(category, source_feeder, instance=station,
+                          autocomplete=autocomplete)
     
     context = {'form': form}
     if extra_context:
@@ -75,17 +112,23 @@ def manage_station(request, category=None,
     return TemplateResponse(request, template_name, context)
 
 
+@metrics.time_form_view('manage_powerline')
+@conditional(_powerline_form_stamp)
 def manage_powerline(request, line_type=None,
                      station_id=None,
                      powerline_id=None,
                      template_name='elco/powerline_form.html',
                      model_form=PowerLineForm,
                      redirect_url=None,
-                     extra_context=None):
+                     extra_context=None,
+                     autocomplete=True):
     """Use to create new and modify existing PowerLine objects.
     
     NOTE: The fields line_type and station_id are mutually exclusive with the
     later selected over the former if both are provided.
+    
+    The source station is picked through the autocomplete view unless
+    autocomplete is False, in which case every option is rendered.
     """
     powerline = PowerLine()
     source_station = None
@@ -95,7 +138,8 @@ def manage_powerline(request, line_type=None,
         if station_id:
             # constraint some other fields based on provided source station
             # here a powerline is being managed in relation to a station...
-            source_station = get_object_or_404(Station, pk=station_id)
+            source_station = caching.get_object_or_404(Station,
+                                                     pk=station_id)
             powerline.source_station = source_station
             post_extra['source_station'] = source_station.code
             
@@ -117,7 +161,7 @@ def manage_powerline(request, line_type=None,
                 powerline.line_type = line_type
             post_extra['type'] = line_type
     else:
-        powerline = get_object_or_404(PowerLine, pk=powerline_id)
+        powerline = caching.get_object_or_404(PowerLine, pk=powerline_id)
     
     # ensure a redirect can be performed
     if not redirect_url:
@@ -130,12 +174,13 @@ def manage_powerline(request, line_type=None,
         post_dict.update(post_extra)
         
         form = model_form(line_type, source_station, instance=powerline,
-                          data=post_dict)
+                          data=post_dict, autocomplete=autocomplete)
         if form.is_valid():
             form.save()
             return redirect(redirect_url)
     else:
-        form = model_form(line_type, source_station, instance=powerline)
+        form = model_form(line_type, source_station, instance=powerline,
+                          autocomplete=autocomplete)
         
     context = {'form': form}
     if extra_context:
@@ -143,3 +188,253 @@ def manage_powerline(request, line_type=None,
     return TemplateResponse(request, template_name, context)
 
 
+def _get_choice_value(choices, text):
+    """Returns the choice value matching the provided value or display text,
+    raising ValueError where there is none.
+    """
+    text = text.strip().lower()
+    for value, label in choices:
+        if text in (str(value).lower(), str(label).lower()):
+            return value
+    raise ValueError("Unknown filter value: %s" % text)
+
+
+def _get_flag(text):
+    text = text.strip().lower()
+    if text in ('1', 'true', 'yes'):
+        return True
+    if text in ('0', 'false', 'no'):
+        return False
+    raise ValueError("Invalid flag provided: %s" % text)
+
+
+def _get_filters(request, filters):
+    """Returns lookups for filter parameters in the request query string.
+    
+    :filters: maps each parameter to a (lookup, parser) pair.
+    """
+    lookups = {}
+    for param, (lookup, parse) in filters.items():
+        value = request.GET.get(param, '').strip()
+        if value:
+            lookups[lookup] = parse(value)
+    return lookups
+
+
+def _list_records(request, queryset, filters, label, template_name,
+                  page_size, max_page_size, extra_context):
+    """Renders a page of filtered records keyset paginated by code."""
+    try:
+        limit = min(int(request.GET.get('limit', page_size)), max_page_size)
+        limit = max(limit, 1)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid limit provided.")
+    
+    try:
+        lookups = _get_filters(request, filters)
+    except ValueError as ex:
+        return HttpResponseBadRequest(str(ex))
+    lookups.setdefault('is_active', True)
+    try:
+        page = paginate(queryset.filter(**lookups),
+                        after=request.GET.get('after') or None,
+                        before=request.GET.get('before') or None,
+                        page_size=limit)
+    except ValidationError:
+        return HttpResponseBadRequest("Invalid cursor provided.")
+    
+    for record in page:
+        record.source_label = label(record)
+    
+    query = request.GET.copy()
+    for param in ('after', 'before'):
+        query.pop(param, None)
+    context = {'page': page, 'filters': lookups, 'query': query.urlencode()}
+    if extra_context:
+        context.update(extra_context)
+    return TemplateResponse(request, template_name, context)
+
+
+def _source_label(source, label, field):
+    if source is None:
+        return ''
+    return label(source.name, getattr(source, field))
+
+
+@conditional(_list_stamp)
+def list_stations(request, template_name='elco/station_list.html',
+                  page_size=DEFAULT_PAGE_SIZE, max_page_size=500,
+                  extra_context=None):
+    """Lists stations a page at a time ordered by code, with pages linked
+    through `after` and `before` code cursors.
+    
+    Stations can be filtered with the `category`, `voltage_ratio`,
+    `is_active` and `source_feeder` (code) query parameters; only active
+    stations are listed where `is_active` is not provided.
+    """
+    stations = Station.objects.all_with_inactive()\
+                      .select_related('source_feeder').only(
+        'code', 'alt_code', 'name', 'category', 'voltage_ratio', 'is_active',
+        'source_feeder', 'source_feeder__code', 'source_feeder__name',
+        'source_feeder__voltage')
+    filters = {
+        'category': ('category', lambda value: _get_choice_value(
+            Station.CATEGORY_CHOICES, value)),
+        'voltage_ratio': ('voltage_ratio', lambda value: _get_choice_value(
+            Voltage.Ratio._text.items(), value)),
+        'is_active': ('is_active', _get_flag),
+        'source_feeder': ('source_feeder', lambda value: value.upper()),
+    }
+    label = lambda station: _source_label(
+        station.source_feeder, get_feeder_label, 'voltage')
+    return _list_records(request, stations, filters, label, template_name,
+                         page_size, max_page_size, extra_context)
+
+
+@conditional(_list_stamp)
+def list_powerlines(request, template_name='elco/powerline_list.html',
+                    page_size=DEFAULT_PAGE_SIZE, max_page_size=500,
+                    extra_context=None):
+    """Lists power lines a page at a time ordered by code, with pages linked
+    through `after` and `before` code cursors.
+    
+    Power lines can be filtered with the `type`, `voltage`, `is_active` and
+    `source_station` (code) query parameters; only active power lines are
+    listed where `is_active` is not provided.
+    """
+    powerlines = PowerLine.objects.all_with_inactive()\
+                          .select_related('source_station').only(
+        'code', 'alt_code', 'name', 'type', 'voltage', 'is_active',
+        'source_station', 'source_station__code', 'source_station__name',
+        'source_station__voltage_ratio')
+    filters = {
+        'type': ('type', lambda value: _get_choice_value(
+            PowerLine.POWERLINE_CHOICES, value)),
+        'voltage': ('voltage', lambda value: _get_choice_value(
+            Voltage._text.items(), value)),
+        'is_active': ('is_active', _get_flag),
+        'source_station': ('source_station', lambda value: value.upper()),
+    }
+    label = lambda powerline: _source_label(
+        powerline.source_station, get_station_label, 'voltage_ratio')
+    return _list_records(request, powerlines, filters, label, template_name,
+                         page_size, max_page_size, extra_context)
+
+
+def autocomplete_source(request, kind, page_size=20, max_page_size=100):
+    """Returns as JSON a page of source feeders or source stations whose
+    code, alternate code or name starts with the `q` query parameter.
+    
+    Feeders are constrained by the `category` of the station to be fed and
+    stations by the `line_type` of the power line to be sourced, as applied
+    by StationForm and PowerLineForm respectively.
+    """
+    prefix = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        limit = min(int(request.GET.get('limit', page_size)), max_page_size)
+        limit = max(limit, 1)
+    except ValueError:
+        raise Http404("Invalid page or limit provided.")
+    offset = (page - 1) * limit
+    
+    if kind == 'feeders':
+        voltages = get_feeder_voltages(request.GET.get('category') or None)
+        results, more = ((), False)
+        if voltages:
+            results, more = search_feeders(prefix, voltages, offset, limit)
+    elif kind == 'stations':
+        categories = get_station_categories(
+            request.GET.get('line_type') or None)
+        results, more = search_stations(prefix, categories, offset, limit)
+    else:
+        raise Http404("Unknown source kind: %s" % kind)
+    
+    return JsonResponse({
+        'results': [{'id': code, 'text': label} for code, label in results],
+        'more': more,
+    })
+
+
+@conditional(_export_stamp)
+def export_network(request, kind, fmt, compress=False):
+    """Streams all records of the named kind as a CSV or JSON-lines file
+    attachment, gzip compressed when requested through the `.gz` suffix.
+    """
+    filename = '%s.%s' % (kind, fmt)
+    compress = bool(compress)
+    if compress:
+        filename += '.gz'
+    
+    response = StreamingHttpResponse(
+        exporter.iter_export(kind, fmt, compress),
+        content_type=('application/gzip' if compress
+                      else exporter.CONTENT_TYPES[fmt]))
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    return response
+
+
+def export_metrics(request):
+    """Returns the metrics recorded by this process in the Prometheus text
+    exposition format.
+    """
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def list_changes(request, batch_size=changelog.DEFAULT_BATCH_SIZE,
+                 max_batch_size=5000):
+    """Returns as JSON a batch of changes logged after the `since` sequence
+    number, optionally only those for the comma separated `models`, along
+    with the `last_seq` to request the next batch with.
+    """
+    try:
+        since = max(int(request.GET.get('since', 0)), 0)
+        limit = min(int(request.GET.get('limit', batch_size)), max_batch_size)
+        limit = max(limit, 1)
+    except ValueError:
+        raise Http404("Invalid since or limit provided.")
+    
+    models = [name for name in request.GET.get('models', '').split(',')
+              if name.strip()]
+    known = set(m._meta.model_name for m in changelog.LOGGED_FIELDS)
+    if set(models) - known:
+        raise Http404("Unknown models provided.")
+    return JsonResponse(changelog.changes_since(since, limit, models))
+
+
+def outage_impact(request):
+    """Returns as JSON the stations and power lines de-energized by the
+    failure of the nodes with the comma separated `codes`, along with the
+    transformers affected and their total capacity.
+    """
+    codes = [code.strip().upper() for code in
+             request.GET.get('codes', '').split(',') if code.strip()]
+    if not codes:
+        raise Http404("No codes provided.")
+    try:
+        result = impact.analyze(codes)
+    except KeyError as ex:
+        raise Http404("Unknown code provided: %s" % ex.args[0])
+    return JsonResponse(result.as_dict())
+
+
+@require_POST
+def reserve_codes(request, max_count=10000):
+    """Reserves `count`, one by default, free codes in the `keyspace`, such
+    as S1 for 11/0.415KV distribution stations, and returns them as JSON.
+    """
+    key = request.POST.get('keyspace', '').strip().upper()
+    if key not in allocation.KEYSPACES:
+        return HttpResponseBadRequest("Unknown keyspace provided: %s" % key)
+    try:
+        count = int(request.POST.get('count', 1))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid count provided.")
+    if not 0 < count <= max_count:
+        return HttpResponseBadRequest("Invalid count provided.")
+    
+    try:
+        codes = allocation.reserve_many(key, count)
+    except ValueError as ex:
+        return JsonResponse({'error': str(ex)}, status=409)
+    return JsonResponse({'keyspace': key, 'codes': codes})
@@ -0,0 +1,34 @@
+from django import forms
+from django.core.urlresolvers import reverse
+from django.utils.http import urlencode
+
+
+
+class AutocompleteInput(forms.TextInput):
+    """A text input for selecting a source feeder or station by code, with
+    matches looked up from the autocomplete view rather than having every
+    option inlined within the page.
+    
+    :kind: Either 'feeders' or 'stations'.
+    :params: Constraints passed on to the autocomplete view.
+    """
+    url_name = 'autocomplete_source'
+    
+    def __init__(self, kind, params=None, attrs=None):
+        super(AutocompleteInput, self).__init__(attrs)
+        self.kind = kind
+        self.params = dict((k, v) for k, v in (params or {}).items() if v)
+    
+    def get_url(self):
+        url = reverse(self.url_name, kwargs={'kind': self.kind})
+        if self.params:
+            url = '%s?%s' % (url, urlencode(sorted(self.params.items())))
+        return url
+    
+    def render(self, name, value, attrs=None):
+        attrs = dict(attrs or {})
+        attrs.update({
+            'autocomplete': 'off',
+            'data-autocomplete-url': self.get_url(),
+        })
+        return super(AutocompleteInput, self).render(name, value, attrs)
@@ -16,7 +16,11 @@ setup(
     description='',
     long_description=open(os.path.join(os.path.dirname(__file__), 
                                        'README.md')).read(),
-    packages=['elco'],
+    packages=['elco', 'elco.benchmarks', 'elco.management',
+              'elco.management.commands', 'elco.migrations'],
+    extras_require={
+        'analytics': ['numpy'],
+    },
     test_suite='elco.runtests.run_tests',
     classifiers=[
         'Development Status :: 3 - Alpha',